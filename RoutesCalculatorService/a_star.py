@@ -1,18 +1,21 @@
 import heapq
 import math
-from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
-# Импортируем модели из data_models.py
-from data_models import PortData, SegmentDataForAStar
+from contraction_hierarchies import contraction_hierarchy_search
 
-# Радиус Земли в морских милях
-EARTH_RADIUS_NAUTICAL_MILES = 3440.098
+# Импортируем модели из data_models.py
+from data_models import PortData
+from graph import GraphSnapshot
+from heuristics import EARTH_RADIUS_NAUTICAL_MILES, heuristic_to_target
+from search_state import get_search_state
+from search_stats import SearchStats
 
 
-def haversine_heuristic(port1: PortData, port2: PortData) -> float:
-    """Эвристика: расстояние по прямой."""
-    lat1, lon1 = math.radians(port1.latitude), math.radians(port1.longitude)
-    lat2, lon2 = math.radians(port2.latitude), math.radians(port2.longitude)
+def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Расстояние по дуге большого круга между двумя точками (в градусах)."""
+    lat1, lon1 = math.radians(lat1), math.radians(lon1)
+    lat2, lon2 = math.radians(lat2), math.radians(lon2)
     dlon = lon2 - lon1
     dlat = lat2 - lat1
     a = (
@@ -23,105 +26,276 @@ def haversine_heuristic(port1: PortData, port2: PortData) -> float:
     return EARTH_RADIUS_NAUTICAL_MILES * c
 
 
-def reconstruct_path_from_data(
-    came_from: Dict[int, Optional[int]],  # Изменил тип значения на Optional[int]
-    current_port_id: int,
-    all_ports_data: Dict[int, PortData],
-) -> List[PortData]:
-    """Восстанавливает путь, используя предоставленные данные о портах."""
-    path_data: List[PortData] = []
-    temp_id: Optional[int] = current_port_id  # temp_id может стать None
-    while temp_id is not None:
-        port_obj = all_ports_data.get(temp_id)
-        if port_obj:
-            path_data.append(port_obj)
-        else:
-            raise ValueError(
-                f"Port with ID {temp_id} not found in all_ports_data during path reconstruction."
-            )
-        temp_id = came_from.get(temp_id)
-    path_data.reverse()
-    return path_data
+def haversine_heuristic(port1: PortData, port2: PortData) -> float:
+    """Эвристика: расстояние по прямой."""
+    return haversine_distance(
+        port1.latitude, port1.longitude, port2.latitude, port2.longitude
+    )
+
+
+def reconstruct_path(came_from: List[int], current_idx: int) -> List[int]:
+    """Восстанавливает путь (индексы портов в графе) по массиву предшественников."""
+    path: List[int] = []
+    while current_idx != -1:
+        path.append(current_idx)
+        current_idx = came_from[current_idx]
+    path.reverse()
+    return path
 
 
 def a_star_search_algorithm(
-    start_port: PortData,
-    end_port: PortData,
-    all_ports_map: Dict[int, PortData],
-    get_neighbors_callable: Callable[[int], List[Dict[str, Any]]],
-) -> Tuple[Optional[List[PortData]], Optional[float]]:
+    graph: GraphSnapshot,
+    start_idx: int,
+    end_idx: int,
+    stats: Optional[SearchStats] = None,
+    heuristic: str = "haversine",
+) -> Tuple[Optional[List[int]], Optional[float]]:
     """
-    Реализация A* для данных.
-    get_neighbors_callable: функция(port_id: int) -> List[Dict[str, Any]]
-    Возвращает (список_объектов_PortData_пути, общая_дистанция) или (None, None).
+    Реализация A* поверх снимка графа в памяти (без обращений к БД).
+    start_idx / end_idx — индексы портов в графе (graph.index_of(port_id)).
+    heuristic: "haversine" — расстояние по прямой, "alt" — оценка по ориентирам
+    (неравенство треугольника), взятая максимумом с расстоянием по прямой.
+    Возвращает (список_индексов_портов_пути, общая_дистанция) или (None, None).
     """
-    open_set: list[Tuple[float, int, PortData]] = []
-    heapq.heappush(
-        open_set,
-        (0 + haversine_heuristic(start_port, end_port), start_port.id, start_port),
-    )
+    offsets = graph.offsets
+    targets = graph.targets
+    distances = graph.distances
+    # Оценки до end_idx для всех портов: один векторизованный проход на цель
+    # (с кешем), в цикле — только выборка по списку соседей.
+    estimates = heuristic_to_target(graph, end_idx, heuristic)
 
-    came_from: Dict[int, Optional[int]] = {start_port.id: None}
+    if stats is not None:
+        stats.engine = "astar"
+        stats.heuristic = heuristic
+    nodes_expanded = 0
+    edges_relaxed = 0
+    heap_pushes = 0
+    stale_pops = 0
+    max_open_set = 1
 
-    g_score: Dict[int, float] = {port_id: float("inf") for port_id in all_ports_map}
-    g_score[start_port.id] = 0
+    # Переиспользуемое состояние потока: g_score/came_from действительны
+    # только для портов с отметкой текущего поколения.
+    state = get_search_state(graph)
+    generation = state.next_generation()
+    stamps = state.stamps
+    open_stamps = state.open_stamps
+    came_from = state.came_from
+    g_score = state.g_score
 
-    f_score: Dict[int, float] = {port_id: float("inf") for port_id in all_ports_map}
-    f_score[start_port.id] = haversine_heuristic(start_port, end_port)
+    stamps[start_idx] = generation
+    came_from[start_idx] = -1
+    g_score[start_idx] = 0.0
 
-    open_set_ids = {start_port.id}
+    open_set: List[Tuple[float, int]] = [(float(estimates[start_idx]), start_idx)]
+    open_stamps[start_idx] = generation
 
     while open_set:
-        current_f, current_port_id, current_port_obj = heapq.heappop(open_set)
+        _, current_idx = heapq.heappop(open_set)
 
-        if current_port_id not in open_set_ids:
+        # В куче могут лежать устаревшие записи с худшим f_score — пропускаем их.
+        if open_stamps[current_idx] != generation:
+            stale_pops += 1
             continue
-        open_set_ids.remove(current_port_id)
-
-        if current_port_id == end_port.id:
-            path = reconstruct_path_from_data(came_from, current_port_id, all_ports_map)
-            return path, g_score[current_port_id]
-
-        neighbor_segments_dicts = get_neighbors_callable(current_port_id)
-
-        for segment_dict in neighbor_segments_dicts:
-            try:
-                segment_data = SegmentDataForAStar(**segment_dict)
-                neighbor_port_obj = segment_data.PortOfArrival
-            except Exception as e:
-                print(
-                    f"Warning: Could not parse segment data: {segment_dict}, error: {e}"
-                )  # Логирование
-                continue
-
-            neighbor_port_id = neighbor_port_obj.id
-
-            # Проверяем, есть ли сосед вообще в нашем графе all_ports_map.
-            # Это важно, если get_neighbors_callable может вернуть сегмент к порту,
-            # которого нет в all_ports_map (например, из-за фильтрации портов при загрузке).
-            if neighbor_port_id not in all_ports_map:
-                # print(f"Warning: Neighbor port ID {neighbor_port_id} not in all_ports_map. Skipping segment.")
-                continue
-
-            tentative_g_score = (
-                g_score.get(current_port_id, float("inf")) + segment_data.distance
-            )
-
-            if tentative_g_score < g_score.get(neighbor_port_id, float("inf")):
-                came_from[neighbor_port_id] = current_port_id
-                g_score[neighbor_port_id] = tentative_g_score
-                f_score[neighbor_port_id] = tentative_g_score + haversine_heuristic(
-                    neighbor_port_obj, end_port
+        open_stamps[current_idx] = 0
+        nodes_expanded += 1
+
+        if current_idx == end_idx:
+            if stats is not None:
+                stats.set_counters(
+                    nodes_expanded, edges_relaxed, heap_pushes, stale_pops, max_open_set
                 )
+            return reconstruct_path(came_from, current_idx), g_score[current_idx]
+
+        current_g = g_score[current_idx]
+        edge_start = offsets[current_idx]
+        edge_end = offsets[current_idx + 1]
+        neighbors = targets[edge_start:edge_end]
+        edges_relaxed += edge_end - edge_start
 
-                # Добавляем в кучу, даже если уже там (с худшим f_score).
-                # Проверка `if current_port_id not in open_set_ids:` при извлечении отсеет старые.
+        for neighbor_idx, distance, neighbor_estimate in zip(
+            neighbors.tolist(),
+            distances[edge_start:edge_end].tolist(),
+            estimates[neighbors].tolist(),
+        ):
+            tentative_g_score = current_g + distance
+            if (
+                stamps[neighbor_idx] != generation
+                or tentative_g_score < g_score[neighbor_idx]
+            ):
+                # Ориентиры доказали, что из соседа цель недостижима.
+                if neighbor_estimate == math.inf:
+                    continue
+                stamps[neighbor_idx] = generation
+                came_from[neighbor_idx] = current_idx
+                g_score[neighbor_idx] = tentative_g_score
                 heapq.heappush(
                     open_set,
-                    (f_score[neighbor_port_id], neighbor_port_id, neighbor_port_obj),
+                    (tentative_g_score + neighbor_estimate, neighbor_idx),
                 )
-                open_set_ids.add(
-                    neighbor_port_id
-                )  # Добавляем/обновляем, что он в очереди
+                heap_pushes += 1
+                open_stamps[neighbor_idx] = generation
+        if len(open_set) > max_open_set:
+            max_open_set = len(open_set)
 
+    if stats is not None:
+        stats.set_counters(
+            nodes_expanded, edges_relaxed, heap_pushes, stale_pops, max_open_set
+        )
     return None, None
+
+
+def alt_a_star_search(
+    graph: GraphSnapshot,
+    start_idx: int,
+    end_idx: int,
+    stats: Optional[SearchStats] = None,
+) -> Tuple[Optional[List[int]], Optional[float]]:
+    """A* с эвристикой ALT (движок "alt")."""
+    return a_star_search_algorithm(graph, start_idx, end_idx, stats, heuristic="alt")
+
+
+def bidirectional_a_star_search(
+    graph: GraphSnapshot,
+    start_idx: int,
+    end_idx: int,
+    stats: Optional[SearchStats] = None,
+) -> Tuple[Optional[List[int]], Optional[float]]:
+    """
+    Двунаправленный A* с согласованным усредненным потенциалом
+    p(v) = (h_t(v) - h_s(v)) / 2: прямой поиск идет от start по исходящим
+    сегментам, обратный — от end по входящим (обратный CSR графа).
+    Останов по сумме минимальных ключей верен только для согласованных
+    h_s и h_t — это обеспечивает graph.heuristic_scale (масштаб уменьшен,
+    если дистанция какого-то сегмента меньше расстояния по прямой).
+    Контракт совпадает с a_star_search_algorithm.
+    """
+    if stats is not None:
+        stats.engine = "bidirectional"
+        stats.heuristic = "haversine"
+    if start_idx == end_idx:
+        return [start_idx], 0.0
+
+    forward_potentials = (
+        heuristic_to_target(graph, end_idx) - heuristic_to_target(graph, start_idx)
+    ) / 2
+
+    # Индекс 0 — прямое направление, 1 — обратное.
+    adjacency = (
+        (graph.offsets, graph.targets, graph.distances),
+        (graph.reverse_offsets, graph.reverse_sources, graph.reverse_distances),
+    )
+    # Обратный поиск использует потенциал с противоположным знаком.
+    potentials = (forward_potentials, -forward_potentials)
+    # Переиспользуемые состояния потока (см. SearchState); open_stamps здесь
+    # отмечают окончательно обработанные порты.
+    states = (get_search_state(graph, 0), get_search_state(graph, 1))
+    generations = (states[0].next_generation(), states[1].next_generation())
+    open_sets: Tuple[List[Tuple[float, int]], List[Tuple[float, int]]] = ([], [])
+
+    for side, root_idx in ((0, start_idx), (1, end_idx)):
+        states[side].stamps[root_idx] = generations[side]
+        states[side].g_score[root_idx] = 0.0
+        states[side].came_from[root_idx] = -1
+        heapq.heappush(open_sets[side], (float(potentials[side][root_idx]), root_idx))
+
+    best_distance = math.inf
+    meeting_idx = -1
+    nodes_expanded = 0
+    edges_relaxed = 0
+    heap_pushes = 0
+    stale_pops = 0
+    max_open_set = 2
+
+    while open_sets[0] and open_sets[1]:
+        # Сумма минимальных ключей — нижняя граница любого еще не найденного пути.
+        if open_sets[0][0][0] + open_sets[1][0][0] >= best_distance:
+            break
+
+        # Расширяем направление с меньшим фронтом.
+        side = 0 if len(open_sets[0]) <= len(open_sets[1]) else 1
+        _, current_idx = heapq.heappop(open_sets[side])
+        state = states[side]
+        generation = generations[side]
+        settled = state.open_stamps
+        if settled[current_idx] == generation:
+            stale_pops += 1
+            continue
+        settled[current_idx] = generation
+        nodes_expanded += 1
+
+        offsets, neighbors, distances = adjacency[side]
+        stamps = state.stamps
+        g_score = state.g_score
+        side_came_from = state.came_from
+        other_state = states[1 - side]
+        other_generation = generations[1 - side]
+        other_stamps = other_state.stamps
+        other_g_score = other_state.g_score
+        side_potentials = potentials[side]
+        current_g = g_score[current_idx]
+        edge_start = offsets[current_idx]
+        edge_end = offsets[current_idx + 1]
+        neighbor_slice = neighbors[edge_start:edge_end]
+        edges_relaxed += edge_end - edge_start
+
+        for neighbor_idx, distance, neighbor_potential in zip(
+            neighbor_slice.tolist(),
+            distances[edge_start:edge_end].tolist(),
+            side_potentials[neighbor_slice].tolist(),
+        ):
+            tentative_g_score = current_g + distance
+            if (
+                stamps[neighbor_idx] != generation
+                or tentative_g_score < g_score[neighbor_idx]
+            ):
+                stamps[neighbor_idx] = generation
+                g_score[neighbor_idx] = tentative_g_score
+                side_came_from[neighbor_idx] = current_idx
+                heapq.heappush(
+                    open_sets[side],
+                    (tentative_g_score + neighbor_potential, neighbor_idx),
+                )
+                heap_pushes += 1
+                if other_stamps[neighbor_idx] == other_generation:
+                    candidate_distance = tentative_g_score + other_g_score[neighbor_idx]
+                    if candidate_distance < best_distance:
+                        best_distance = candidate_distance
+                        meeting_idx = neighbor_idx
+        open_set_size = len(open_sets[0]) + len(open_sets[1])
+        if open_set_size > max_open_set:
+            max_open_set = open_set_size
+
+    if stats is not None:
+        stats.set_counters(
+            nodes_expanded, edges_relaxed, heap_pushes, stale_pops, max_open_set
+        )
+    if meeting_idx == -1:
+        return None, None
+
+    # Прямая часть пути: start -> meeting, обратная: meeting -> end.
+    path = reconstruct_path(states[0].came_from, meeting_idx)
+    next_idx = states[1].came_from[meeting_idx]
+    while next_idx != -1:
+        path.append(next_idx)
+        next_idx = states[1].came_from[next_idx]
+    return path, best_distance
+
+
+SearchEngine = Callable[
+    [GraphSnapshot, int, int, Optional[SearchStats]],
+    Tuple[Optional[List[int]], Optional[float]],
+]
+
+# Доступные движки поиска: выбираются полем search_engine в сообщении Kafka
+# или переменной окружения SEARCH_ENGINE.
+SEARCH_ENGINES: Dict[str, SearchEngine] = {
+    "astar": a_star_search_algorithm,
+    "alt": alt_a_star_search,
+    "bidirectional": bidirectional_a_star_search,
+    "ch": contraction_hierarchy_search,
+}
+
+
+def get_search_engine(name: Optional[str]) -> Optional[SearchEngine]:
+    """Возвращает функцию поиска по имени движка или None для неизвестного имени."""
+    return SEARCH_ENGINES.get(name) if name else None
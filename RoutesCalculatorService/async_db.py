@@ -0,0 +1,276 @@
+# RoutesCalculatorService/async_db.py
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import asyncpg
+from db_interface import (
+    DATABASE_HOST,
+    DATABASE_NAME,
+    DATABASE_PASSWORD,
+    DATABASE_PORT,
+    DATABASE_USER,
+    _calculation_task_params,
+)
+
+# Размер пула соединений asyncpg.
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Сколько подготовленных запросов кешируется на каждом соединении.
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+
+# Ошибки сервера, протокола и сети: вызывающий получает значение по умолчанию.
+_DB_ERRORS = (asyncpg.PostgresError, asyncpg.InterfaceError, OSError)
+
+_CONNECT_KWARGS: Dict[str, Any] = {
+    "host": DATABASE_HOST,
+    "port": int(DATABASE_PORT),
+    "user": DATABASE_USER,
+    "password": DATABASE_PASSWORD,
+    "database": DATABASE_NAME,
+}
+
+# Пул создается лениво в event loop консьюмера.
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock: Optional[asyncio.Lock] = None
+
+
+async def get_pool() -> asyncpg.Pool:
+    """
+    Возвращает пул соединений asyncpg, создавая его при первом вызове.
+    asyncpg подготавливает каждый запрос на соединении один раз и
+    переиспользует его (statement cache), поэтому повторные вызовы не
+    разбирают SQL заново.
+    """
+    global _pool, _pool_lock
+    if _pool is not None:
+        return _pool
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await asyncpg.create_pool(
+                **_CONNECT_KWARGS,
+                min_size=DB_POOL_MIN_SIZE,
+                max_size=DB_POOL_MAX_SIZE,
+                statement_cache_size=DB_STATEMENT_CACHE_SIZE,
+            )
+    return _pool
+
+
+async def close_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+async def listen(
+    channel: str, callback: Callable[..., Any]
+) -> Optional[asyncpg.Connection]:
+    """
+    Открывает отдельное соединение (не из пула: LISTEN действует, пока
+    соединение живо) и подписывает callback(connection, pid, channel, payload)
+    на уведомления канала. None, если подключиться не удалось.
+    """
+    connection: Optional[asyncpg.Connection] = None
+    try:
+        connection = await asyncpg.connect(**_CONNECT_KWARGS)
+        await connection.add_listener(channel, callback)
+        return connection
+    except _DB_ERRORS as e:
+        print(f"Database error subscribing to channel {channel}: {e}")
+        if connection is not None:
+            connection.terminate()
+    return None
+
+
+_GET_PORT_BY_ID_QUERY = (
+    "SELECT id, name, latitude, longitude FROM ports_port WHERE id = $1"
+)
+
+_GET_ALL_PORTS_QUERY = (
+    "SELECT id, name, latitude, longitude FROM ports_port ORDER BY id"
+)
+
+_GET_SEGMENTS_FOR_PORT_QUERY = """
+    SELECT
+        s.id AS segment_id,
+        s."PortOfDeparture_id",
+        s.distance,
+        p_arrival.id AS arrival_port_id,
+        p_arrival.name AS arrival_port_name,
+        p_arrival.latitude AS arrival_port_latitude,
+        p_arrival.longitude AS arrival_port_longitude
+    FROM ports_segment s
+    JOIN ports_port p_arrival ON s."PortOfArrival_id" = p_arrival.id
+    WHERE s."PortOfDeparture_id" = $1
+"""
+
+_GET_ALL_SEGMENTS_QUERY = """
+    SELECT id, "PortOfDeparture_id", "PortOfArrival_id", distance,
+           average_speed, estimated_time
+    FROM ports_segment
+    ORDER BY id
+"""
+
+_GET_SEGMENTS_VERSION_QUERY = """
+    SELECT md5(COALESCE(string_agg(
+        concat_ws(
+            ':', id, "PortOfDeparture_id", "PortOfArrival_id", distance,
+            average_speed, estimated_time
+        ),
+        ',' ORDER BY id
+    ), '')) AS version
+    FROM ports_segment
+"""
+
+# Пачка задач передается массивами столбцов: один подготовленный запрос
+# подходит для пачки любого размера.
+_UPDATE_CALCULATION_TASKS_QUERY = """
+    UPDATE tasks_calculationtask AS t
+    SET status = v.status,
+        result_path = v.result_path,
+        result_distance = v.result_distance,
+        result_waypoints_data = v.result_waypoints_data,
+        vessel_speed_knots = v.vessel_speed_knots,
+        result_alternatives = v.result_alternatives,
+        result_legs = v.result_legs,
+        search_stats = v.search_stats,
+        error_message = v.error_message,
+        updated_at = CURRENT_TIMESTAMP
+    FROM unnest(
+        $1::uuid[], $2::varchar[], $3::jsonb[], $4::double precision[],
+        $5::jsonb[], $6::double precision[], $7::jsonb[], $8::jsonb[], $9::jsonb[],
+        $10::text[]
+    ) AS v(
+        task_id, status, result_path, result_distance, result_waypoints_data,
+        vessel_speed_knots, result_alternatives, result_legs, search_stats,
+        error_message
+    )
+    WHERE t.task_id = v.task_id
+"""
+
+_UPDATE_COLUMNS = (
+    "task_id",
+    "status",
+    "result_path",
+    "result_distance",
+    "result_waypoints_data",
+    "vessel_speed_knots",
+    "result_alternatives",
+    "result_legs",
+    "search_stats",
+    "error_message",
+)
+
+
+async def get_port_by_id(port_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Извлекает данные порта по его ID.
+    Возвращает словарь или None, если порт не найден.
+    """
+    try:
+        pool = await get_pool()
+        row = await pool.fetchrow(_GET_PORT_BY_ID_QUERY, port_id)
+        if row is not None:
+            return dict(row)
+    except _DB_ERRORS as e:
+        print(f"Database error in async get_port_by_id for port_id {port_id}: {e}")
+    return None
+
+
+async def get_all_ports_for_algorithm() -> List[Dict[str, Any]]:
+    """Все порты (id, name, latitude, longitude) для снимка графа в памяти."""
+    try:
+        pool = await get_pool()
+        return [dict(row) for row in await pool.fetch(_GET_ALL_PORTS_QUERY)]
+    except _DB_ERRORS as e:
+        print(f"Database error in async get_all_ports_for_algorithm: {e}")
+    return []
+
+
+async def get_segments_for_port(port_id: int) -> List[Dict[str, Any]]:
+    """
+    Все сегменты, исходящие из данного порта, включая данные о порте
+    назначения (в том же формате, что и db_interface.get_segments_for_port).
+    """
+    try:
+        pool = await get_pool()
+        rows = await pool.fetch(_GET_SEGMENTS_FOR_PORT_QUERY, port_id)
+    except _DB_ERRORS as e:
+        print(
+            f"Database error in async get_segments_for_port for port_id {port_id}: {e}"
+        )
+        return []
+    return [
+        {
+            "id": row["segment_id"],
+            "PortOfDeparture_id": row["PortOfDeparture_id"],
+            "PortOfArrival_id": row["arrival_port_id"],
+            "distance": row["distance"],
+            "PortOfArrival": {
+                "id": row["arrival_port_id"],
+                "name": row["arrival_port_name"],
+                "latitude": row["arrival_port_latitude"],
+                "longitude": row["arrival_port_longitude"],
+            },
+        }
+        for row in rows
+    ]
+
+
+async def get_all_segments_for_graph() -> Optional[List[Dict[str, Any]]]:
+    """
+    Все сегменты одним запросом (без данных о портах) для снимка графа.
+    None при ошибке — в отличие от пустого списка (сегментов в БД нет).
+    """
+    try:
+        pool = await get_pool()
+        return [dict(row) for row in await pool.fetch(_GET_ALL_SEGMENTS_QUERY)]
+    except _DB_ERRORS as e:
+        print(f"Database error in async get_all_segments_for_graph: {e}")
+    return None
+
+
+async def get_segments_version() -> Optional[str]:
+    """Версия (md5 содержимого) таблицы ports_segment; None при ошибке."""
+    try:
+        pool = await get_pool()
+        return await pool.fetchval(_GET_SEGMENTS_VERSION_QUERY)
+    except _DB_ERRORS as e:
+        print(f"Database error in async get_segments_version: {e}")
+    return None
+
+
+async def update_calculation_tasks(updates: List[Dict[str, Any]]) -> bool:
+    """
+    Обновляет несколько задач расчета одним UPDATE в одной транзакции.
+    Каждый элемент updates — именованные аргументы update_calculation_task
+    (task_id, status, result_path, ...). Если задача встречается несколько
+    раз, записывается ее последнее обновление.
+    """
+    if not updates:
+        return True
+    latest_updates = list({update["task_id"]: update for update in updates}.values())
+    task_ids = [update["task_id"] for update in latest_updates]
+    rows = [_calculation_task_params(**update) for update in latest_updates]
+    columns = [
+        [str(row[column]) if column == "task_id" else row[column] for row in rows]
+        for column in _UPDATE_COLUMNS
+    ]
+    try:
+        pool = await get_pool()
+        await pool.execute(_UPDATE_CALCULATION_TASKS_QUERY, *columns)
+        print(f"Tasks {task_ids} updated in DB in one transaction.")
+        return True
+    except _DB_ERRORS as e:
+        print(f"Database error updating tasks {task_ids}: {e}")
+    return False
+
+
+async def update_calculation_task(task_id: str, status: str, **fields: Any) -> bool:
+    """Обновляет одну задачу; аргументы — как у db_interface.update_calculation_task."""
+    return await update_calculation_tasks(
+        [dict(task_id=task_id, status=status, **fields)]
+    )
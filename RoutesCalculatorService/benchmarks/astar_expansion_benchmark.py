@@ -0,0 +1,182 @@
+# RoutesCalculatorService/benchmarks/astar_expansion_benchmark.py
+"""
+Стоимость одного раскрытия узла в A*: исходная реализация (словари сегментов
+валидируются в SegmentDataForAStar с вложенным PortData на каждом ребре,
+в куче лежат объекты Pydantic) против текущей (массивы снимка графа,
+проверенные один раз при загрузке).
+
+Запуск из каталога RoutesCalculatorService:
+    python benchmarks/astar_expansion_benchmark.py [число_портов] [число_запросов]
+"""
+
+import heapq
+import math
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from a_star import a_star_search_algorithm, haversine_distance  # noqa: E402
+from data_models import PortData, SegmentDataForAStar  # noqa: E402
+from graph import build_graph_snapshot  # noqa: E402
+from search_stats import SearchStats  # noqa: E402
+
+
+def legacy_a_star_search(
+    start_port: PortData,
+    end_port: PortData,
+    all_ports_map: Dict[int, PortData],
+    get_neighbors_callable: Callable[[int], List[Dict[str, Any]]],
+) -> Tuple[Optional[List[int]], Optional[float]]:
+    """A* в том виде, в каком он был до снимка графа (без обращений к БД)."""
+
+    def heuristic(port1: PortData, port2: PortData) -> float:
+        return haversine_distance(
+            port1.latitude, port1.longitude, port2.latitude, port2.longitude
+        )
+
+    open_set: List[Tuple[float, int, PortData]] = [
+        (heuristic(start_port, end_port), start_port.id, start_port)
+    ]
+    came_from: Dict[int, Optional[int]] = {start_port.id: None}
+    g_score: Dict[int, float] = {port_id: math.inf for port_id in all_ports_map}
+    g_score[start_port.id] = 0.0
+    open_set_ids = {start_port.id}
+
+    while open_set:
+        _, current_port_id, _ = heapq.heappop(open_set)
+        if current_port_id not in open_set_ids:
+            continue
+        open_set_ids.remove(current_port_id)
+
+        if current_port_id == end_port.id:
+            path = []
+            temp_id: Optional[int] = current_port_id
+            while temp_id is not None:
+                path.append(temp_id)
+                temp_id = came_from.get(temp_id)
+            return path[::-1], g_score[current_port_id]
+
+        for segment_dict in get_neighbors_callable(current_port_id):
+            segment_data = SegmentDataForAStar(**segment_dict)
+            neighbor_port_obj = segment_data.PortOfArrival
+            neighbor_port_id = neighbor_port_obj.id
+            tentative_g_score = g_score[current_port_id] + segment_data.distance
+            if tentative_g_score < g_score[neighbor_port_id]:
+                came_from[neighbor_port_id] = current_port_id
+                g_score[neighbor_port_id] = tentative_g_score
+                heapq.heappush(
+                    open_set,
+                    (
+                        tentative_g_score + heuristic(neighbor_port_obj, end_port),
+                        neighbor_port_id,
+                        neighbor_port_obj,
+                    ),
+                )
+                open_set_ids.add(neighbor_port_id)
+
+    return None, None
+
+
+def generate_graph_rows(
+    num_ports: int, degree: int = 4, seed: int = 42
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Случайные порты и сегменты к ближайшим соседям (дистанция >= по прямой)."""
+    rng = random.Random(seed)
+    ports = [
+        {
+            "id": port_id,
+            "name": f"Port {port_id}",
+            "latitude": rng.uniform(-60.0, 60.0),
+            "longitude": rng.uniform(-170.0, 170.0),
+        }
+        for port_id in range(1, num_ports + 1)
+    ]
+    segments = []
+    for port in ports:
+        nearest = sorted(
+            ports,
+            key=lambda other: haversine_distance(
+                port["latitude"],
+                port["longitude"],
+                other["latitude"],
+                other["longitude"],
+            ),
+        )[1 : degree + 1]
+        for other in nearest:
+            segments.append(
+                {
+                    "id": len(segments) + 1,
+                    "PortOfDeparture_id": port["id"],
+                    "PortOfArrival_id": other["id"],
+                    "distance": haversine_distance(
+                        port["latitude"],
+                        port["longitude"],
+                        other["latitude"],
+                        other["longitude"],
+                    )
+                    * rng.uniform(1.0, 1.3),
+                }
+            )
+    return ports, segments
+
+
+def main() -> None:
+    num_ports = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    num_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    ports, segments = generate_graph_rows(num_ports)
+    rng = random.Random(7)
+    queries = [
+        (rng.choice(ports)["id"], rng.choice(ports)["id"]) for _ in range(num_queries)
+    ]
+
+    # До: словари сегментов в формате db_interface.get_segments_for_port.
+    ports_by_id = {port["id"]: port for port in ports}
+    all_ports_map = {port["id"]: PortData(**port) for port in ports}
+    segments_by_port: Dict[int, List[Dict[str, Any]]] = {}
+    for segment in segments:
+        segments_by_port.setdefault(segment["PortOfDeparture_id"], []).append(
+            dict(segment, PortOfArrival=ports_by_id[segment["PortOfArrival_id"]])
+        )
+    legacy_expansions = 0
+
+    def get_neighbors(port_id: int) -> List[Dict[str, Any]]:
+        nonlocal legacy_expansions
+        legacy_expansions += 1
+        return segments_by_port.get(port_id, [])
+
+    started_at = time.perf_counter()
+    for start_id, end_id in queries:
+        legacy_a_star_search(
+            all_ports_map[start_id], all_ports_map[end_id], all_ports_map, get_neighbors
+        )
+    legacy_seconds = time.perf_counter() - started_at
+
+    # После: снимок графа (строится и валидируется один раз).
+    graph = build_graph_snapshot(ports, segments)
+    snapshot_expansions = 0
+    started_at = time.perf_counter()
+    for start_id, end_id in queries:
+        stats = SearchStats()
+        a_star_search_algorithm(
+            graph, graph.index_of(start_id), graph.index_of(end_id), stats
+        )
+        snapshot_expansions += stats.nodes_expanded
+    snapshot_seconds = time.perf_counter() - started_at
+
+    print(f"Портов: {num_ports}, сегментов: {len(segments)}, запросов: {num_queries}")
+    for label, seconds, expansions in (
+        ("до (Pydantic на каждом ребре)", legacy_seconds, legacy_expansions),
+        ("после (массивы снимка графа)", snapshot_seconds, snapshot_expansions),
+    ):
+        print(
+            f"{label}: {expansions} раскрытий, {seconds:.3f} с, "
+            f"{seconds / max(expansions, 1) * 1e6:.2f} мкс на раскрытие"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+# RoutesCalculatorService/benchmarks/search_engines_benchmark.py
+"""
+Бенчмарк движков поиска на синтетических графах (см. synthetic_graph.py):
+для каждого размера графа и вида нагрузки один и тот же набор запросов
+выполняется каждым движком. Отчет: задержка (p50/p90/p99), раскрытые узлы,
+записи в куче, память (пик выделений на запрос по tracemalloc и максимальный
+RSS процесса), время подготовки движка (CH, ориентиры ALT). Дистанции
+сверяются с движком astar. Результаты пишутся в JSON для сравнения между
+коммитами (--baseline — файл предыдущего запуска).
+
+Запуск из каталога RoutesCalculatorService:
+    python benchmarks/search_engines_benchmark.py --sizes 1000,10000,100000
+    python benchmarks/search_engines_benchmark.py --sizes 1000000 \\
+        --engines astar,bidirectional --baseline benchmarks/results/<файл>.json
+
+Движок one_to_many запускается с одной целью (Дейкстра без эвристики),
+yen — с ALTERNATIVES маршрутами. Оракул всех пар не участвует: его таблица
+занимает O(N^2) памяти. Подготовка CH на больших графах занимает минуты.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Иерархия и ориентиры, построенные для синтетических графов, не должны
+# подменять файлы сервиса в cache/.
+_CACHE_DIR = os.path.join(tempfile.gettempdir(), "routeplan_benchmarks")
+os.environ.setdefault(
+    "CH_CACHE_PATH", os.path.join(_CACHE_DIR, "contraction_hierarchy.npz")
+)
+os.environ.setdefault("LANDMARKS_CACHE_PATH", os.path.join(_CACHE_DIR, "landmarks.npz"))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from a_star import SEARCH_ENGINES  # noqa: E402
+from contraction_hierarchies import get_contraction_hierarchy  # noqa: E402
+from dijkstra import one_to_many_search  # noqa: E402
+from graph import GraphSnapshot  # noqa: E402
+from k_shortest_paths import k_shortest_paths  # noqa: E402
+from landmarks import get_landmarks  # noqa: E402
+from search_stats import SearchStats  # noqa: E402
+from synthetic_graph import generate_synthetic_graph, query_workload  # noqa: E402
+
+RESULTS_FORMAT_VERSION = 1
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+WORKLOADS = ("random", "regional")
+# Сколько маршрутов ищет движок yen.
+ALTERNATIVES = 3
+# Запросов (других, чем в замере времени) в проходе с tracemalloc.
+MEMORY_QUERIES = 10
+
+Query = Callable[[GraphSnapshot, int, int, SearchStats], Optional[float]]
+
+
+def _route_query(engine: Callable[..., Any]) -> Query:
+    def query(graph, start_idx, end_idx, stats):
+        return engine(graph, start_idx, end_idx, stats)[1]
+
+    return query
+
+
+def _one_to_many_query(graph, start_idx, end_idx, stats):
+    return one_to_many_search(graph, start_idx, [end_idx], stats)[0][1]
+
+
+def _yen_query(graph, start_idx, end_idx, stats):
+    routes = k_shortest_paths(graph, start_idx, end_idx, ALTERNATIVES, stats)
+    return routes[0][1] if routes else None
+
+
+# Движок -> (запрос, подготовка производных структур графа).
+ENGINES: Dict[str, Tuple[Query, Optional[Callable[[GraphSnapshot], Any]]]] = {
+    "astar": (_route_query(SEARCH_ENGINES["astar"]), None),
+    "alt": (_route_query(SEARCH_ENGINES["alt"]), get_landmarks),
+    "bidirectional": (_route_query(SEARCH_ENGINES["bidirectional"]), None),
+    "ch": (_route_query(SEARCH_ENGINES["ch"]), get_contraction_hierarchy),
+    "one_to_many": (_one_to_many_query, None),
+    "yen": (_yen_query, None),
+}
+
+
+def _git_revision() -> Tuple[Optional[str], Optional[bool]]:
+    """Коммит рабочего дерева и признак незакоммиченных изменений."""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+def _max_rss_mb() -> float:
+    # ru_maxrss — в килобайтах (Linux).
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _graph_bytes(graph: GraphSnapshot) -> int:
+    return sum(array.nbytes for array in graph.to_arrays().values())
+
+
+def _same_distance(a: Optional[float], b: Optional[float]) -> bool:
+    if a is None or b is None:
+        return a is None and b is None
+    return abs(a - b) <= 1e-6 * max(1.0, abs(a))
+
+
+def _distribution(values: List[float], digits: int) -> Dict[str, float]:
+    array = np.asarray(values, dtype=np.float64)
+    return {
+        "mean": round(float(array.mean()), digits),
+        "p50": round(float(np.percentile(array, 50)), digits),
+        "p90": round(float(np.percentile(array, 90)), digits),
+        "p99": round(float(np.percentile(array, 99)), digits),
+        "max": round(float(array.max()), digits),
+    }
+
+
+def _query_peak_bytes(
+    graph: GraphSnapshot, query: Query, queries: List[Tuple[int, int]]
+) -> int:
+    """Наибольший пик выделений памяти за один запрос (tracemalloc)."""
+    peak = 0
+    tracemalloc.start()
+    try:
+        for start_idx, end_idx in queries:
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            query(graph, start_idx, end_idx, SearchStats())
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_engine(
+    graph: GraphSnapshot,
+    engine: str,
+    queries: List[Tuple[int, int]],
+    memory_queries: List[Tuple[int, int]],
+    reference: Optional[List[Optional[float]]],
+) -> Tuple[Dict[str, Any], List[Optional[float]]]:
+    """Прогон одного движка на наборе запросов; (результат, дистанции)."""
+    query, prepare = ENGINES[engine]
+    started_at = time.perf_counter()
+    if prepare is not None:
+        prepare(graph)
+    # Первый запрос выделяет состояние поиска потока — в замер не входит.
+    query(graph, *queries[0], SearchStats())
+    prepare_seconds = time.perf_counter() - started_at
+
+    latencies_ms: List[float] = []
+    nodes_expanded: List[int] = []
+    heap_pushes: List[int] = []
+    max_open_set = 0
+    distances: List[Optional[float]] = []
+    for start_idx, end_idx in queries:
+        stats = SearchStats()
+        started_at = time.perf_counter()
+        distance = query(graph, start_idx, end_idx, stats)
+        latencies_ms.append((time.perf_counter() - started_at) * 1000)
+        nodes_expanded.append(stats.nodes_expanded)
+        heap_pushes.append(stats.heap_pushes)
+        max_open_set = max(max_open_set, stats.max_open_set)
+        distances.append(distance)
+
+    mismatches = None
+    if reference is not None:
+        mismatches = sum(
+            not _same_distance(expected, distance)
+            for expected, distance in zip(reference, distances)
+        )
+    return {
+        "engine": engine,
+        "prepare_seconds": round(prepare_seconds, 4),
+        "queries": len(queries),
+        "found": sum(distance is not None for distance in distances),
+        "mismatches": mismatches,
+        "latency_ms": _distribution(latencies_ms, 4),
+        "nodes_expanded": _distribution(nodes_expanded, 1),
+        "heap_pushes": _distribution(heap_pushes, 1),
+        "max_open_set": max_open_set,
+        "query_peak_bytes": _query_peak_bytes(graph, query, memory_queries),
+        "max_rss_mb": round(_max_rss_mb(), 1),
+    }, distances
+
+
+def run_benchmark(
+    sizes: List[int],
+    engines: List[str],
+    workloads: List[str],
+    num_queries: int,
+    seed: int,
+) -> List[Dict[str, Any]]:
+    results: List[Dict[str, Any]] = []
+    for size in sizes:
+        started_at = time.perf_counter()
+        graph, region_of_port = generate_synthetic_graph(size, seed)
+        build_seconds = time.perf_counter() - started_at
+        print(
+            f"Граф: {graph.num_ports} портов, {graph.num_segments} сегментов, "
+            f"{region_of_port[-1] + 1} регионов, построен за {build_seconds:.2f} с."
+        )
+        for workload in workloads:
+            queries = query_workload(region_of_port, num_queries, workload, seed)
+            memory_queries = query_workload(
+                region_of_port, MEMORY_QUERIES, workload, seed + 1
+            )
+            reference = None
+            for engine in engines:
+                result, distances = run_engine(
+                    graph, engine, queries, memory_queries, reference
+                )
+                if engine == "astar":
+                    reference = distances
+                result.update(
+                    ports=graph.num_ports,
+                    segments=graph.num_segments,
+                    graph_build_seconds=round(build_seconds, 4),
+                    graph_bytes=_graph_bytes(graph),
+                    workload=workload,
+                )
+                results.append(result)
+                latency = result["latency_ms"]
+                print(
+                    f"  {workload:<8} {engine:<13} p50 {latency['p50']:9.3f} мс, "
+                    f"p99 {latency['p99']:9.3f} мс, "
+                    f"раскрытий {result['nodes_expanded']['mean']:10.1f}, "
+                    f"пик {result['query_peak_bytes'] / 1024:9.1f} КиБ, "
+                    f"расхождений {result['mismatches']}"
+                )
+    return results
+
+
+def print_comparison(
+    results: List[Dict[str, Any]], parameters: Dict[str, Any], baseline_path: str
+) -> None:
+    """Отношение новых значений к базовому запуску (< 1 — стало быстрее)."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {
+        (result["ports"], result["workload"], result["engine"]): result
+        for result in baseline["results"]
+    }
+    print(f"Сравнение с {baseline_path} (коммит {baseline.get('commit')}):")
+    for key in ("queries", "seed", "alternatives"):
+        if baseline["parameters"].get(key) != parameters.get(key):
+            print(f"  Внимание: параметр {key} отличается от базового запуска.")
+    for result in results:
+        old = previous.get((result["ports"], result["workload"], result["engine"]))
+        if old is None:
+            continue
+        ratios = [
+            result[metric][key] / old[metric][key] if old[metric][key] else float("nan")
+            for metric, key in (
+                ("latency_ms", "p50"),
+                ("latency_ms", "p99"),
+                ("nodes_expanded", "mean"),
+            )
+        ]
+        print(
+            f"  {result['ports']:>8} {result['workload']:<8} {result['engine']:<13} "
+            f"p50 x{ratios[0]:.2f}, p99 x{ratios[1]:.2f}, раскрытий x{ratios[2]:.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="1000,10000", help="размеры графов")
+    parser.add_argument("--engines", default=",".join(ENGINES), help="движки поиска")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS))
+    parser.add_argument("--queries", type=int, default=100, help="запросов на прогон")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="файл результатов (JSON)")
+    parser.add_argument("--baseline", help="результаты предыдущего запуска")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    engines = args.engines.split(",")
+    workloads = args.workloads.split(",")
+    unknown = set(engines) - set(ENGINES)
+    if unknown:
+        parser.error(f"неизвестные движки: {sorted(unknown)}")
+    if "astar" in engines:
+        # Эталонные дистанции считаются первыми.
+        engines.remove("astar")
+        engines.insert(0, "astar")
+
+    commit, dirty = _git_revision()
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    results = run_benchmark(sizes, engines, workloads, args.queries, args.seed)
+    report = {
+        "format_version": RESULTS_FORMAT_VERSION,
+        "benchmark": "search_engines",
+        "created_at": created_at.isoformat(timespec="seconds"),
+        "commit": commit,
+        "dirty": dirty,
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "parameters": {
+            "sizes": sizes,
+            "engines": engines,
+            "workloads": workloads,
+            "queries": args.queries,
+            "seed": args.seed,
+            "alternatives": ALTERNATIVES,
+        },
+        "results": results,
+    }
+
+    output = args.output or os.path.join(
+        RESULTS_DIR,
+        f"search_engines_{created_at:%Y%m%dT%H%M%S}_{(commit or 'nocommit')[:10]}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты записаны в {output}")
+    if args.baseline:
+        print_comparison(results, report["parameters"], args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# RoutesCalculatorService/benchmarks/synthetic_graph.py
+"""
+Детерминированный (по seed) синтетический морской граф для бенчмарков
+движков поиска: от тысячи до миллиона портов.
+
+Порты сгруппированы в регионы (кластеры вокруг случайных центров), внутри
+региона — цепочки вдоль побережья: каждая цепочка — случайное блуждание с
+плавно меняющимся курсом и шагом 3–18 миль. Сегменты:
+- между соседними портами цепочки и через один порт (каботаж, есть обходы);
+- между первыми портами (хабами) цепочек одного региона — кольцом;
+- между хабами регионов: к ближайшим регионам и кольцом по долготе
+  (океанские линии; кольцо гарантирует связность графа).
+Все сегменты двусторонние, дистанция — не меньше расстояния по дуге большого
+круга (с коэффициентом извилистости), поэтому эвристики A* допустимы.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+from graph import GraphSnapshot
+from heuristics import EARTH_RADIUS_NAUTICAL_MILES
+
+# Длина цепочки портов вдоль побережья и число цепочек в регионе (диапазоны).
+CHAIN_LENGTH = (8, 60)
+CHAINS_PER_REGION = (3, 12)
+# Сколько ближайших регионов соединено океанскими линиями с каждым регионом.
+OCEAN_LANES_PER_REGION = 3
+# Регионов, для которых ближайшие соседи ищутся за один проход (память O(N * K)).
+_REGION_CHUNK = 1024
+
+
+def _unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    lat = np.radians(latitudes)
+    lon = np.radians(longitudes)
+    return np.column_stack(
+        (np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat))
+    )
+
+
+def _great_circle_nm(vectors: np.ndarray, sources: np.ndarray, targets: np.ndarray):
+    """Расстояние по дуге большого круга (та же формула, что в heuristics)."""
+    dots = np.einsum("ij,ij->i", vectors[sources], vectors[targets])
+    half_chord = np.sqrt(np.maximum(2.0 - 2.0 * dots, 0.0)) / 2
+    return (2 * EARTH_RADIUS_NAUTICAL_MILES) * np.arcsin(np.minimum(half_chord, 1.0))
+
+
+def _cumsum_within(values: np.ndarray, group_starts: np.ndarray, group_of: np.ndarray):
+    """Накопленная сумма, начинающаяся заново в начале каждой группы."""
+    totals = np.cumsum(values)
+    return totals - (totals[group_starts] - values[group_starts])[group_of]
+
+
+def _split(total: int, bounds: Tuple[int, int], rng: np.random.Generator):
+    """Разбивает total на части случайной длины из bounds (последняя короче)."""
+    sizes = rng.integers(bounds[0], bounds[1] + 1, size=total // bounds[0] + 1)
+    ends = np.cumsum(sizes)
+    count = int(np.searchsorted(ends, total)) + 1
+    sizes = sizes[:count]
+    sizes[-1] -= ends[count - 1] - total
+    return sizes
+
+
+def generate_synthetic_graph(
+    num_ports: int, seed: int = 42
+) -> Tuple[GraphSnapshot, np.ndarray]:
+    """
+    Строит снимок графа из num_ports портов (id 1..num_ports).
+    Возвращает (снимок, номер_региона_для_каждого_порта); порты одного
+    региона идут подряд.
+    """
+    rng = np.random.default_rng(seed)
+
+    chain_lengths = _split(num_ports, CHAIN_LENGTH, rng)
+    num_chains = len(chain_lengths)
+    chain_of_port = np.repeat(np.arange(num_chains), chain_lengths)
+    chain_starts = np.concatenate(([0], np.cumsum(chain_lengths)[:-1]))
+    region_sizes = _split(num_chains, CHAINS_PER_REGION, rng)
+    num_regions = len(region_sizes)
+    region_of_chain = np.repeat(np.arange(num_regions), region_sizes)
+    region_first_chain = np.concatenate(([0], np.cumsum(region_sizes)[:-1]))
+    region_of_port = region_of_chain[chain_of_port]
+
+    # Центры регионов: судоходные широты, начало цепочки — рядом с центром.
+    region_lat = rng.uniform(-50.0, 65.0, size=num_regions)
+    region_lon = rng.uniform(-180.0, 180.0, size=num_regions)
+    origin_lat = region_lat[region_of_chain] + rng.normal(0.0, 2.5, size=num_chains)
+    origin_lon = region_lon[region_of_chain] + rng.normal(0.0, 2.5, size=num_chains)
+
+    # Побережье: курс меняется плавно, шаг 0.05–0.3 градуса.
+    heading_noise = rng.normal(0.0, 0.35, size=num_ports)
+    heading_noise[chain_starts] = rng.uniform(0.0, 2 * np.pi, size=num_chains)
+    headings = _cumsum_within(heading_noise, chain_starts, chain_of_port)
+    steps = rng.uniform(0.05, 0.3, size=num_ports)
+    steps[chain_starts] = 0.0
+    lon_scale = 1.0 / np.maximum(np.cos(np.radians(origin_lat)), 0.2)
+    latitudes = origin_lat[chain_of_port] + _cumsum_within(
+        steps * np.cos(headings), chain_starts, chain_of_port
+    )
+    longitudes = origin_lon[chain_of_port] + _cumsum_within(
+        steps * np.sin(headings) * lon_scale[chain_of_port],
+        chain_starts,
+        chain_of_port,
+    )
+    latitudes = np.clip(latitudes, -75.0, 80.0)
+    longitudes = (longitudes + 180.0) % 360.0 - 180.0
+
+    # Пары портов (неориентированные) и коэффициент извилистости каждой.
+    pairs: List[Tuple[np.ndarray, np.ndarray, Tuple[float, float]]] = []
+    ports = np.arange(num_ports)
+    same_chain = chain_of_port[1:] == chain_of_port[:-1]
+    pairs.append((ports[:-1][same_chain], ports[1:][same_chain], (1.0, 1.25)))
+    skip = (chain_of_port[2:] == chain_of_port[:-2]) & (
+        rng.random(max(num_ports - 2, 0)) < 0.5
+    )
+    pairs.append((ports[:-2][skip], ports[2:][skip], (1.05, 1.3)))
+
+    chains = np.arange(num_chains)
+    next_chain = chains + 1
+    last_in_region = np.append(region_of_chain[1:] != region_of_chain[:-1], True)
+    # Последняя цепочка региона замыкает кольцо на первую.
+    next_chain[last_in_region] = region_first_chain[region_of_chain[last_in_region]]
+    ring = next_chain != chains
+    pairs.append((chain_starts[ring], chain_starts[next_chain[ring]], (1.0, 1.2)))
+
+    hubs = chain_starts[region_first_chain]
+    hub_vectors = _unit_vectors(latitudes[hubs], longitudes[hubs])
+    lanes = min(OCEAN_LANES_PER_REGION, num_regions - 1)
+    if lanes > 0:
+        for chunk_start in range(0, num_regions, _REGION_CHUNK):
+            chunk = np.arange(
+                chunk_start, min(chunk_start + _REGION_CHUNK, num_regions)
+            )
+            dots = hub_vectors[chunk] @ hub_vectors.T
+            dots[np.arange(len(chunk)), chunk] = -np.inf
+            nearest = np.argpartition(-dots, lanes - 1, axis=1)[:, :lanes]
+            pairs.append(
+                (hubs[np.repeat(chunk, lanes)], hubs[nearest.ravel()], (1.05, 1.4))
+            )
+        by_longitude = hubs[np.argsort(longitudes[hubs], kind="stable")]
+        pairs.append((by_longitude, np.roll(by_longitude, -1), (1.05, 1.4)))
+
+    vectors = _unit_vectors(latitudes, longitudes)
+    sources_list, targets_list, distances_list = [], [], []
+    for a, b, (low, high) in pairs:
+        keep = a != b
+        a, b = a[keep], b[keep]
+        distance = _great_circle_nm(vectors, a, b) * rng.uniform(low, high, len(a))
+        distance = np.maximum(distance, 0.1)
+        sources_list += [a, b]
+        targets_list += [b, a]
+        distances_list += [distance, distance]
+    sources = np.concatenate(sources_list).astype(np.int32)
+    order = np.argsort(sources, kind="stable")
+    offsets = np.zeros(num_ports + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_ports), out=offsets[1:])
+
+    graph = GraphSnapshot(
+        port_ids=np.arange(1, num_ports + 1, dtype=np.int64),
+        names=[f"Port {port_id}" for port_id in range(1, num_ports + 1)],
+        latitudes=latitudes,
+        longitudes=longitudes,
+        offsets=offsets,
+        targets=np.concatenate(targets_list).astype(np.int32)[order],
+        distances=np.concatenate(distances_list)[order],
+        segment_ids=np.arange(1, len(sources) + 1, dtype=np.int64),
+    )
+    return graph, region_of_port
+
+
+def query_workload(
+    region_of_port: np.ndarray, count: int, kind: str, seed: int = 7
+) -> List[Tuple[int, int]]:
+    """
+    Фиксированный набор запросов (индексы портов отправления и назначения):
+    "random" — любые два порта (в основном межрегиональные рейсы),
+    "regional" — порты одного региона (каботаж).
+    """
+    rng = np.random.default_rng(seed)
+    num_ports = len(region_of_port)
+    region_starts = np.flatnonzero(np.diff(region_of_port, prepend=-1))
+    region_ends = np.append(region_starts[1:], num_ports)
+    queries: List[Tuple[int, int]] = []
+    while len(queries) < count:
+        start_idx = int(rng.integers(num_ports))
+        if kind == "random":
+            end_idx = int(rng.integers(num_ports))
+        elif kind == "regional":
+            region = region_of_port[start_idx]
+            end_idx = int(rng.integers(region_starts[region], region_ends[region]))
+        else:
+            raise ValueError(f"Неизвестный вид нагрузки: {kind}")
+        if start_idx != end_idx:
+            queries.append((start_idx, end_idx))
+    return queries
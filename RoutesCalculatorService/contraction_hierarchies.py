@@ -0,0 +1,517 @@
+# RoutesCalculatorService/contraction_hierarchies.py
+import heapq
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from graph import GraphSnapshot
+from search_stats import SearchStats
+
+logger = logging.getLogger("calculator_ch")
+
+# Файл, в котором хранится построенная иерархия между перезапусками сервиса.
+CH_CACHE_PATH = os.getenv(
+    "CH_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "cache", "contraction_hierarchy.npz"),
+)
+# Ограничение на число узлов, просматриваемых при поиске свидетеля (witness search).
+CH_WITNESS_SETTLED_LIMIT = int(os.getenv("CH_WITNESS_SETTLED_LIMIT", "500"))
+
+# Версия формата файла: увеличивается при несовместимых изменениях структуры.
+CH_FORMAT_VERSION = 1
+
+
+class ContractionHierarchy:
+    """
+    Иерархия сжатия (Contraction Hierarchies) для снимка графа.
+
+    Рёбра иерархии (исходные сегменты и шорткаты) пронумерованы и хранятся
+    в массивах edge_*: для исходного ребра edge_original содержит индекс
+    ребра в GraphSnapshot, для шортката — -1, а edge_children указывают
+    на пару рёбер, из которых шорткат составлен.
+
+    up_* — CSR рёбер v -> x к узлам с большим рангом (прямой поиск),
+    down_* — CSR рёбер u -> v, где ранг u больше ранга v, сгруппированных
+    по v (обратный поиск от цели). Веса продублированы в up_weights /
+    down_weights, чтобы запрос читал соседей одним срезом.
+    """
+
+    __slots__ = (
+        "fingerprint",
+        "rank",
+        "up_offsets",
+        "up_targets",
+        "up_edges",
+        "up_weights",
+        "down_offsets",
+        "down_sources",
+        "down_edges",
+        "down_weights",
+        "edge_weights",
+        "edge_original",
+        "edge_children",
+    )
+
+    def __init__(
+        self,
+        fingerprint: str,
+        rank: np.ndarray,
+        up_offsets: np.ndarray,
+        up_targets: np.ndarray,
+        up_edges: np.ndarray,
+        up_weights: np.ndarray,
+        down_offsets: np.ndarray,
+        down_sources: np.ndarray,
+        down_edges: np.ndarray,
+        down_weights: np.ndarray,
+        edge_weights: np.ndarray,
+        edge_original: np.ndarray,
+        edge_children: np.ndarray,
+    ):
+        self.fingerprint = fingerprint
+        self.rank = rank
+        self.up_offsets = up_offsets
+        self.up_targets = up_targets
+        self.up_edges = up_edges
+        self.up_weights = up_weights
+        self.down_offsets = down_offsets
+        self.down_sources = down_sources
+        self.down_edges = down_edges
+        self.down_weights = down_weights
+        self.edge_weights = edge_weights
+        self.edge_original = edge_original
+        self.edge_children = edge_children
+
+    @property
+    def num_shortcuts(self) -> int:
+        return int(np.count_nonzero(self.edge_original < 0))
+
+    def save(self, path: str) -> None:
+        """Сохраняет иерархию в .npz (атомарно, через временный файл)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                format_version=np.array(CH_FORMAT_VERSION),
+                fingerprint=np.array(self.fingerprint),
+                **{
+                    name: getattr(self, name)
+                    for name in self.__slots__
+                    if name != "fingerprint"
+                },
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ContractionHierarchy"]:
+        """Загружает иерархию из файла или возвращает None, если формат не подходит."""
+        with np.load(path) as data:
+            if int(data["format_version"]) != CH_FORMAT_VERSION:
+                return None
+            return cls(
+                fingerprint=str(data["fingerprint"]),
+                **{name: data[name] for name in cls.__slots__ if name != "fingerprint"},
+            )
+
+
+def _witness_search(
+    out_adjacency: List[Dict[int, int]],
+    edge_weights: List[float],
+    source: int,
+    excluded: int,
+    max_distance: float,
+) -> Dict[int, float]:
+    """
+    Локальный Дейкстра от source в текущем (еще не сжатом) графе в обход
+    узла excluded. Останавливается по дистанции max_distance и по лимиту
+    просмотренных узлов CH_WITNESS_SETTLED_LIMIT.
+    """
+    distances: Dict[int, float] = {source: 0.0}
+    open_set: List[Tuple[float, int]] = [(0.0, source)]
+    settled_count = 0
+    while open_set and settled_count < CH_WITNESS_SETTLED_LIMIT:
+        current_distance, current = heapq.heappop(open_set)
+        if current_distance > distances[current]:
+            continue
+        if current_distance > max_distance:
+            break
+        settled_count += 1
+        for neighbor, edge in out_adjacency[current].items():
+            if neighbor == excluded:
+                continue
+            tentative = current_distance + edge_weights[edge]
+            if tentative < distances.get(neighbor, math.inf):
+                distances[neighbor] = tentative
+                heapq.heappush(open_set, (tentative, neighbor))
+    return distances
+
+
+def _find_shortcuts(
+    node: int,
+    out_adjacency: List[Dict[int, int]],
+    in_adjacency: List[Dict[int, int]],
+    edge_weights: List[float],
+) -> List[Tuple[int, int, float, int, int]]:
+    """
+    Определяет шорткаты, которые понадобятся при сжатии node:
+    (u, x, вес, ребро u->node, ребро node->x) для каждой пары соседей,
+    между которыми нет свидетельского пути не длиннее пути через node.
+    """
+    shortcuts = []
+    out_items = list(out_adjacency[node].items())
+    if not out_items:
+        return shortcuts
+    for u, in_edge in in_adjacency[node].items():
+        in_weight = edge_weights[in_edge]
+        max_out_weight = max(
+            (edge_weights[e] for x, e in out_items if x != u), default=None
+        )
+        if max_out_weight is None:
+            continue
+        witness = _witness_search(
+            out_adjacency, edge_weights, u, node, in_weight + max_out_weight
+        )
+        for x, out_edge in out_items:
+            if x == u:
+                continue
+            weight = in_weight + edge_weights[out_edge]
+            if witness.get(x, math.inf) > weight:
+                shortcuts.append((u, x, weight, in_edge, out_edge))
+    return shortcuts
+
+
+def build_contraction_hierarchy(graph: GraphSnapshot) -> ContractionHierarchy:
+    """
+    Строит иерархию: упорядочивает узлы по приоритету
+    (разность рёбер + число уже сжатых соседей, с ленивым пересчетом)
+    и последовательно сжимает их, добавляя шорткаты.
+    """
+    num_ports = graph.num_ports
+    edge_weights: List[float] = []
+    edge_original: List[int] = []
+    edge_children: List[Tuple[int, int]] = []
+    out_adjacency: List[Dict[int, int]] = [{} for _ in range(num_ports)]
+    in_adjacency: List[Dict[int, int]] = [{} for _ in range(num_ports)]
+
+    def add_edge(
+        source: int, target: int, weight: float, original: int, children: Tuple
+    ) -> None:
+        # Между парой узлов храним только самое короткое ребро.
+        existing = out_adjacency[source].get(target)
+        if existing is not None and edge_weights[existing] <= weight:
+            return
+        edge_weights.append(weight)
+        edge_original.append(original)
+        edge_children.append(children)
+        edge = len(edge_weights) - 1
+        out_adjacency[source][target] = edge
+        in_adjacency[target][source] = edge
+
+    offsets = graph.offsets.tolist()
+    targets = graph.targets.tolist()
+    distances = graph.distances.tolist()
+    for source in range(num_ports):
+        for graph_edge in range(offsets[source], offsets[source + 1]):
+            target = targets[graph_edge]
+            if target != source:
+                add_edge(source, target, distances[graph_edge], graph_edge, (-1, -1))
+
+    contracted_neighbors = [0] * num_ports
+
+    def priority(node: int, shortcuts_count: int) -> int:
+        removed = len(out_adjacency[node]) + len(in_adjacency[node])
+        return shortcuts_count - removed + contracted_neighbors[node]
+
+    queue = [
+        (
+            priority(
+                node,
+                len(_find_shortcuts(node, out_adjacency, in_adjacency, edge_weights)),
+            ),
+            node,
+        )
+        for node in range(num_ports)
+    ]
+    heapq.heapify(queue)
+
+    rank = np.empty(num_ports, dtype=np.int32)
+    up_lists: List[List[int]] = [[] for _ in range(num_ports)]
+    down_lists: List[List[int]] = [[] for _ in range(num_ports)]
+    up_neighbors: List[List[int]] = [[] for _ in range(num_ports)]
+    down_neighbors: List[List[int]] = [[] for _ in range(num_ports)]
+    next_rank = 0
+
+    while queue:
+        _, node = heapq.heappop(queue)
+        shortcuts = _find_shortcuts(node, out_adjacency, in_adjacency, edge_weights)
+        # Ленивое обновление: если приоритет вырос, откладываем узел.
+        current_priority = priority(node, len(shortcuts))
+        if queue and current_priority > queue[0][0]:
+            heapq.heappush(queue, (current_priority, node))
+            continue
+
+        for u, x, weight, in_edge, out_edge in shortcuts:
+            add_edge(u, x, weight, -1, (in_edge, out_edge))
+
+        rank[node] = next_rank
+        next_rank += 1
+
+        # Оставшиеся рёбра узла ведут к еще не сжатым (более высоким) узлам.
+        for x, edge in out_adjacency[node].items():
+            up_neighbors[node].append(x)
+            up_lists[node].append(edge)
+            del in_adjacency[x][node]
+            contracted_neighbors[x] += 1
+        for u, edge in in_adjacency[node].items():
+            down_neighbors[node].append(u)
+            down_lists[node].append(edge)
+            del out_adjacency[u][node]
+            contracted_neighbors[u] += 1
+        out_adjacency[node] = {}
+        in_adjacency[node] = {}
+
+    def to_csr(neighbors: List[List[int]], edges: List[List[int]]):
+        csr_offsets = np.zeros(num_ports + 1, dtype=np.int64)
+        np.cumsum([len(items) for items in edges], out=csr_offsets[1:])
+        flat_neighbors = np.array(
+            [n for items in neighbors for n in items], dtype=np.int32
+        )
+        flat_edges = np.array([e for items in edges for e in items], dtype=np.int64)
+        return csr_offsets, flat_neighbors, flat_edges
+
+    up_offsets, up_targets, up_edges = to_csr(up_neighbors, up_lists)
+    down_offsets, down_sources, down_edges = to_csr(down_neighbors, down_lists)
+    weights_array = np.array(edge_weights, dtype=np.float64)
+
+    return ContractionHierarchy(
+        fingerprint=graph.fingerprint,
+        rank=rank,
+        up_offsets=up_offsets,
+        up_targets=up_targets,
+        up_edges=up_edges,
+        up_weights=weights_array[up_edges],
+        down_offsets=down_offsets,
+        down_sources=down_sources,
+        down_edges=down_edges,
+        down_weights=weights_array[down_edges],
+        edge_weights=weights_array,
+        edge_original=np.array(edge_original, dtype=np.int64),
+        edge_children=np.array(edge_children, dtype=np.int64).reshape(-1, 2),
+    )
+
+
+def unpack_edges(hierarchy: ContractionHierarchy, edges: List[int]) -> List[int]:
+    """Раскрывает рёбра иерархии (включая шорткаты) в индексы сегментов графа."""
+    edge_original = hierarchy.edge_original
+    edge_children = hierarchy.edge_children
+    graph_edges: List[int] = []
+    stack = list(reversed(edges))
+    while stack:
+        edge = stack.pop()
+        original = int(edge_original[edge])
+        if original >= 0:
+            graph_edges.append(original)
+        else:
+            first, second = edge_children[edge]
+            stack.append(int(second))
+            stack.append(int(first))
+    return graph_edges
+
+
+def contraction_hierarchy_query(
+    hierarchy: ContractionHierarchy,
+    start_idx: int,
+    end_idx: int,
+    stats: Optional[SearchStats] = None,
+) -> Tuple[Optional[List[int]], Optional[float]]:
+    """
+    Двунаправленный Дейкстра по иерархии: вперед от start только вверх
+    по рангу, назад от end — по рёбрам, спускающимся в end.
+    Возвращает (список_индексов_сегментов_графа, дистанция) или (None, None).
+    """
+    if start_idx == end_idx:
+        return [], 0.0
+
+    # Индекс 0 — прямой поиск, 1 — обратный.
+    adjacency = (
+        (
+            hierarchy.up_offsets,
+            hierarchy.up_targets,
+            hierarchy.up_edges,
+            hierarchy.up_weights,
+        ),
+        (
+            hierarchy.down_offsets,
+            hierarchy.down_sources,
+            hierarchy.down_edges,
+            hierarchy.down_weights,
+        ),
+    )
+    # Пространство поиска в CH мало, поэтому состояние хранится в словарях.
+    distances: Tuple[Dict[int, float], Dict[int, float]] = (
+        {start_idx: 0.0},
+        {end_idx: 0.0},
+    )
+    # Для каждого достигнутого узла: (предыдущий узел поиска, ребро иерархии).
+    parents: Tuple[Dict[int, Tuple[int, int]], Dict[int, Tuple[int, int]]] = ({}, {})
+    open_sets = ([(0.0, start_idx)], [(0.0, end_idx)])
+
+    best_distance = math.inf
+    meeting_idx = -1
+    nodes_expanded = 0
+    edges_relaxed = 0
+    heap_pushes = 0
+    stale_pops = 0
+    max_open_set = 2
+    side = 1
+    while open_sets[0] or open_sets[1]:
+        # Чередуем направления; исчерпанное направление пропускаем.
+        side = 1 - side
+        if not open_sets[side]:
+            side = 1 - side
+        current_distance, current = heapq.heappop(open_sets[side])
+        side_distances = distances[side]
+        if current_distance > side_distances[current]:
+            stale_pops += 1
+            continue
+        # Направление, чей минимум не меньше лучшего пути, дальше не нужно.
+        if current_distance >= best_distance:
+            open_sets[side].clear()
+            continue
+        nodes_expanded += 1
+
+        other_distance = distances[1 - side].get(current)
+        if other_distance is not None:
+            if current_distance + other_distance < best_distance:
+                best_distance = current_distance + other_distance
+                meeting_idx = current
+
+        offsets, neighbors, edges, weights = adjacency[side]
+        edge_start = offsets[current]
+        edge_end = offsets[current + 1]
+        edges_relaxed += edge_end - edge_start
+        for neighbor, edge, weight in zip(
+            neighbors[edge_start:edge_end].tolist(),
+            edges[edge_start:edge_end].tolist(),
+            weights[edge_start:edge_end].tolist(),
+        ):
+            tentative = current_distance + weight
+            if tentative < side_distances.get(neighbor, math.inf):
+                side_distances[neighbor] = tentative
+                parents[side][neighbor] = (current, edge)
+                heapq.heappush(open_sets[side], (tentative, neighbor))
+                heap_pushes += 1
+        open_set_size = len(open_sets[0]) + len(open_sets[1])
+        if open_set_size > max_open_set:
+            max_open_set = open_set_size
+
+    if stats is not None:
+        stats.set_counters(
+            nodes_expanded, edges_relaxed, heap_pushes, stale_pops, max_open_set
+        )
+    if meeting_idx == -1:
+        return None, None
+
+    forward_edges: List[int] = []
+    node = meeting_idx
+    while node != start_idx:
+        node, edge = parents[0][node]
+        forward_edges.append(edge)
+    forward_edges.reverse()
+
+    backward_edges: List[int] = []
+    node = meeting_idx
+    while node != end_idx:
+        node, edge = parents[1][node]
+        backward_edges.append(edge)
+
+    return unpack_edges(hierarchy, forward_edges + backward_edges), best_distance
+
+
+# Иерархия строится (или читается с диска) один раз для каждого снимка графа.
+# Иерархии последних снимков графа по отпечатку: после перезагрузки графа
+# задачи, еще работающие на прежнем снимке, не перестраивают его иерархию.
+_HIERARCHY_CACHE_SIZE = 2
+_hierarchies: "OrderedDict[str, ContractionHierarchy]" = OrderedDict()
+_hierarchy_lock = threading.Lock()
+
+
+def get_contraction_hierarchy(graph: GraphSnapshot) -> ContractionHierarchy:
+    """
+    Возвращает иерархию для снимка графа. Сначала пробует файл CH_CACHE_PATH
+    (если он построен для того же отпечатка графа), иначе строит иерархию
+    и сохраняет ее на диск.
+    """
+    hierarchy = _hierarchies.get(graph.fingerprint)
+    if hierarchy is not None:
+        return hierarchy
+    with _hierarchy_lock:
+        hierarchy = _hierarchies.get(graph.fingerprint)
+        if hierarchy is not None:
+            return hierarchy
+
+        if os.path.exists(CH_CACHE_PATH):
+            try:
+                hierarchy = ContractionHierarchy.load(CH_CACHE_PATH)
+            except Exception as e:
+                logger.warning(f"Не удалось прочитать иерархию из {CH_CACHE_PATH}: {e}")
+            if hierarchy is not None and hierarchy.fingerprint != graph.fingerprint:
+                logger.info("Сохраненная иерархия построена для другого графа.")
+                hierarchy = None
+
+        if hierarchy is None:
+            logger.info(
+                f"Построение Contraction Hierarchies для {graph.num_ports} портов..."
+            )
+            hierarchy = build_contraction_hierarchy(graph)
+            logger.info(f"Иерархия построена: {hierarchy.num_shortcuts} шорткатов.")
+            try:
+                hierarchy.save(CH_CACHE_PATH)
+            except OSError as e:
+                logger.warning(f"Не удалось сохранить иерархию в {CH_CACHE_PATH}: {e}")
+
+        _hierarchies[graph.fingerprint] = hierarchy
+        while len(_hierarchies) > _HIERARCHY_CACHE_SIZE:
+            _hierarchies.popitem(last=False)
+        return hierarchy
+
+
+def contraction_hierarchy_search(
+    graph: GraphSnapshot,
+    start_idx: int,
+    end_idx: int,
+    stats: Optional[SearchStats] = None,
+) -> Tuple[Optional[List[int]], Optional[float]]:
+    """
+    Движок поиска на Contraction Hierarchies с тем же контрактом,
+    что и a_star_search_algorithm: (список_индексов_портов_пути, дистанция).
+    """
+    if stats is not None:
+        stats.engine = "ch"
+        stats.heuristic = None
+    hierarchy = get_contraction_hierarchy(graph)
+    graph_edges, total_distance = contraction_hierarchy_query(
+        hierarchy, start_idx, end_idx, stats
+    )
+    if graph_edges is None:
+        return None, None
+    targets = graph.targets
+    return [start_idx] + [int(targets[edge]) for edge in graph_edges], total_distance
+
+
+if __name__ == "__main__":
+    # Предварительное построение иерархии из текущего содержимого БД.
+    from graph import load_graph_snapshot
+
+    logging.basicConfig(level=logging.INFO)
+    snapshot = load_graph_snapshot()
+    if snapshot is None:
+        print("Failed to load the port graph from the database.")
+    else:
+        get_contraction_hierarchy(snapshot)
+        print(f"Contraction hierarchy saved to {CH_CACHE_PATH}")
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel, Field
 
 
@@ -21,6 +23,19 @@ class SegmentDataForAStar(BaseModel):
         pass
 
 
+class GraphSegmentData(BaseModel):
+    # Сегмент, как он приходит из db_interface.get_all_segments_for_graph.
+    # Проверяется один раз при построении снимка графа; дальше поиск работает
+    # только с массивами снимка, без моделей Pydantic.
+    id: int
+    PortOfDeparture_id: int
+    PortOfArrival_id: int
+    distance: float = Field(..., ge=0.0)
+    # Ограничения скорости на сегменте (узлы / часы); 0 или None — не задано.
+    average_speed: Optional[float] = None
+    estimated_time: Optional[float] = None
+
+
 # Можно добавить другие модели данных, если они понадобятся, например:
 # class CalculationResultMessage(BaseModel):
 #     task_id: str
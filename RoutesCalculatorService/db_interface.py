@@ -102,7 +102,7 @@ def get_port_by_id(port_id: int) -> Optional[Dict[str, Any]]:
 def get_all_ports_for_algorithm() -> List[Dict[str, Any]]:
     """
     Извлекает все порты (только id, name, latitude, longitude),
-    необходимые для инициализации словарей g_score и f_score в A*.
+    необходимые для построения снимка графа в памяти.
     """
     ports_data = []
     try:
@@ -180,6 +180,64 @@ def get_segments_for_port(port_id: int) -> List[Dict[str, Any]]:
     return segments_data
 
 
+def get_all_segments_for_graph() -> Optional[List[Dict[str, Any]]]:
+    """
+    Извлекает все сегменты одним запросом (без данных о портах)
+    для построения снимка графа в памяти. None при ошибке — в отличие от
+    пустого списка (сегментов в БД нет).
+    """
+    segments_data = []
+    try:
+        with get_db_session_new() as db:
+            query = text("""
+                SELECT id, "PortOfDeparture_id", "PortOfArrival_id", distance,
+                       average_speed, estimated_time
+                FROM ports_segment
+                ORDER BY id
+            """)
+            results = db.execute(query).fetchall()
+            for row in results:
+                segments_data.append(
+                    dict(row._mapping) if hasattr(row, "_mapping") else dict(row)
+                )
+    except (SQLAlchemyError, NoSuchTableError) as e:
+        print(f"Database error in get_all_segments_for_graph: {e}")
+        if isinstance(e, NoSuchTableError):
+            print(
+                "CRITICAL: Table 'ports_segment' not found during get_all_segments_for_graph. Check migrations."
+            )
+        return None
+    except Exception as e:
+        print(f"Unexpected error in get_all_segments_for_graph: {e}")
+        return None
+    return segments_data
+
+
+def get_segments_version() -> Optional[str]:
+    """
+    Возвращает версию (md5 содержимого) таблицы ports_segment: меняется при
+    любом добавлении, удалении или изменении сегмента. None при ошибке.
+    """
+    try:
+        with get_db_session_new() as db:
+            query = text("""
+                SELECT md5(COALESCE(string_agg(
+                    concat_ws(
+                        ':', id, "PortOfDeparture_id", "PortOfArrival_id", distance,
+                        average_speed, estimated_time
+                    ),
+                    ',' ORDER BY id
+                ), '')) AS version
+                FROM ports_segment
+            """)
+            return db.execute(query).scalar()
+    except (SQLAlchemyError, NoSuchTableError) as e:
+        print(f"Database error in get_segments_version: {e}")
+    except Exception as e:
+        print(f"Unexpected error in get_segments_version: {e}")
+    return None
+
+
 def check_db_connection():
     """
     Функция для проверки соединения с БД и наличия одной из ключевых таблиц (ports_port).
@@ -257,6 +315,53 @@ def check_db_connection():
             conn.close()
 
 
+_UPDATE_CALCULATION_TASK_QUERY = text("""
+    UPDATE tasks_calculationtask
+    SET status = :status,
+        result_path = :result_path,
+        result_distance = :result_distance,
+        result_waypoints_data = :result_waypoints_data, -- НОВОЕ В SQL
+        vessel_speed_knots = :vessel_speed_knots,       -- НОВОЕ В SQL
+        result_alternatives = :result_alternatives,
+        result_legs = :result_legs,
+        search_stats = :search_stats,
+        error_message = :error_message,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE task_id = :task_id
+""")
+
+
+def _calculation_task_params(
+    task_id: str,
+    status: str,
+    result_path: Optional[List[int]] = None,
+    result_distance: Optional[float] = None,
+    result_waypoints_data: Optional[List[Dict[str, Any]]] = None,
+    vessel_speed_knots: Optional[float] = None,
+    error_message: Optional[str] = None,
+    result_alternatives: Optional[List[Dict[str, Any]]] = None,
+    result_legs: Optional[List[Dict[str, Any]]] = None,
+    search_stats: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """Параметры запроса _UPDATE_CALCULATION_TASK_QUERY для одной задачи."""
+    return {
+        "task_id": task_id,
+        "status": status,
+        "result_path": json.dumps(result_path) if result_path is not None else None,
+        "result_distance": result_distance,
+        "result_waypoints_data": json.dumps(result_waypoints_data)  # НОВОЕ В PARAM
+        if result_waypoints_data is not None
+        else None,
+        "vessel_speed_knots": vessel_speed_knots,  # НОВОЕ В PARAM
+        "result_alternatives": json.dumps(result_alternatives)
+        if result_alternatives is not None
+        else None,
+        "result_legs": json.dumps(result_legs) if result_legs is not None else None,
+        "search_stats": json.dumps(search_stats) if search_stats is not None else None,
+        "error_message": error_message,
+    }
+
+
 def update_calculation_task(
     task_id: str,
     status: str,
@@ -265,6 +370,9 @@ def update_calculation_task(
     result_waypoints_data: Optional[List[Dict[str, Any]]] = None,  # НОВОЕ ПОЛЕ
     vessel_speed_knots: Optional[float] = None,  # НОВОЕ ПОЛЕ
     error_message: Optional[str] = None,
+    result_alternatives: Optional[List[Dict[str, Any]]] = None,
+    result_legs: Optional[List[Dict[str, Any]]] = None,
+    search_stats: Optional[Dict[str, Any]] = None,
 ) -> bool:
     """
     Обновляет запись о задаче расчета в базе данных.
@@ -272,33 +380,19 @@ def update_calculation_task(
     """
     try:
         with get_db_session_new() as db:
-            query = text("""
-                UPDATE tasks_calculationtask
-                SET status = :status,
-                    result_path = :result_path,
-                    result_distance = :result_distance,
-                    result_waypoints_data = :result_waypoints_data, -- НОВОЕ В SQL
-                    vessel_speed_knots = :vessel_speed_knots,       -- НОВОЕ В SQL
-                    error_message = :error_message,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE task_id = :task_id
-            """)
-            params = {
-                "task_id": task_id,
-                "status": status,
-                "result_path": json.dumps(result_path)
-                if result_path is not None
-                else None,
-                "result_distance": result_distance,
-                "result_waypoints_data": json.dumps(
-                    result_waypoints_data
-                )  # НОВОЕ В PARAM
-                if result_waypoints_data is not None
-                else None,
-                "vessel_speed_knots": vessel_speed_knots,  # НОВОЕ В PARAM
-                "error_message": error_message,
-            }
-            db.execute(query, params)
+            params = _calculation_task_params(
+                task_id,
+                status,
+                result_path,
+                result_distance,
+                result_waypoints_data,
+                vessel_speed_knots,
+                error_message,
+                result_alternatives,
+                result_legs,
+                search_stats,
+            )
+            db.execute(_UPDATE_CALCULATION_TASK_QUERY, params)
             db.commit()
             print(f"Task {task_id} updated in DB: status={status}")
             return True
@@ -0,0 +1,155 @@
+# RoutesCalculatorService/dijkstra.py
+import heapq
+import math
+from typing import List, Optional, Tuple
+
+from graph import GraphSnapshot
+from search_state import get_search_state
+from search_stats import SearchStats
+
+
+def single_source_dijkstra(
+    graph: GraphSnapshot,
+    source_idx: int,
+    reverse: bool = False,
+    settle_order: Optional[List[int]] = None,
+) -> Tuple[List[float], List[int]]:
+    """
+    Полный Дейкстра от source_idx по снимку графа.
+    При reverse=True поиск идет по входящим сегментам, т.е. считаются
+    дистанции от каждого порта до source_idx.
+    Возвращает (дистанции, индексы_рёбер_предшественников); для недостижимых
+    портов дистанция равна inf, а ребро — -1. Индексы рёбер всегда относятся
+    к прямым массивам графа (targets / distances / segment_ids).
+    Если передан список settle_order, в него дописываются порты в порядке
+    окончательной обработки: предок в дереве путей всегда идет раньше
+    потомка, в том числе при сегментах нулевой длины.
+    """
+    if reverse:
+        offsets = graph.reverse_offsets
+        neighbors = graph.reverse_sources
+        weights = graph.reverse_distances
+        edge_ids = graph.reverse_edge_ids
+    else:
+        offsets = graph.offsets
+        neighbors = graph.targets
+        weights = graph.distances
+        edge_ids = None
+
+    num_ports = graph.num_ports
+    distances: List[float] = [math.inf] * num_ports
+    parent_edges: List[int] = [-1] * num_ports
+    distances[source_idx] = 0.0
+    open_set: List[Tuple[float, int]] = [(0.0, source_idx)]
+
+    while open_set:
+        current_distance, current_idx = heapq.heappop(open_set)
+        if current_distance > distances[current_idx]:
+            continue
+        if settle_order is not None:
+            settle_order.append(current_idx)
+
+        edge_start = offsets[current_idx]
+        edge_end = offsets[current_idx + 1]
+        edges = (
+            edge_ids[edge_start:edge_end].tolist()
+            if edge_ids is not None
+            else range(edge_start, edge_end)
+        )
+        for neighbor_idx, weight, edge in zip(
+            neighbors[edge_start:edge_end].tolist(),
+            weights[edge_start:edge_end].tolist(),
+            edges,
+        ):
+            tentative = current_distance + weight
+            if tentative < distances[neighbor_idx]:
+                distances[neighbor_idx] = tentative
+                parent_edges[neighbor_idx] = int(edge)
+                heapq.heappush(open_set, (tentative, neighbor_idx))
+
+    return distances, parent_edges
+
+
+def one_to_many_search(
+    graph: GraphSnapshot,
+    start_idx: int,
+    target_indices: List[int],
+    stats: Optional[SearchStats] = None,
+) -> List[Tuple[Optional[List[int]], Optional[float]]]:
+    """
+    Маршруты от одного порта до нескольких целей одним деревом Дейкстры:
+    поиск останавливается, когда все цели обработаны. Состояние поиска
+    переиспользуется (см. SearchState), поэтому запрос платит только за
+    затронутые порты. Для каждой цели (в порядке target_indices) возвращает
+    (путь, дистанция) или (None, None).
+    """
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.distances
+
+    state = get_search_state(graph)
+    generation = state.next_generation()
+    stamps = state.stamps
+    settled = state.open_stamps
+    distances = state.g_score
+    came_from = state.came_from
+
+    stamps[start_idx] = generation
+    distances[start_idx] = 0.0
+    came_from[start_idx] = -1
+    open_set: List[Tuple[float, int]] = [(0.0, start_idx)]
+    pending_targets = set(target_indices)
+    nodes_expanded = 0
+    edges_relaxed = 0
+    heap_pushes = 0
+    stale_pops = 0
+    max_open_set = 1
+
+    while open_set and pending_targets:
+        current_distance, current_idx = heapq.heappop(open_set)
+        if settled[current_idx] == generation:
+            stale_pops += 1
+            continue
+        settled[current_idx] = generation
+        nodes_expanded += 1
+        pending_targets.discard(current_idx)
+
+        edge_start = offsets[current_idx]
+        edge_end = offsets[current_idx + 1]
+        edges_relaxed += edge_end - edge_start
+        for neighbor_idx, weight in zip(
+            targets[edge_start:edge_end].tolist(),
+            weights[edge_start:edge_end].tolist(),
+        ):
+            tentative = current_distance + weight
+            if (
+                stamps[neighbor_idx] != generation
+                or tentative < distances[neighbor_idx]
+            ):
+                stamps[neighbor_idx] = generation
+                distances[neighbor_idx] = tentative
+                came_from[neighbor_idx] = current_idx
+                heapq.heappush(open_set, (tentative, neighbor_idx))
+                heap_pushes += 1
+        if len(open_set) > max_open_set:
+            max_open_set = len(open_set)
+
+    if stats is not None:
+        stats.engine = "one_to_many"
+        stats.set_counters(
+            nodes_expanded, edges_relaxed, heap_pushes, stale_pops, max_open_set
+        )
+
+    results: List[Tuple[Optional[List[int]], Optional[float]]] = []
+    for target_idx in target_indices:
+        if settled[target_idx] != generation:
+            results.append((None, None))
+            continue
+        path = []
+        current_idx = target_idx
+        while current_idx != -1:
+            path.append(current_idx)
+            current_idx = came_from[current_idx]
+        path.reverse()
+        results.append((path, distances[target_idx]))
+    return results
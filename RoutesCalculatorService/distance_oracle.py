@@ -0,0 +1,274 @@
+# RoutesCalculatorService/distance_oracle.py
+import logging
+import math
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from dijkstra import single_source_dijkstra
+from graph import GraphSnapshot
+
+logger = logging.getLogger("calculator_oracle")
+
+# Файл с предрасчитанными матрицами всех пар портов.
+DISTANCE_ORACLE_PATH = os.getenv(
+    "DISTANCE_ORACLE_PATH",
+    os.path.join(os.path.dirname(__file__), "cache", "distance_oracle.bin"),
+)
+# Как часто (в секундах) перепроверять файл, если он отсутствует или устарел.
+DISTANCE_ORACLE_RECHECK_SECONDS = float(
+    os.getenv("DISTANCE_ORACLE_RECHECK_SECONDS", "60")
+)
+
+# Заголовок: магическая строка, версия формата, число портов, отпечаток графа,
+# время построения. Дополняется нулями до ORACLE_HEADER_SIZE байт.
+ORACLE_MAGIC = b"RPORACLE"
+ORACLE_FORMAT_VERSION = 1
+ORACLE_HEADER_STRUCT = struct.Struct("<8sII64sd")
+ORACLE_HEADER_SIZE = 128
+
+
+class DistanceOracle:
+    """
+    Оракул кратчайших путей для всех пар портов, отображенный в память (mmap).
+
+    Файл после заголовка содержит:
+    port_ids (int64, N) — id портов в порядке индексов на момент построения;
+    distances (float32, N x N) — кратчайшие дистанции (inf — недостижимо);
+    next_edges (int32, N x N) — индекс (в прямых массивах графа) первого
+    сегмента кратчайшего пути из строки в столбец, -1 — пути нет.
+    """
+
+    __slots__ = ("fingerprint", "built_at", "port_ids", "distances", "next_edges")
+
+    def __init__(
+        self,
+        fingerprint: str,
+        built_at: float,
+        port_ids: np.ndarray,
+        distances: np.ndarray,
+        next_edges: np.ndarray,
+    ):
+        self.fingerprint = fingerprint
+        self.built_at = built_at
+        self.port_ids = port_ids
+        self.distances = distances
+        self.next_edges = next_edges
+
+    @classmethod
+    def open(cls, path: str) -> Optional["DistanceOracle"]:
+        """Отображает файл оракула в память; None, если формат не подходит."""
+        with open(path, "rb") as f:
+            header = f.read(ORACLE_HEADER_STRUCT.size)
+        if len(header) < ORACLE_HEADER_STRUCT.size:
+            return None
+        magic, version, num_ports, fingerprint, built_at = ORACLE_HEADER_STRUCT.unpack(
+            header
+        )
+        if magic != ORACLE_MAGIC or version != ORACLE_FORMAT_VERSION:
+            return None
+
+        offset = ORACLE_HEADER_SIZE
+        port_ids = np.memmap(path, np.int64, "r", offset, (num_ports,))
+        offset += port_ids.nbytes
+        distances = np.memmap(path, np.float32, "r", offset, (num_ports, num_ports))
+        offset += distances.nbytes
+        next_edges = np.memmap(path, np.int32, "r", offset, (num_ports, num_ports))
+        return cls(
+            fingerprint.decode("ascii"), built_at, port_ids, distances, next_edges
+        )
+
+    def route(
+        self, graph: GraphSnapshot, start_idx: int, end_idx: int
+    ) -> Optional[Tuple[Optional[List[int]], Optional[float]]]:
+        """
+        Отвечает на запрос без поиска, проходя по матрице next_edges.
+        Возвращает (путь, дистанция) в контракте движков поиска, либо None,
+        если оракул построен для другого графа и ответ нужно искать вживую.
+        """
+        if self.fingerprint != graph.fingerprint:
+            return None
+        if start_idx == end_idx:
+            return [start_idx], 0.0
+        if self.next_edges[start_idx, end_idx] < 0:
+            if math.isfinite(self.distances[start_idx, end_idx]):
+                # Дистанция есть, а первого сегмента нет — файл поврежден.
+                return None
+            return None, None
+
+        targets = graph.targets
+        distances = graph.distances
+        path = [start_idx]
+        total_distance = 0.0
+        current_idx = start_idx
+        # Путь без циклов не длиннее числа портов: защита от испорченного файла.
+        for _ in range(graph.num_ports):
+            edge = int(self.next_edges[current_idx, end_idx])
+            if edge < 0:
+                return None
+            current_idx = int(targets[edge])
+            total_distance += float(distances[edge])
+            path.append(current_idx)
+            if current_idx == end_idx:
+                # Дистанция суммируется по float64-весам сегментов, а не берется
+                # из float32-матрицы, чтобы совпадать с результатом поиска.
+                return path, total_distance
+        return None
+
+
+# Снимок графа процесса-построителя: собирается в initializer из массивов
+# (сам GraphSnapshot не сериализуется — в нем блокировки).
+_worker_graph: Optional[GraphSnapshot] = None
+
+
+def _init_builder_worker(arrays: Dict[str, np.ndarray], fingerprint: str) -> None:
+    global _worker_graph
+    _worker_graph = GraphSnapshot.from_arrays(arrays, fingerprint)
+
+
+def _build_rows(source_indices: List[int]) -> Tuple[List[int], np.ndarray, np.ndarray]:
+    """Считает строки матриц для пачки источников (выполняется в процессе пула)."""
+    graph = _worker_graph
+    edge_sources = np.repeat(
+        np.arange(graph.num_ports, dtype=np.int64), np.diff(graph.offsets)
+    )
+    distance_rows = np.empty((len(source_indices), graph.num_ports), dtype=np.float32)
+    edge_rows = np.empty((len(source_indices), graph.num_ports), dtype=np.int32)
+    for row, source_idx in enumerate(source_indices):
+        settle_order: List[int] = []
+        distances, parents = single_source_dijkstra(
+            graph, source_idx, settle_order=settle_order
+        )
+        distance_rows[row] = distances
+        first_edges = np.full(graph.num_ports, -1, dtype=np.int32)
+        # Обходим порты в порядке обработки Дейкстрой: предок всегда раньше
+        # потомка (сортировка по дистанции этого не гарантирует при сегментах
+        # нулевой длины).
+        for port_idx in settle_order:
+            edge = parents[port_idx]
+            if edge < 0:
+                continue
+            parent_idx = int(edge_sources[edge])
+            first_edges[port_idx] = (
+                edge if parent_idx == source_idx else first_edges[parent_idx]
+            )
+        edge_rows[row] = first_edges
+    return source_indices, distance_rows, edge_rows
+
+
+def build_distance_oracle(
+    graph: GraphSnapshot,
+    path: str = DISTANCE_ORACLE_PATH,
+    workers: Optional[int] = None,
+    chunk_size: int = 64,
+) -> None:
+    """
+    Строит оракул для базового снимка (профиль "distance"): полный Дейкстра
+    от каждого порта в пуле процессов, строки пишутся прямо в отображенный
+    в память файл. Файл пишется во временный путь и атомарно подменяет
+    старый после завершения.
+    """
+    num_ports = graph.num_ports
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+
+    header = ORACLE_HEADER_STRUCT.pack(
+        ORACLE_MAGIC,
+        ORACLE_FORMAT_VERSION,
+        num_ports,
+        graph.fingerprint.encode("ascii"),
+        time.time(),
+    )
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(ORACLE_HEADER_SIZE, b"\0"))
+        f.write(np.ascontiguousarray(graph.port_ids, dtype=np.int64).tobytes())
+        # Резервируем место под обе матрицы.
+        f.truncate(ORACLE_HEADER_SIZE + 8 * num_ports + (4 + 4) * num_ports * num_ports)
+
+    offset = ORACLE_HEADER_SIZE + 8 * num_ports
+    distances = np.memmap(tmp_path, np.float32, "r+", offset, (num_ports, num_ports))
+    offset += distances.nbytes
+    next_edges = np.memmap(tmp_path, np.int32, "r+", offset, (num_ports, num_ports))
+
+    chunks = [
+        list(range(start, min(start + chunk_size, num_ports)))
+        for start in range(0, num_ports, chunk_size)
+    ]
+    started_at = time.monotonic()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_builder_worker,
+        initargs=(graph.to_arrays(), graph.base_fingerprint),
+    ) as executor:
+        for done, (source_indices, distance_rows, edge_rows) in enumerate(
+            executor.map(_build_rows, chunks), start=1
+        ):
+            distances[source_indices[0] : source_indices[-1] + 1] = distance_rows
+            next_edges[source_indices[0] : source_indices[-1] + 1] = edge_rows
+            logger.info(f"Оракул: обработано {done}/{len(chunks)} пачек источников.")
+
+    distances.flush()
+    next_edges.flush()
+    del distances, next_edges
+    os.replace(tmp_path, path)
+    logger.info(
+        f"Оракул для {num_ports} портов построен за {time.monotonic() - started_at:.1f} с: {path}"
+    )
+
+
+# Отображенный оракул для текущего снимка графа (None — нет или устарел).
+_oracle: Optional[DistanceOracle] = None
+_oracle_checked_at = 0.0
+_oracle_lock = threading.Lock()
+
+
+def get_distance_oracle(graph: GraphSnapshot) -> Optional[DistanceOracle]:
+    """
+    Возвращает оракул, если файл DISTANCE_ORACLE_PATH существует и построен
+    для этого снимка графа. Отсутствующий или устаревший файл перепроверяется
+    не чаще раза в DISTANCE_ORACLE_RECHECK_SECONDS секунд.
+    """
+    global _oracle, _oracle_checked_at
+    oracle = _oracle
+    if oracle is not None and oracle.fingerprint == graph.fingerprint:
+        return oracle
+    now = time.monotonic()
+    if now - _oracle_checked_at < DISTANCE_ORACLE_RECHECK_SECONDS:
+        return None
+    with _oracle_lock:
+        _oracle_checked_at = now
+        # Загруженный оракул не сбрасывается: он может подходить снимку графа,
+        # который еще обслуживается; заменяется только подходящим файлом.
+        if not os.path.exists(DISTANCE_ORACLE_PATH):
+            return None
+        try:
+            oracle = DistanceOracle.open(DISTANCE_ORACLE_PATH)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось открыть оракул {DISTANCE_ORACLE_PATH}: {e}")
+            return None
+        if oracle is None or oracle.fingerprint != graph.fingerprint:
+            logger.info("Оракул дистанций устарел: используется поиск.")
+            return None
+        _oracle = oracle
+        return oracle
+
+
+if __name__ == "__main__":
+    # Офлайн-построение оракула из текущего содержимого БД:
+    #   python distance_oracle.py [число_процессов]
+    import sys
+
+    from graph import load_graph_snapshot
+
+    logging.basicConfig(level=logging.INFO)
+    snapshot = load_graph_snapshot()
+    if snapshot is None:
+        print("Failed to load the port graph from the database.")
+    else:
+        build_distance_oracle(
+            snapshot, workers=int(sys.argv[1]) if len(sys.argv) > 1 else None
+        )
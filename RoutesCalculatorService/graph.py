@@ -0,0 +1,667 @@
+# RoutesCalculatorService/graph.py
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import async_db
+import numpy as np
+from data_models import GraphSegmentData, PortData
+from db_interface import (
+    get_all_ports_for_algorithm,
+    get_all_segments_for_graph,
+    get_segments_version,
+)
+from graph_snapshot_file import read_graph_snapshot_file, write_graph_snapshot_file
+from pydantic import ValidationError
+
+logger = logging.getLogger("calculator_graph")
+
+# Как часто (в секундах) сверять версию таблицы ports_segment с загруженным снимком.
+SEGMENTS_VERSION_CHECK_SECONDS = float(
+    os.getenv("SEGMENTS_VERSION_CHECK_SECONDS", "30")
+)
+
+# Файл снимка графа: при старте отображается в память вместо загрузки из БД,
+# перезаписывается после каждой загрузки графа из БД.
+GRAPH_SNAPSHOT_PATH = os.getenv(
+    "GRAPH_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(__file__), "cache", "graph_snapshot.bin"),
+)
+
+# Профили стоимости рёбер: "distance" — морские мили, "time" — часы в пути.
+DISTANCE_PROFILE = "distance"
+TIME_PROFILE = "time"
+COST_PROFILES = (DISTANCE_PROFILE, TIME_PROFILE)
+# Скорость судна для профиля "time", если она не указана в задаче (узлы).
+DEFAULT_VESSEL_SPEED_KNOTS = float(os.getenv("DEFAULT_VESSEL_SPEED_KNOTS", "12"))
+# Сколько производных снимков с весами профилей держать на один снимок графа.
+COST_PROFILE_CACHE_SIZE = int(os.getenv("COST_PROFILE_CACHE_SIZE", "8"))
+
+# Радиус Земли в морских милях
+EARTH_RADIUS_NAUTICAL_MILES = 3440.098
+# Рёбер в одном проходе расчета масштаба эвристики (память O(chunk)).
+_HEURISTIC_SCALE_CHUNK = 1 << 20
+
+# Массивы базового снимка, из которых он собирается без пересчета
+# (см. GraphSnapshot.from_arrays).
+SHARED_ARRAY_FIELDS = (
+    "port_ids",
+    "latitudes",
+    "longitudes",
+    "unit_vectors",
+    "offsets",
+    "targets",
+    "distances",
+    "segment_ids",
+    "speed_caps",
+    "reverse_offsets",
+    "reverse_sources",
+    "reverse_distances",
+    "reverse_edge_ids",
+)
+
+
+def _to_unit_vectors(latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Переводит широты/долготы (в градусах) в единичные векторы формы (N, 3)."""
+    lat = np.radians(latitudes)
+    lon = np.radians(longitudes)
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def _consistent_heuristic_scale(
+    unit_vectors: np.ndarray,
+    sources: np.ndarray,
+    targets: np.ndarray,
+    weights: np.ndarray,
+    upper_bound: float,
+) -> float:
+    """
+    Наибольший масштаб k <= upper_bound, при котором эвристика
+    k * (расстояние по прямой) согласована: k * gc(u, v) <= вес(u, v) для
+    каждого ребра. Тогда по неравенству треугольника h(u) <= вес(u, v) + h(v),
+    и A* / двунаправленный A* находят кратчайший путь, даже если дистанция
+    какого-то сегмента в БД меньше расстояния по дуге большого круга.
+    """
+    scale = upper_bound
+    for start in range(0, len(targets), _HEURISTIC_SCALE_CHUNK):
+        chunk = slice(start, start + _HEURISTIC_SCALE_CHUNK)
+        dots = np.einsum(
+            "ij,ij->i", unit_vectors[sources[chunk]], unit_vectors[targets[chunk]]
+        )
+        half_chord = np.sqrt(np.maximum(2.0 - 2.0 * dots, 0.0)) / 2
+        great_circle = (2 * EARTH_RADIUS_NAUTICAL_MILES) * np.arcsin(
+            np.minimum(half_chord, 1.0)
+        )
+        positive = great_circle > 0
+        if positive.any():
+            ratio = float(np.min(weights[chunk][positive] / great_circle[positive]))
+            scale = min(scale, ratio)
+    return max(scale, 0.0)
+
+
+class GraphSnapshot:
+    """
+    Компактный снимок графа портов и сегментов в CSR-формате.
+
+    Порты адресуются плотными индексами 0..N-1 (в порядке возрастания id).
+    Исходящие сегменты порта i лежат в срезе [offsets[i], offsets[i + 1])
+    массивов targets / distances / segment_ids.
+
+    unit_vectors — координаты портов, заранее переведенные в единичные
+    векторы (x, y, z) на сфере, для векторизованного расчета эвристики.
+
+    Обратная смежность (reverse_*) хранит входящие сегменты: для порта i
+    в срезе [reverse_offsets[i], reverse_offsets[i + 1]) лежат порты
+    отправления, дистанции и индексы рёбер в прямых массивах.
+
+    distances — веса рёбер, которые минимизирует поиск. В базовом снимке это
+    дистанции в милях; снимок профиля (см. with_cost_profile) разделяет все
+    массивы с базовым и отличается только весами (например, часами в пути),
+    масштабом эвристики и отпечатком. segment_distances всегда хранит мили,
+    speed_caps — ограничение скорости на сегменте (inf, если не задано).
+    """
+
+    __slots__ = (
+        "port_ids",
+        "names",
+        "latitudes",
+        "longitudes",
+        "unit_vectors",
+        "offsets",
+        "targets",
+        "distances",
+        "segment_ids",
+        "reverse_offsets",
+        "reverse_sources",
+        "reverse_distances",
+        "reverse_edge_ids",
+        "index_by_id",
+        "fingerprint",
+        "segment_distances",
+        "speed_caps",
+        "cost_profile",
+        "base_fingerprint",
+        "heuristic_scale",
+        "version",
+        "_profile_views",
+        "_profile_views_lock",
+    )
+
+    def __init__(
+        self,
+        port_ids: np.ndarray,
+        names: List[str],
+        latitudes: np.ndarray,
+        longitudes: np.ndarray,
+        offsets: np.ndarray,
+        targets: np.ndarray,
+        distances: np.ndarray,
+        segment_ids: np.ndarray,
+        speed_caps: Optional[np.ndarray] = None,
+    ):
+        self.port_ids = port_ids
+        self.names = names
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        self.offsets = offsets
+        self.targets = targets
+        self.distances = distances
+        self.segment_ids = segment_ids
+        self.unit_vectors = _to_unit_vectors(latitudes, longitudes)
+        self._build_reverse_adjacency()
+        self.index_by_id: Dict[int, int] = {
+            port_id: idx for idx, port_id in enumerate(port_ids.tolist())
+        }
+        self.segment_distances = distances
+        self.speed_caps = (
+            speed_caps
+            if speed_caps is not None
+            else np.full(len(targets), math.inf, dtype=np.float64)
+        )
+        self.fingerprint = self._compute_fingerprint()
+        self.cost_profile = DISTANCE_PROFILE
+        self.base_fingerprint = self.fingerprint
+        self.heuristic_scale = self._edge_heuristic_scale(self.reverse_distances, 1.0)
+        # Номер снимка в процессе (присваивается при установке, 0 — не установлен).
+        self.version = 0
+        self._profile_views: "OrderedDict[str, GraphSnapshot]" = OrderedDict()
+        self._profile_views_lock = threading.Lock()
+
+    def _compute_fingerprint(self) -> str:
+        """
+        Отпечаток содержимого графа: по нему сверяются производные структуры
+        (например, сохраненные на диск иерархии), построенные для этого снимка.
+        Ограничения скорости (average_speed / estimated_time) входят в
+        отпечаток: их правка меняет маршруты профиля "time".
+        """
+        digest = hashlib.sha256()
+        for array in (
+            self.port_ids,
+            self.latitudes,
+            self.longitudes,
+            self.offsets,
+            self.targets,
+            self.distances,
+            self.segment_ids,
+            self.speed_caps,
+        ):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def _edge_heuristic_scale(
+        self, reverse_weights: np.ndarray, upper_bound: float
+    ) -> float:
+        """Согласованный масштаб эвристики для весов рёбер в порядке обратного CSR."""
+        return _consistent_heuristic_scale(
+            self.unit_vectors,
+            self.reverse_sources,
+            self.targets[self.reverse_edge_ids],
+            reverse_weights,
+            upper_bound,
+        )
+
+    def _build_reverse_adjacency(self) -> None:
+        """Строит обратный CSR по направленным сегментам (нужен для поиска от цели)."""
+        num_ports = len(self.port_ids)
+        edge_sources = np.repeat(
+            np.arange(num_ports, dtype=np.int32), np.diff(self.offsets)
+        )
+        order = np.argsort(self.targets, kind="stable")
+        self.reverse_offsets = np.zeros(num_ports + 1, dtype=np.int64)
+        np.cumsum(
+            np.bincount(self.targets, minlength=num_ports),
+            out=self.reverse_offsets[1:],
+        )
+        self.reverse_sources = edge_sources[order]
+        self.reverse_distances = self.distances[order]
+        self.reverse_edge_ids = order.astype(np.int64)
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Массивы базового снимка (SHARED_ARRAY_FIELDS) и имена портов в виде
+        UTF-8 блока (names_blob, names_offsets) — для публикации в общую
+        память и записи файла снимка. Для снимка профиля отдаются исходные
+        дистанции: профиль применяется к восстановленному базовому снимку.
+        """
+        arrays: Dict[str, np.ndarray] = {
+            name: np.ascontiguousarray(getattr(self, name))
+            for name in SHARED_ARRAY_FIELDS
+        }
+        arrays["distances"] = np.ascontiguousarray(self.segment_distances)
+        arrays["reverse_distances"] = self.segment_distances[self.reverse_edge_ids]
+        encoded_names = [name.encode("utf-8") for name in self.names]
+        arrays["names_blob"] = np.frombuffer(b"".join(encoded_names), dtype=np.uint8)
+        arrays["names_offsets"] = np.cumsum(
+            [0] + [len(name) for name in encoded_names], dtype=np.int64
+        )
+        return arrays
+
+    @classmethod
+    def from_arrays(
+        cls, arrays: Dict[str, np.ndarray], fingerprint: str
+    ) -> "GraphSnapshot":
+        """
+        Собирает базовый снимок из массивов to_arrays, не копируя их и не
+        пересчитывая производные структуры: так процессы пула поиска
+        подключаются к графу в общей памяти, а калькулятор при старте
+        отображает в память файл снимка (graph_snapshot_file).
+        """
+        graph = object.__new__(cls)
+        for name in SHARED_ARRAY_FIELDS:
+            setattr(graph, name, arrays[name])
+        names_blob = arrays["names_blob"].tobytes()
+        names_offsets = arrays["names_offsets"].tolist()
+        graph.names = [
+            names_blob[start:end].decode("utf-8")
+            for start, end in zip(names_offsets, names_offsets[1:])
+        ]
+        graph.segment_distances = graph.distances
+        graph.index_by_id = {
+            port_id: idx for idx, port_id in enumerate(graph.port_ids.tolist())
+        }
+        graph.fingerprint = fingerprint
+        graph.base_fingerprint = fingerprint
+        graph.cost_profile = DISTANCE_PROFILE
+        graph.heuristic_scale = graph._edge_heuristic_scale(
+            graph.reverse_distances, 1.0
+        )
+        graph.version = 0
+        graph._profile_views = OrderedDict()
+        graph._profile_views_lock = threading.Lock()
+        return graph
+
+    @property
+    def num_ports(self) -> int:
+        return len(self.port_ids)
+
+    @property
+    def num_segments(self) -> int:
+        return len(self.targets)
+
+    def index_of(self, port_id: int) -> Optional[int]:
+        """Возвращает индекс порта в графе или None, если порта нет в снимке."""
+        return self.index_by_id.get(port_id)
+
+    def with_cost_profile(
+        self, profile: str, vessel_speed_knots: Optional[float] = None
+    ) -> "GraphSnapshot":
+        """
+        Снимок с весами рёбер для профиля стоимости. Для "distance" — сам
+        снимок. Для "time" вес ребра — часы в пути: дистанция / min(скорость
+        судна, ограничение скорости сегмента). Массивы весов считаются одним
+        векторизованным проходом и кешируются по (профиль, скорость), поэтому
+        смена профиля не перезагружает граф. Эвристика масштабируется на
+        1 / максимальная достижимая скорость, чтобы оставаться допустимой.
+        Вызывается для базового снимка (снимки профилей разделяют его кеш).
+        """
+        if profile != TIME_PROFILE:
+            return self
+        speed = (
+            float(vessel_speed_knots)
+            if vessel_speed_knots is not None and vessel_speed_knots > 0
+            else DEFAULT_VESSEL_SPEED_KNOTS
+        )
+        profile_key = f"{TIME_PROFILE}@{speed:g}"
+        with self._profile_views_lock:
+            view = self._profile_views.get(profile_key)
+            if view is not None:
+                self._profile_views.move_to_end(profile_key)
+                return view
+
+        effective_speeds = np.minimum(self.speed_caps, speed)
+        weights = self.segment_distances / effective_speeds
+        view = object.__new__(GraphSnapshot)
+        for name in GraphSnapshot.__slots__:
+            setattr(view, name, getattr(self, name))
+        view.distances = weights
+        view.reverse_distances = weights[self.reverse_edge_ids]
+        view.cost_profile = profile_key
+        # Скорость на сегменте не больше максимальной, поэтому (мили по прямой)
+        # / max_speed — нижняя граница времени, если дистанция сегмента не меньше
+        # расстояния по прямой; иначе масштаб уменьшается до согласованного.
+        max_speed = float(effective_speeds.max()) if len(effective_speeds) else speed
+        view.heuristic_scale = self._edge_heuristic_scale(
+            view.reverse_distances, 1.0 / max_speed
+        )
+        view.fingerprint = hashlib.sha256(
+            (self.base_fingerprint + profile_key).encode()
+        ).hexdigest()
+
+        with self._profile_views_lock:
+            self._profile_views[profile_key] = view
+            while len(self._profile_views) > COST_PROFILE_CACHE_SIZE:
+                self._profile_views.popitem(last=False)
+        return view
+
+    def path_edge_indices(self, path_indices: List[int]) -> np.ndarray:
+        """
+        Индексы рёбер (в прямых массивах) вдоль пути по портам: между двумя
+        портами может быть несколько сегментов, берется самый дешевый по весам
+        этого снимка (первый при равенстве) — именно его выбрал бы поиск,
+        поскольку релаксация принимает только строго лучшую стоимость.
+        segment_ids[edges] дает id сегментов в БД.
+        """
+        edges: List[int] = []
+        for source_idx, target_idx in zip(path_indices, path_indices[1:]):
+            edge_start = int(self.offsets[source_idx])
+            edge_end = int(self.offsets[source_idx + 1])
+            candidates = np.flatnonzero(self.targets[edge_start:edge_end] == target_idx)
+            edges.append(
+                edge_start
+                + int(candidates[np.argmin(self.distances[edge_start + candidates])])
+            )
+        return np.array(edges, dtype=np.int64)
+
+    def port_data(self, idx: int) -> PortData:
+        """
+        Собирает PortData для порта по его индексу (для границы с БД/Kafka).
+        Данные уже проверены при построении снимка, повторной валидации нет.
+        """
+        return PortData.model_construct(
+            id=int(self.port_ids[idx]),
+            name=self.names[idx],
+            latitude=float(self.latitudes[idx]),
+            longitude=float(self.longitudes[idx]),
+        )
+
+
+def _segment_speed_cap(segment: GraphSegmentData) -> float:
+    """
+    Ограничение скорости на сегменте в узлах: average_speed и скорость,
+    следующая из estimated_time (дистанция / часы); из заданных — меньшее.
+    """
+    caps = []
+    if segment.average_speed is not None and segment.average_speed > 0:
+        caps.append(segment.average_speed)
+    if segment.estimated_time is not None and segment.estimated_time > 0:
+        if segment.distance > 0:
+            caps.append(segment.distance / segment.estimated_time)
+    return min(caps) if caps else math.inf
+
+
+def build_graph_snapshot(
+    ports: List[Dict[str, Any]], segments: List[Dict[str, Any]]
+) -> GraphSnapshot:
+    """
+    Строит CSR-снимок из строк ports_port и ports_segment.
+    Порты и сегменты валидируются через PortData / GraphSegmentData один раз
+    при загрузке. Некорректные сегменты и сегменты, ссылающиеся на
+    отсутствующие порты, отбрасываются.
+    """
+    validated_ports = sorted(
+        (PortData(**port_dict) for port_dict in ports), key=lambda p: p.id
+    )
+    port_ids = np.array([p.id for p in validated_ports], dtype=np.int64)
+    names = [p.name for p in validated_ports]
+    latitudes = np.array([p.latitude for p in validated_ports], dtype=np.float64)
+    longitudes = np.array([p.longitude for p in validated_ports], dtype=np.float64)
+    index_by_id = {port_id: idx for idx, port_id in enumerate(port_ids.tolist())}
+
+    sources: List[int] = []
+    targets: List[int] = []
+    distances: List[float] = []
+    segment_ids: List[int] = []
+    speed_caps: List[float] = []
+    for segment_dict in segments:
+        try:
+            segment = GraphSegmentData(**segment_dict)
+        except ValidationError as e:
+            print(f"Warning: Could not parse segment data: {segment_dict}, error: {e}")
+            continue
+        source_idx = index_by_id.get(segment.PortOfDeparture_id)
+        target_idx = index_by_id.get(segment.PortOfArrival_id)
+        if source_idx is None or target_idx is None:
+            continue
+        sources.append(source_idx)
+        targets.append(target_idx)
+        distances.append(segment.distance)
+        segment_ids.append(segment.id)
+        speed_caps.append(_segment_speed_cap(segment))
+
+    sources_arr = np.array(sources, dtype=np.int32)
+    # Стабильная сортировка по порту отправления сохраняет порядок сегментов из БД
+    order = np.argsort(sources_arr, kind="stable")
+    offsets = np.zeros(len(port_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources_arr, minlength=len(port_ids)), out=offsets[1:])
+
+    return GraphSnapshot(
+        port_ids=port_ids,
+        names=names,
+        latitudes=latitudes,
+        longitudes=longitudes,
+        offsets=offsets,
+        targets=np.array(targets, dtype=np.int32)[order],
+        distances=np.array(distances, dtype=np.float64)[order],
+        segment_ids=np.array(segment_ids, dtype=np.int64)[order],
+        speed_caps=np.array(speed_caps, dtype=np.float64)[order],
+    )
+
+
+def load_graph_snapshot() -> Optional[GraphSnapshot]:
+    """
+    Загружает весь граф из БД двумя запросами.
+    Возвращает None, если не удалось получить порты или сегменты: граф без
+    рёбер из-за ошибки запроса не должен ни устанавливаться, ни сохраняться.
+    """
+    ports = get_all_ports_for_algorithm()
+    if not ports:
+        return None
+    segments = get_all_segments_for_graph()
+    if segments is None:
+        return None
+    return build_graph_snapshot(ports, segments)
+
+
+async def load_graph_snapshot_async() -> Optional[GraphSnapshot]:
+    """
+    То же, что load_graph_snapshot, но запросы выполняются через пул asyncpg,
+    а построение CSR-массивов — в отдельном потоке.
+    """
+    ports = await async_db.get_all_ports_for_algorithm()
+    if not ports:
+        return None
+    segments = await async_db.get_all_segments_for_graph()
+    if segments is None:
+        return None
+    return await asyncio.to_thread(build_graph_snapshot, ports, segments)
+
+
+# Снимок графа загружается один раз на процесс и переиспользуется всеми задачами.
+# При изменении портов или сегментов новый снимок строится в фоне и заменяет
+# текущий одним присваиванием (см. reload_graph_snapshot_async): задачи,
+# уже получившие ссылку на старый снимок, дорабатывают на нем.
+_graph_snapshot: Optional[GraphSnapshot] = None
+_graph_snapshot_lock = threading.RLock()
+# Загрузка из event loop: одна на процесс, остальные задачи ждут ее результат.
+_graph_snapshot_async_lock: Optional[asyncio.Lock] = None
+# Версия таблицы ports_segment, из которой построен текущий снимок.
+_segments_version: Optional[str] = None
+# Номер последнего установленного снимка (GraphSnapshot.version).
+_graph_version = 0
+
+
+def _install_graph_snapshot(
+    snapshot: Optional[GraphSnapshot], segments_version: Optional[str]
+) -> None:
+    """Делает снимок текущим и присваивает ему следующий номер версии."""
+    global _graph_snapshot, _segments_version, _graph_version
+    with _graph_snapshot_lock:
+        if snapshot is not None:
+            _graph_version += 1
+            snapshot.version = _graph_version
+        _segments_version = segments_version
+        _graph_snapshot = snapshot
+
+
+def get_graph_snapshot() -> Optional[GraphSnapshot]:
+    """
+    Возвращает закешированный снимок графа, загружая его при первом вызове.
+    Неудачная загрузка не кешируется, чтобы следующая задача попробовала снова.
+    """
+    if _graph_snapshot is not None:
+        return _graph_snapshot
+    with _graph_snapshot_lock:
+        if _graph_snapshot is None:
+            # Версия читается до загрузки: изменение во время загрузки
+            # будет замечено при следующей проверке.
+            segments_version = get_segments_version()
+            _install_graph_snapshot(load_graph_snapshot(), segments_version)
+        return _graph_snapshot
+
+
+def get_graph_version() -> int:
+    """Номер текущего снимка графа (0, если граф еще не загружен)."""
+    return _graph_snapshot.version if _graph_snapshot is not None else 0
+
+
+def _get_graph_snapshot_async_lock() -> asyncio.Lock:
+    global _graph_snapshot_async_lock
+    if _graph_snapshot_async_lock is None:
+        _graph_snapshot_async_lock = asyncio.Lock()
+    return _graph_snapshot_async_lock
+
+
+def load_graph_snapshot_file(
+    path: str = GRAPH_SNAPSHOT_PATH,
+) -> Optional[Tuple[GraphSnapshot, Optional[str]]]:
+    """
+    Снимок графа из файла (массивы отображаются в память без копирования)
+    и версия таблицы ports_segment, из которой он был построен. None, если
+    файла нет или он поврежден.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        snapshot_file = read_graph_snapshot_file(path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Не удалось прочитать снимок графа {path}: {e}")
+        return None
+    if snapshot_file is None:
+        logger.warning(f"Файл снимка графа {path} другого формата или поврежден.")
+        return None
+    snapshot = GraphSnapshot.from_arrays(
+        snapshot_file.arrays, snapshot_file.fingerprint
+    )
+    return snapshot, snapshot_file.segments_version
+
+
+def save_graph_snapshot_file(
+    snapshot: GraphSnapshot,
+    segments_version: Optional[str],
+    path: str = GRAPH_SNAPSHOT_PATH,
+) -> bool:
+    """Записывает снимок графа в файл для быстрого следующего старта."""
+    try:
+        write_graph_snapshot_file(
+            path, snapshot.to_arrays(), snapshot.base_fingerprint, segments_version
+        )
+        return True
+    except OSError as e:
+        logger.warning(f"Не удалось сохранить снимок графа в {path}: {e}")
+    return False
+
+
+# Текущий снимок прочитан из файла и еще не сверен с БД.
+_graph_snapshot_from_file = False
+
+
+def graph_snapshot_from_file() -> bool:
+    """True, если текущий снимок взят из файла и еще не сверен с таблицами БД."""
+    return _graph_snapshot_from_file
+
+
+async def get_graph_snapshot_async() -> Optional[GraphSnapshot]:
+    """
+    Асинхронный вариант get_graph_snapshot. Первым делом пробует файл
+    GRAPH_SNAPSHOT_PATH (отображение в память почти мгновенно), иначе
+    читает граф через async_db и сохраняет файл для следующего старта.
+    Снимок из файла затем сверяется с БД в фоне (graph_reloader).
+    """
+    global _graph_snapshot_from_file
+    if _graph_snapshot is not None:
+        return _graph_snapshot
+    async with _get_graph_snapshot_async_lock():
+        if _graph_snapshot is not None:
+            return _graph_snapshot
+        loaded = await asyncio.to_thread(load_graph_snapshot_file)
+        if loaded is not None:
+            snapshot, segments_version = loaded
+            _install_graph_snapshot(snapshot, segments_version)
+            _graph_snapshot_from_file = True
+            logger.info(f"Снимок графа прочитан из файла {GRAPH_SNAPSHOT_PATH}.")
+            return _graph_snapshot
+        segments_version = await async_db.get_segments_version()
+        snapshot = await load_graph_snapshot_async()
+        _install_graph_snapshot(snapshot, segments_version)
+        if snapshot is not None:
+            await asyncio.to_thread(
+                save_graph_snapshot_file, snapshot, segments_version
+            )
+        return _graph_snapshot
+
+
+async def segments_changed_async() -> bool:
+    """True, если таблица ports_segment изменилась с загрузки текущего снимка."""
+    if _graph_snapshot is None:
+        return False
+    current_version = await async_db.get_segments_version()
+    return current_version is not None and current_version != _segments_version
+
+
+async def reload_graph_snapshot_async(
+    prepare: Optional[Callable[[GraphSnapshot], Awaitable[None]]] = None,
+) -> Optional[GraphSnapshot]:
+    """
+    Строит новый снимок графа из БД, пока задачи продолжают работать на
+    текущем, и атомарно подменяет его. prepare(snapshot) вызывается до
+    подмены — в нем готовятся производные структуры (иерархии, ориентиры,
+    общая память пула), чтобы первые задачи на новом снимке не ждали их.
+    Если граф не изменился (тот же отпечаток), снимок не подменяется.
+    Загруженный граф сохраняется в файл снимка. Возвращает новый снимок
+    или None, если загрузить граф не удалось (текущий снимок тогда
+    остается в работе).
+    """
+    global _graph_snapshot_from_file, _segments_version
+    async with _get_graph_snapshot_async_lock():
+        segments_version = await async_db.get_segments_version()
+        snapshot = await load_graph_snapshot_async()
+        if snapshot is None:
+            return None
+        current = _graph_snapshot
+        if current is not None and current.fingerprint == snapshot.fingerprint:
+            with _graph_snapshot_lock:
+                _segments_version = segments_version
+            snapshot = current
+        else:
+            if prepare is not None:
+                await prepare(snapshot)
+            _install_graph_snapshot(snapshot, segments_version)
+        _graph_snapshot_from_file = False
+        await asyncio.to_thread(save_graph_snapshot_file, snapshot, segments_version)
+        return snapshot
@@ -0,0 +1,148 @@
+# RoutesCalculatorService/graph_reloader.py
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import asyncpg
+from async_db import listen
+from graph import (
+    SEGMENTS_VERSION_CHECK_SECONDS,
+    GraphSnapshot,
+    graph_snapshot_from_file,
+    reload_graph_snapshot_async,
+    segments_changed_async,
+)
+
+logger = logging.getLogger("calculator_graph_reloader")
+
+# Канал Postgres, в который триггеры ports_port / ports_segment отправляют
+# уведомления об изменениях. Имя канала зашито в функцию триггера (миграция
+# ports 0002_graph_change_notify), поэтому не настраивается окружением.
+GRAPH_CHANGES_CHANNEL = "graph_changed"
+# Сколько ждать (мс) после уведомления, прежде чем перестраивать граф:
+# серия правок в админке приводит к одной перезагрузке.
+GRAPH_RELOAD_DEBOUNCE_MS = int(os.getenv("GRAPH_RELOAD_DEBOUNCE_MS", "500"))
+
+
+class GraphReloader:
+    """
+    Фоновая перезагрузка снимка графа без перезапуска калькулятора.
+    Слушает канал GRAPH_CHANGES_CHANNEL (LISTEN) на отдельном соединении;
+    раз в SEGMENTS_VERSION_CHECK_SECONDS дополнительно сверяет версию
+    таблицы сегментов — на случай, если соединение было потеряно и
+    уведомление не дошло. Новый снимок строится в фоне и подменяет текущий
+    атомарно (reload_graph_snapshot_async).
+    """
+
+    def __init__(self, channel: str, debounce_ms: int, poll_interval: float):
+        self.channel = channel
+        self.debounce = debounce_ms / 1000
+        self.poll_interval = poll_interval
+        self.notifications = 0
+        self.reloads = 0
+        self.failed_reloads = 0
+        self.last_reload_seconds = 0.0
+        self._connection: Optional[asyncpg.Connection] = None
+        self._subscribed = False
+        self._changed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._prepare: Optional[Callable[[GraphSnapshot], Awaitable[None]]] = None
+
+    def start(
+        self, prepare: Optional[Callable[[GraphSnapshot], Awaitable[None]]] = None
+    ) -> None:
+        """
+        Запускает фоновую задачу. prepare(snapshot) готовит производные
+        структуры нового снимка до того, как он станет текущим. Снимок,
+        прочитанный при старте из файла, сразу сверяется с БД.
+        """
+        self._prepare = prepare
+        self._changed = asyncio.Event()
+        if graph_snapshot_from_file():
+            # Снимок из файла сверяется с таблицами БД в фоне
+            self._changed.set()
+        self._task = asyncio.create_task(self._run())
+
+    def _on_notification(
+        self, connection: Any, pid: int, channel: str, payload: str
+    ) -> None:
+        self.notifications += 1
+        logger.info(f"Уведомление об изменении графа: таблица {payload}.")
+        self._changed.set()
+
+    async def _subscribe(self) -> None:
+        self._connection = await listen(self.channel, self._on_notification)
+        if self._connection is None:
+            return
+        logger.info(f"Подписка на канал {self.channel} активна.")
+        if self._subscribed:
+            # Пока соединения не было, уведомления могли потеряться
+            self._changed.set()
+        self._subscribed = True
+
+    async def _run(self) -> None:
+        while True:
+            if self._connection is None or self._connection.is_closed():
+                await self._subscribe()
+            try:
+                await asyncio.wait_for(self._changed.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                if not await segments_changed_async():
+                    continue
+                logger.info("Версия таблицы сегментов изменилась.")
+            else:
+                await asyncio.sleep(self.debounce)
+            # Уведомления, пришедшие во время сборки, вызовут еще одну
+            self._changed.clear()
+            await self._reload()
+
+    async def _reload(self) -> None:
+        started_at = time.monotonic()
+        try:
+            snapshot = await reload_graph_snapshot_async(self._prepare)
+        except Exception as e:
+            logger.exception(f"Ошибка перезагрузки снимка графа: {e}")
+            snapshot = None
+        self.last_reload_seconds = time.monotonic() - started_at
+        if snapshot is None:
+            self.failed_reloads += 1
+            logger.warning(
+                "Не удалось перезагрузить граф: задачи продолжают работать на текущем снимке."
+            )
+            return
+        self.reloads += 1
+        logger.info(
+            f"Снимок графа версии {snapshot.version} установлен за "
+            f"{self.last_reload_seconds:.2f} с: {snapshot.num_ports} портов, "
+            f"{snapshot.num_segments} сегментов."
+        )
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "listening": self._connection is not None
+            and not self._connection.is_closed(),
+            "notifications": self.notifications,
+            "reloads": self.reloads,
+            "failed_reloads": self.failed_reloads,
+            "last_reload_ms": round(self.last_reload_seconds * 1000, 1),
+        }
+
+
+# Перезагрузчик графа на процесс калькулятора.
+graph_reloader = GraphReloader(
+    GRAPH_CHANGES_CHANNEL, GRAPH_RELOAD_DEBOUNCE_MS, SEGMENTS_VERSION_CHECK_SECONDS
+)
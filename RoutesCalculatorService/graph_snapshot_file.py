@@ -0,0 +1,136 @@
+# RoutesCalculatorService/graph_snapshot_file.py
+import json
+import os
+import struct
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Заголовок: магическая строка, версия формата, размер описания массивов,
+# контрольная сумма (CRC32 описания и данных), отпечаток графа, версия
+# таблицы ports_segment, время записи. Дополняется нулями до
+# GRAPH_FILE_HEADER_SIZE байт; за ним — описание массивов (JSON), затем
+# выровненные массивы.
+GRAPH_FILE_MAGIC = b"RPGRAPH\0"
+GRAPH_FILE_FORMAT_VERSION = 2
+GRAPH_FILE_HEADER_STRUCT = struct.Struct("<8sIII64s32sd")
+GRAPH_FILE_HEADER_SIZE = 256
+
+# Выравнивание массивов в файле и в блоке общей памяти (байт).
+ARRAY_ALIGNMENT = 64
+
+# (имя массива, dtype, форма, смещение от начала данных)
+ArrayLayout = List[Tuple[str, str, Tuple[int, ...], int]]
+
+
+def _aligned(size: int) -> int:
+    return -(-size // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+
+
+def array_layout(arrays: Dict[str, np.ndarray]) -> Tuple[ArrayLayout, int]:
+    """Размещение массивов подряд с выравниванием и общий размер данных."""
+    layout: ArrayLayout = []
+    offset = 0
+    for name, array in arrays.items():
+        layout.append((name, array.dtype.str, array.shape, offset))
+        offset += _aligned(array.nbytes)
+    return layout, offset
+
+
+class GraphSnapshotFile:
+    """Содержимое файла снимка: массивы (отображены в память) и метаданные."""
+
+    __slots__ = ("arrays", "fingerprint", "segments_version", "written_at")
+
+    def __init__(
+        self,
+        arrays: Dict[str, np.ndarray],
+        fingerprint: str,
+        segments_version: Optional[str],
+        written_at: float,
+    ):
+        self.arrays = arrays
+        self.fingerprint = fingerprint
+        self.segments_version = segments_version
+        self.written_at = written_at
+
+
+def write_graph_snapshot_file(
+    path: str,
+    arrays: Dict[str, np.ndarray],
+    fingerprint: str,
+    segments_version: Optional[str],
+) -> None:
+    """
+    Записывает массивы снимка графа в файл. Файл пишется во временный путь
+    и атомарно подменяет старый, поэтому читатель не увидит его частично.
+    """
+    layout, _ = array_layout(arrays)
+    layout_bytes = json.dumps(layout).encode("utf-8")
+    data_offset = _aligned(GRAPH_FILE_HEADER_SIZE + len(layout_bytes))
+
+    checksum = zlib.crc32(layout_bytes)
+    for array in arrays.values():
+        checksum = zlib.crc32(np.ascontiguousarray(array).data, checksum)
+        checksum = zlib.crc32(bytes(_aligned(array.nbytes) - array.nbytes), checksum)
+
+    header = GRAPH_FILE_HEADER_STRUCT.pack(
+        GRAPH_FILE_MAGIC,
+        GRAPH_FILE_FORMAT_VERSION,
+        len(layout_bytes),
+        checksum,
+        fingerprint.encode("ascii"),
+        (segments_version or "").encode("ascii"),
+        time.time(),
+    )
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(header.ljust(GRAPH_FILE_HEADER_SIZE, b"\0"))
+        f.write(layout_bytes.ljust(data_offset - GRAPH_FILE_HEADER_SIZE, b"\0"))
+        for array in arrays.values():
+            f.write(np.ascontiguousarray(array).data)
+            f.write(bytes(_aligned(array.nbytes) - array.nbytes))
+    os.replace(tmp_path, path)
+
+
+def read_graph_snapshot_file(path: str) -> Optional[GraphSnapshotFile]:
+    """
+    Отображает файл снимка в память (массивы только для чтения).
+    None, если формат не подходит или контрольная сумма не сошлась.
+    """
+    with open(path, "rb") as f:
+        header = f.read(GRAPH_FILE_HEADER_SIZE)
+        if len(header) < GRAPH_FILE_HEADER_STRUCT.size:
+            return None
+        (
+            magic,
+            version,
+            layout_size,
+            checksum,
+            fingerprint,
+            segments_version,
+            written_at,
+        ) = GRAPH_FILE_HEADER_STRUCT.unpack_from(header)
+        if magic != GRAPH_FILE_MAGIC or version != GRAPH_FILE_FORMAT_VERSION:
+            return None
+        layout_bytes = f.read(layout_size)
+
+    data_offset = _aligned(GRAPH_FILE_HEADER_SIZE + layout_size)
+    data = np.memmap(path, np.uint8, "r", data_offset)
+    if zlib.crc32(data, zlib.crc32(layout_bytes)) != checksum:
+        return None
+
+    arrays: Dict[str, np.ndarray] = {}
+    for name, dtype, shape, offset in json.loads(layout_bytes):
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[name] = np.frombuffer(data, dtype, count, offset).reshape(shape)
+    return GraphSnapshotFile(
+        arrays,
+        fingerprint.decode("ascii"),
+        segments_version.rstrip(b"\0").decode("ascii") or None,
+        written_at,
+    )
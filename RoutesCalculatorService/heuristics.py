@@ -0,0 +1,76 @@
+# RoutesCalculatorService/heuristics.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import numpy as np
+from graph import EARTH_RADIUS_NAUTICAL_MILES, GraphSnapshot
+from landmarks import get_landmarks
+
+# Сколько массивов эвристики (по одному на цель) держать в памяти.
+HEURISTIC_CACHE_SIZE = int(os.getenv("HEURISTIC_CACHE_SIZE", "64"))
+
+
+def great_circle_distances(
+    graph: GraphSnapshot,
+    target_idx: int,
+    indices: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Пакетный расчет расстояния по дуге большого круга до порта target_idx
+    для портов indices (для всех портов графа, если indices не задан).
+    Через длину хорды между единичными векторами: d = 2R * asin(|u - t| / 2),
+    что математически совпадает с формулой гаверсинуса. |u - t|^2 = 2 - 2(u·t),
+    поэтому весь проход — одно матрично-векторное произведение без
+    промежуточного массива (N, 3).
+    """
+    vectors = graph.unit_vectors if indices is None else graph.unit_vectors[indices]
+    dots = vectors @ graph.unit_vectors[target_idx]
+    half_chord = np.sqrt(np.maximum(2.0 - 2.0 * dots, 0.0)) / 2
+    return (2 * EARTH_RADIUS_NAUTICAL_MILES) * np.arcsin(np.minimum(half_chord, 1.0))
+
+
+def _compute_heuristic(graph: GraphSnapshot, target_idx: int, kind: str) -> np.ndarray:
+    # Масштаб делает оценку согласованной с весами рёбер (см. heuristic_scale),
+    # для профиля "time" он же переводит мили по прямой в нижнюю границу часов.
+    values = great_circle_distances(graph, target_idx)
+    if graph.heuristic_scale != 1.0:
+        values *= graph.heuristic_scale
+    if kind == "alt":
+        values = np.maximum(values, get_landmarks(graph).lower_bounds_to(target_idx))
+    return values
+
+
+# LRU-кеш массивов эвристики: ключ — (отпечаток графа, цель, вид эвристики).
+_heuristic_cache: "OrderedDict[Tuple[str, int, str], np.ndarray]" = OrderedDict()
+_heuristic_cache_lock = threading.Lock()
+
+
+def heuristic_to_target(
+    graph: GraphSnapshot, target_idx: int, kind: str = "haversine"
+) -> np.ndarray:
+    """
+    Возвращает массив оценок дистанции от каждого порта до target_idx.
+    kind: "haversine" — расстояние по прямой, "alt" — максимум из него
+    и оценки по ориентирам. Массив считается одним векторизованным
+    проходом и кешируется для цели, поэтому в цикле A* остается только
+    выборка values[neighbors] на весь список соседей сразу.
+    """
+    key = (graph.fingerprint, target_idx, kind)
+    with _heuristic_cache_lock:
+        values = _heuristic_cache.get(key)
+        if values is not None:
+            _heuristic_cache.move_to_end(key)
+            return values
+
+    values = _compute_heuristic(graph, target_idx, kind)
+    # Массив только читается, защищаем его от случайной модификации.
+    values.setflags(write=False)
+
+    with _heuristic_cache_lock:
+        _heuristic_cache[key] = values
+        _heuristic_cache.move_to_end(key)
+        while len(_heuristic_cache) > HEURISTIC_CACHE_SIZE:
+            _heuristic_cache.popitem(last=False)
+    return values
@@ -0,0 +1,243 @@
+# RoutesCalculatorService/k_shortest_paths.py
+import heapq
+import math
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from dijkstra import single_source_dijkstra
+from graph import GraphSnapshot
+from search_state import get_search_state
+from search_stats import SearchStats
+
+# Максимальное число альтернативных маршрутов в одном запросе.
+MAX_ALTERNATIVE_ROUTES = 10
+
+# Слот состояния поиска (см. search_state.get_search_state) для поиска ответвлений.
+_SPUR_STATE_SLOT = 2
+
+
+def _spur_search(
+    graph: GraphSnapshot,
+    spur_idx: int,
+    end_idx: int,
+    estimates: np.ndarray,
+    banned_nodes: Set[int],
+    banned_edges: Set[int],
+    stats: SearchStats,
+) -> Tuple[Optional[List[int]], float]:
+    """
+    A* от spur_idx до end_idx в обход запрещенных портов и сегментов.
+    Возвращает (индексы_рёбер_пути, дистанция) или (None, inf); счетчики
+    поиска добавляются к stats.
+    """
+    offsets = graph.offsets
+    targets = graph.targets
+    distances = graph.distances
+
+    state = get_search_state(graph, _SPUR_STATE_SLOT)
+    generation = state.next_generation()
+    stamps = state.stamps
+    open_stamps = state.open_stamps
+    g_score = state.g_score
+    # Для ответвлений храним ребро-предшественник: между портами может быть
+    # несколько сегментов, и запрещаются именно сегменты.
+    parent_edges = state.came_from
+
+    stamps[spur_idx] = generation
+    g_score[spur_idx] = 0.0
+    parent_edges[spur_idx] = -1
+    open_set: List[Tuple[float, int]] = [(float(estimates[spur_idx]), spur_idx)]
+    open_stamps[spur_idx] = generation
+    spur_stats = SearchStats()
+    nodes_expanded = 0
+    edges_relaxed = 0
+    heap_pushes = 0
+    stale_pops = 0
+    max_open_set = 1
+    edges: Optional[List[int]] = None
+    total_distance = math.inf
+
+    while open_set:
+        _, current_idx = heapq.heappop(open_set)
+        if open_stamps[current_idx] != generation:
+            stale_pops += 1
+            continue
+        open_stamps[current_idx] = 0
+        nodes_expanded += 1
+
+        if current_idx == end_idx:
+            edges = []
+            edge = parent_edges[current_idx]
+            while edge != -1:
+                edges.append(edge)
+                edge = parent_edges[_edge_source(graph, edge)]
+            edges.reverse()
+            total_distance = g_score[current_idx]
+            break
+
+        current_g = g_score[current_idx]
+        edge_start = int(offsets[current_idx])
+        edge_end = int(offsets[current_idx + 1])
+        neighbors = targets[edge_start:edge_end]
+        edges_relaxed += edge_end - edge_start
+        for edge, neighbor_idx, distance, neighbor_estimate in zip(
+            range(edge_start, edge_end),
+            neighbors.tolist(),
+            distances[edge_start:edge_end].tolist(),
+            estimates[neighbors].tolist(),
+        ):
+            # inf — из соседа цель недостижима даже без запретов.
+            if (
+                neighbor_estimate == math.inf
+                or neighbor_idx in banned_nodes
+                or edge in banned_edges
+            ):
+                continue
+            tentative_g_score = current_g + distance
+            if (
+                stamps[neighbor_idx] != generation
+                or tentative_g_score < g_score[neighbor_idx]
+            ):
+                stamps[neighbor_idx] = generation
+                g_score[neighbor_idx] = tentative_g_score
+                parent_edges[neighbor_idx] = edge
+                heapq.heappush(
+                    open_set, (tentative_g_score + neighbor_estimate, neighbor_idx)
+                )
+                heap_pushes += 1
+                open_stamps[neighbor_idx] = generation
+        if len(open_set) > max_open_set:
+            max_open_set = len(open_set)
+
+    spur_stats.set_counters(
+        nodes_expanded, edges_relaxed, heap_pushes, stale_pops, max_open_set
+    )
+    stats.add(spur_stats)
+    return edges, total_distance
+
+
+def _edge_source(graph: GraphSnapshot, edge: int) -> int:
+    """Порт отправления сегмента по его индексу в прямых массивах графа."""
+    return int(np.searchsorted(graph.offsets, edge, side="right")) - 1
+
+
+def k_shortest_paths(
+    graph: GraphSnapshot,
+    start_idx: int,
+    end_idx: int,
+    k: int,
+    stats: Optional[SearchStats] = None,
+) -> List[Tuple[List[int], float]]:
+    """
+    До k кратчайших маршрутов без циклов (алгоритм Йена) в порядке
+    возрастания дистанции: [(индексы_портов_пути, дистанция), ...].
+
+    Поиск ответвлений — A* с оценками из одного обратного Дейкстры от end_idx,
+    общего для всех итераций: дистанция до цели без запретов — точная нижняя
+    граница дистанции с запретами, поэтому ответвления, которым запреты не
+    мешают, находятся почти без лишних раскрытий. Кроме того:
+    - для нового маршрута ответвления ищутся только начиная с точки, где он
+      отошел от родительского маршрута (модификация Лоулера): более ранние
+      корни уже были рассмотрены для родителя с тем же набором запретов;
+    - результат поиска ответвления кешируется по корню пути и
+      переиспользуется, если он не проходит через вновь запрещенные сегменты
+      (запреты для одного корня только расширяются, так что найденный ранее
+      путь остается кратчайшим).
+    """
+    if stats is not None:
+        stats.engine = "yen"
+        stats.heuristic = "reverse_tree"
+    k = max(1, min(k, MAX_ALTERNATIVE_ROUTES))
+    if start_idx == end_idx:
+        return [([start_idx], 0.0)]
+
+    reverse_distances, _ = single_source_dijkstra(graph, end_idx, reverse=True)
+    estimates = np.array(reverse_distances, dtype=np.float64)
+    targets = graph.targets
+    distances = graph.distances
+    if stats is None:
+        stats = SearchStats()
+
+    first_edges, first_distance = _spur_search(
+        graph, start_idx, end_idx, estimates, set(), set(), stats
+    )
+    if first_edges is None:
+        return []
+
+    # Маршрут — кортеж индексов сегментов; для каждого храним точку отклонения.
+    accepted: List[Tuple[Tuple[int, ...], float, int]] = [
+        (tuple(first_edges), first_distance, 0)
+    ]
+    candidates: List[Tuple[float, Tuple[int, ...], int]] = []
+    seen_paths = {tuple(first_edges)}
+    # Корень (сегменты до точки ответвления) -> найденные сегменты ответвления.
+    spur_cache: Dict[Tuple[int, ...], Optional[Tuple[Tuple[int, ...], float]]] = {}
+
+    while len(accepted) < k:
+        path_edges, _, deviation = accepted[-1]
+        path_nodes = [start_idx] + targets[list(path_edges)].tolist()
+        # Префиксные суммы: дистанция корня до i-го порта без пересчета.
+        prefix_distances = np.concatenate(
+            ([0.0], np.cumsum(distances[list(path_edges)]))
+        ).tolist()
+
+        for spur_position in range(deviation, len(path_edges)):
+            spur_idx = path_nodes[spur_position]
+            root_edges = path_edges[:spur_position]
+            # Сегменты из spur_idx, которыми принятые маршруты с тем же
+            # корнем уже продолжили путь.
+            banned_edges = {
+                accepted_edges[spur_position]
+                for accepted_edges, _, _ in accepted
+                if len(accepted_edges) > spur_position
+                and accepted_edges[:spur_position] == root_edges
+            }
+
+            if root_edges in spur_cache and (
+                spur_cache[root_edges] is None
+                or not banned_edges.intersection(spur_cache[root_edges][0])
+            ):
+                spur_result = spur_cache[root_edges]
+            else:
+                spur_edges, spur_distance = _spur_search(
+                    graph,
+                    spur_idx,
+                    end_idx,
+                    estimates,
+                    set(path_nodes[:spur_position]),
+                    banned_edges,
+                    stats,
+                )
+                spur_result = (
+                    (tuple(spur_edges), spur_distance)
+                    if spur_edges is not None
+                    else None
+                )
+                spur_cache[root_edges] = spur_result
+
+            if spur_result is None:
+                continue
+            candidate = root_edges + spur_result[0]
+            if candidate in seen_paths:
+                continue
+            seen_paths.add(candidate)
+            heapq.heappush(
+                candidates,
+                (
+                    prefix_distances[spur_position] + spur_result[1],
+                    candidate,
+                    spur_position,
+                ),
+            )
+
+        if not candidates:
+            break
+        candidate_distance, candidate_edges, candidate_deviation = heapq.heappop(
+            candidates
+        )
+        accepted.append((candidate_edges, candidate_distance, candidate_deviation))
+
+    return [
+        ([start_idx] + targets[list(path_edges)].tolist(), path_distance)
+        for path_edges, path_distance, _ in accepted
+    ]
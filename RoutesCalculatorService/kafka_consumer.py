@@ -3,18 +3,40 @@ import asyncio
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional
-
-from a_star import a_star_search_algorithm
-from aiokafka import AIOKafkaConsumer
-from data_models import PortData, SegmentDataForAStar
-from db_interface import (
-    get_all_ports_for_algorithm,
-    get_port_by_id,
-    get_segments_for_port,
-    update_calculation_task,
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from a_star import SearchEngine, a_star_search_algorithm, get_search_engine
+from aiokafka import AIOKafkaConsumer, TopicPartition
+from aiokafka.abc import ConsumerRebalanceListener
+from aiokafka.errors import KafkaError
+from dijkstra import one_to_many_search
+from distance_oracle import DistanceOracle, get_distance_oracle
+from graph import (
+    COST_PROFILES,
+    DISTANCE_PROFILE,
+    GraphSnapshot,
+    get_graph_snapshot_async,
+)
+from k_shortest_paths import k_shortest_paths
+from metrics import (
+    CONSUMER_LAG,
+    GRAPH_FETCH_SECONDS,
+    QUEUE_DELAY_SECONDS,
+    TASKS_IN_FLIGHT,
+    TASKS_PROCESSED,
+    WAYPOINTS_SECONDS,
+    record_search,
+    record_task_failure,
 )
-from pydantic import ValidationError
+from offset_tracker import OffsetTracker
+from result_writer import is_valid_task_id, result_writer
+from route_cache import CachedRoute, route_cache
+from search_pool import run_search
+from search_stats import SearchStats
+from shared_route_cache import shared_route_cache
+from voyage_optimizer import VoyagePlan, optimize_voyage
 
 logger = logging.getLogger("calculator_consumer")
 
@@ -23,198 +45,432 @@ KAFKA_REQUEST_TOPIC = os.getenv("KAFKA_REQUEST_TOPIC", "route_calculation_reques
 KAFKA_CONSUMER_GROUP_ID = os.getenv(
     "KAFKA_CONSUMER_GROUP_ID", "route_calculator_group_1"
 )
+# Сколько сообщений обрабатывается одновременно; при заполнении окна
+# чтение разделов приостанавливается (backpressure).
+KAFKA_MAX_IN_FLIGHT = int(os.getenv("KAFKA_MAX_IN_FLIGHT", "16"))
+# Максимальный размер пачки сообщений, читаемой за раз (getmany), и сколько
+# ждать сообщений, если их еще нет.
+KAFKA_BATCH_SIZE = int(os.getenv("KAFKA_BATCH_SIZE", "64"))
+KAFKA_BATCH_TIMEOUT_MS = int(os.getenv("KAFKA_BATCH_TIMEOUT_MS", "200"))
+# Сколько раз повторять обработку сообщения, результат которого не удалось
+# записать в БД, и пауза перед первым повтором (удваивается с каждым повтором).
+KAFKA_WRITE_RETRIES = int(os.getenv("KAFKA_WRITE_RETRIES", "3"))
+KAFKA_WRITE_RETRY_DELAY_MS = int(os.getenv("KAFKA_WRITE_RETRY_DELAY_MS", "500"))
+# Движок поиска по умолчанию: "astar", "alt", "bidirectional" или "ch".
+# Может быть переопределен полем search_engine в сообщении.
+SEARCH_ENGINE = os.getenv("SEARCH_ENGINE", "astar")
+# Критерий оптимизации по умолчанию: "distance" (кратчайший) или "time"
+# (быстрейший). Может быть переопределен полем cost_profile в сообщении.
+COST_PROFILE = os.getenv("COST_PROFILE", DISTANCE_PROFILE)
+# Ориентиры ALT и иерархия CH предрасчитаны для дистанций, поэтому для
+# других профилей эти движки заменяются на A*.
+_DISTANCE_ONLY_ENGINES = ("alt", "ch")
 
 PROCESSING_STATUS = "PROCESSING"
 COMPLETED_STATUS = "COMPLETED"
 FAILED_STATUS = "FAILED"
 
 
-async def process_message_from_kafka(payload: Dict[str, Any]):
+@WAYPOINTS_SECONDS.time()
+def _build_waypoints_data(
+    graph: GraphSnapshot,
+    cached_route: CachedRoute,
+    vessel_speed_knots: Any,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Сегментные дистанции и время в пути для каждого порта маршрута
+    (только если задана скорость судна или маршрут искался по профилю "time").
+    Сегменты берутся из edge_indices результата поиска, поэтому дистанции,
+    часы и накопленные итоги считаются одним векторизованным проходом по
+    массивам снимка графа, без запросов к БД.
+    """
+    edges = cached_route.edge_indices
+    leg_distances = graph.segment_distances[edges]
+    if graph.cost_profile != DISTANCE_PROFILE:
+        # Веса снимка профиля "time" — уже часы с учетом ограничений скорости
+        leg_hours = graph.distances[edges]
+    elif vessel_speed_knots is not None and vessel_speed_knots > 0:
+        leg_hours = leg_distances / vessel_speed_knots
+    else:
+        return None
+
+    # Значения для каждого порта: у первого порта сегмента нет (нули)
+    segment_distances = np.concatenate(([0.0], leg_distances))
+    segment_hours = np.concatenate(([0.0], leg_hours))
+    total_distances = np.cumsum(segment_distances).round(2).tolist()
+    total_hours = np.cumsum(segment_hours).round(2).tolist()
+    segment_distances = segment_distances.round(2).tolist()
+    segment_hours = segment_hours.round(2).tolist()
+    segment_ids = [None] + graph.segment_ids[edges].tolist()
+
+    # ИЗМЕНЕНИЕ ЛОГИКИ: вместо ETA/ETD, записываем сегментные дистанции и время
+    return [
+        {
+            "port_id": int(graph.port_ids[idx]),
+            "port_name": graph.names[idx],
+            "latitude": float(graph.latitudes[idx]),
+            "longitude": float(graph.longitudes[idx]),
+            "segment_id": segment_ids[i],  # Сегмент, по которому пришли в порт
+            # Дистанция и время в пути до этого порта
+            "segment_distance_nm": segment_distances[i],
+            "segment_travel_hours": segment_hours[i],
+            # Общая дистанция и общее время от начала
+            "total_distance_from_start_nm": total_distances[i],
+            "total_travel_hours_from_start": total_hours[i],
+        }
+        for i, idx in enumerate(cached_route.path_indices)
+    ]
+
+
+async def _get_current_graph() -> Optional[GraphSnapshot]:
+    """
+    Текущий снимок графа. Задача работает со снимком, полученным в начале
+    обработки, даже если graph_reloader тем временем установил новый.
+    """
+    with GRAPH_FETCH_SECONDS.time():
+        return await get_graph_snapshot_async()
+
+
+async def _find_route(
+    task_id: Any,
+    graph: GraphSnapshot,
+    start_port_id: int,
+    end_port_id: int,
+    start_idx: int,
+    end_idx: int,
+    search_engine: SearchEngine,
+    search_stats: SearchStats,
+) -> CachedRoute:
+    """
+    Маршрут из кеша процесса, общего кеша реплик, оракула всех пар или
+    выбранного движка поиска. В search_stats записывается, откуда взят
+    маршрут, и статистика поиска, если он выполнялся.
+    """
+    # Повторные запросы той же пары портов берутся из кеша результатов
+    cached_route = route_cache.get(
+        start_port_id, end_port_id, graph.base_fingerprint, graph.cost_profile
+    )
+    if cached_route is not None:
+        logger.info(
+            f"Task {task_id}: Маршрут взят из кеша. Кеш маршрутов: {route_cache.stats()}"
+        )
+        search_stats.engine = "route_cache"
+        return cached_route
+
+    async def search_route() -> CachedRoute:
+        # Ответ из предрасчитанного оракула всех пар (если он построен
+        # для текущего графа), иначе — алгоритм поиска (целиком в памяти)
+        oracle_result = None
+        oracle = (
+            get_distance_oracle(graph)
+            if graph.cost_profile == DISTANCE_PROFILE
+            else None
+        )
+        if oracle is not None:
+            started_at = time.perf_counter()
+            oracle_result = await asyncio.to_thread(
+                oracle.route, graph, start_idx, end_idx
+            )
+        if oracle_result is not None:
+            elapsed = time.perf_counter() - started_at
+            search_stats.engine = "oracle"
+            search_stats.elapsed_ms = elapsed * 1000
+            record_search(search_stats, elapsed)
+            path_indices, total_distance = oracle_result
+        else:
+            path_indices, total_distance = await run_search(
+                search_engine, graph, start_idx, end_idx, stats=search_stats
+            )
+        logger.info(
+            f"Task {task_id}: Поиск {search_stats.engine} "
+            f"(эвристика: {search_stats.heuristic or 'нет'}) раскрыл {search_stats.nodes_expanded} узлов."
+        )
+        return _cached_route_for(graph, path_indices, total_distance)
+
+    if shared_route_cache is not None:
+        # Маршрут, уже найденный другой репликой, не пересчитывается
+        cached_route = await shared_route_cache.get_or_compute(
+            start_port_id,
+            end_port_id,
+            graph.fingerprint,
+            graph.cost_profile,
+            search_route,
+        )
+        if search_stats.engine is None:
+            # Маршрут найден другой репликой или другой задачей этого процесса
+            search_stats.engine = "shared_route_cache"
+    else:
+        cached_route = await search_route()
+    route_cache.put(
+        start_port_id,
+        end_port_id,
+        graph.base_fingerprint,
+        cached_route,
+        graph.cost_profile,
+    )
+    return cached_route
+
+
+def _route_distance_nm(
+    graph: GraphSnapshot, edge_indices: np.ndarray, total_cost: float
+) -> float:
+    """Дистанция маршрута в милях (для профиля "distance" это и есть его стоимость)."""
+    if graph.cost_profile == DISTANCE_PROFILE:
+        return total_cost
+    return float(graph.segment_distances[edge_indices].sum())
+
+
+def _cached_route_for(
+    graph: GraphSnapshot,
+    path_indices: Optional[List[int]],
+    total_cost: Optional[float],
+) -> CachedRoute:
+    """
+    Результат поиска в виде CachedRoute: с рёбрами, по которым прошел поиск,
+    и дистанцией в милях при любом профиле.
+    """
+    if path_indices is None or total_cost is None:
+        return CachedRoute(None, None)
+    edge_indices = graph.path_edge_indices(path_indices)
+    return CachedRoute(
+        path_indices,
+        _route_distance_nm(graph, edge_indices, total_cost),
+        edge_indices,
+    )
+
+
+def _alternative_route_data(
+    graph: GraphSnapshot,
+    path_indices: List[int],
+    total_cost: float,
+    vessel_speed_knots: Any,
+) -> Dict[str, Any]:
+    """Один вариант маршрута для поля result_alternatives задачи."""
+    if graph.cost_profile != DISTANCE_PROFILE:
+        total_travel_hours = round(total_cost, 2)
+    elif vessel_speed_knots is not None and vessel_speed_knots > 0:
+        total_travel_hours = round(total_cost / vessel_speed_knots, 2)
+    else:
+        total_travel_hours = None
+    return {
+        "result_path": [int(graph.port_ids[idx]) for idx in path_indices],
+        "port_names": [graph.names[idx] for idx in path_indices],
+        "result_distance": _route_distance_nm(
+            graph, graph.path_edge_indices(path_indices), total_cost
+        ),
+        "total_travel_hours": total_travel_hours,
+    }
+
+
+def _voyage_legs_data(
+    graph: GraphSnapshot, voyage_plan: VoyagePlan, vessel_speed_knots: Any
+) -> List[Dict[str, Any]]:
+    """Плечи рейса в порядке захода для поля result_legs задачи."""
+    return [
+        dict(
+            _alternative_route_data(graph, leg_path, leg_distance, vessel_speed_knots),
+            from_port_id=int(graph.port_ids[from_idx]),
+            from_port_name=graph.names[from_idx],
+            to_port_id=int(graph.port_ids[to_idx]),
+            to_port_name=graph.names[to_idx],
+        )
+        for (leg_path, leg_distance), from_idx, to_idx in zip(
+            voyage_plan.legs, voyage_plan.stop_indices, voyage_plan.stop_indices[1:]
+        )
+    ]
+
+
+async def process_message_from_kafka(payload: Dict[str, Any]) -> bool:
     """
     Обрабатывает сообщение из Kafka: извлекает данные, выполняет расчет A* и обновляет БД.
+    Сообщения с полем targets обрабатываются в режиме "один-ко-многим".
+    Возвращает True, если результат записан в БД (или сообщение некорректно
+    и записывать нечего), False — если записать результат не удалось:
+    офсет такого сообщения не фиксируется.
     """
+    if payload.get("targets") is not None:
+        return await process_one_to_many_message(payload)
+
     task_id = payload.get("task_id")
     start_port_id = payload.get("start_port_id")
     end_port_id = payload.get("end_port_id")
     vessel_speed_knots = payload.get("vessel_speed_knots")  # Получаем скорость
+    search_engine_name = payload.get("search_engine") or SEARCH_ENGINE
+    cost_profile = payload.get("cost_profile") or COST_PROFILE  # Критерий оптимизации
+    alternatives = payload.get("alternatives")  # Сколько вариантов маршрута нужно
+    via_port_ids = payload.get("via_port_ids") or []  # Промежуточные порты рейса
 
     logger.info(
         f"Consumer: Начало обработки задачи {task_id} для портов {start_port_id} -> {end_port_id}"
         f" (Скорость судна: {vessel_speed_knots or 'не указана'})"
     )
 
-    if not all([task_id, isinstance(start_port_id, int), isinstance(end_port_id, int)]):
+    if not all(
+        [
+            is_valid_task_id(task_id),
+            isinstance(start_port_id, int),
+            isinstance(end_port_id, int),
+            isinstance(via_port_ids, list),
+        ]
+    ) or not all(isinstance(port_id, int) for port_id in via_port_ids):
         logger.error(
             f"Consumer Task {task_id}: Некорректные или неполные данные в сообщении: {payload}"
         )
-        return
+        record_task_failure("invalid_message")
+        return True
 
     try:
-        # 1. Получаем данные из БД через db_interface (синхронные вызовы)
-        logger.debug(
-            f"Task {task_id}: Запрос данных для стартового порта {start_port_id}"
-        )
-        start_port_dict = await asyncio.to_thread(get_port_by_id, start_port_id)
-
-        logger.debug(f"Task {task_id}: Запрос данных для конечного порта {end_port_id}")
-        end_port_dict = await asyncio.to_thread(get_port_by_id, end_port_id)
+        # 1. Берем снимок графа из памяти (загружается из БД один раз на процесс)
+        logger.debug(f"Task {task_id}: Получение снимка графа портов")
+        graph = await _get_current_graph()
 
-        logger.debug(f"Task {task_id}: Запрос всех портов для графа A*")
-        all_ports_dicts_list = await asyncio.to_thread(get_all_ports_for_algorithm)
-
-        if not start_port_dict or not end_port_dict:
-            error_msg = f"Не удалось получить данные для стартового ({start_port_id}) или конечного ({end_port_id}) порта."
+        if graph is None:
+            error_msg = "Не удалось загрузить граф портов и сегментов для алгоритма A*."
             logger.error(f"Task {task_id}: {error_msg}")
-            await asyncio.to_thread(
-                update_calculation_task,
+            record_task_failure("graph_unavailable")
+            return await result_writer.write(
                 task_id,
                 FAILED_STATUS,
                 error_message=error_msg,
                 vessel_speed_knots=vessel_speed_knots,
             )
-            return
 
-        if not all_ports_dicts_list:
-            error_msg = "Не удалось получить список всех портов для алгоритма A*."
+        start_idx = graph.index_of(start_port_id)
+        end_idx = graph.index_of(end_port_id)
+
+        if start_idx is None or end_idx is None:
+            error_msg = f"Стартовый ({start_port_id}) или конечный ({end_port_id}) порт отсутствует в графе портов."
             logger.error(f"Task {task_id}: {error_msg}")
-            await asyncio.to_thread(
-                update_calculation_task,
+            record_task_failure("unknown_port")
+            return await result_writer.write(
                 task_id,
                 FAILED_STATUS,
                 error_message=error_msg,
                 vessel_speed_knots=vessel_speed_knots,
             )
-            return
 
-        # 2. Преобразуем данные в Pydantic модели
-        try:
-            start_port_pydantic = PortData(**start_port_dict)
-            end_port_pydantic = PortData(**end_port_dict)
-            all_ports_map_pydantic: Dict[int, PortData] = {}
-            for p_dict in all_ports_dicts_list:
-                all_ports_map_pydantic[p_dict["id"]] = PortData(**p_dict)
-        except ValidationError as ve:
+        # Веса рёбер выбранного профиля (массивы считаются один раз и кешируются)
+        if cost_profile not in COST_PROFILES:
+            logger.warning(
+                f"Task {task_id}: Неизвестный профиль стоимости '{cost_profile}', используется '{DISTANCE_PROFILE}'."
+            )
+            cost_profile = DISTANCE_PROFILE
+        graph = graph.with_cost_profile(cost_profile, vessel_speed_knots)
+
+        # Промежуточные порты без повторов и без портов отправления/назначения
+        via_port_ids = [
+            port_id
+            for port_id in dict.fromkeys(via_port_ids)
+            if port_id not in (start_port_id, end_port_id)
+        ]
+        via_indices = [graph.index_of(port_id) for port_id in via_port_ids]
+        if None in via_indices:
+            missing_port_ids = [
+                port_id
+                for port_id, via_idx in zip(via_port_ids, via_indices)
+                if via_idx is None
+            ]
             error_msg = (
-                f"Ошибка валидации данных порта при преобразовании в Pydantic: {ve}"
+                f"Промежуточные порты {missing_port_ids} отсутствуют в графе портов."
             )
             logger.error(f"Task {task_id}: {error_msg}")
-            await asyncio.to_thread(
-                update_calculation_task,
+            record_task_failure("unknown_via_port")
+            return await result_writer.write(
                 task_id,
                 FAILED_STATUS,
                 error_message=error_msg,
                 vessel_speed_knots=vessel_speed_knots,
             )
-            return
 
-        if (
-            start_port_id not in all_ports_map_pydantic
-            or end_port_id not in all_ports_map_pydantic
+        search_engine = get_search_engine(search_engine_name)
+        if search_engine is None:
+            logger.warning(
+                f"Task {task_id}: Неизвестный движок поиска '{search_engine_name}', используется 'astar'."
+            )
+            search_engine_name = "astar"
+            search_engine = a_star_search_algorithm
+        elif (
+            graph.cost_profile != DISTANCE_PROFILE
+            and search_engine_name in _DISTANCE_ONLY_ENGINES
         ):
-            error_msg = f"Стартовый ({start_port_id}) или конечный ({end_port_id}) порт отсутствует в отвалидированном списке всех портов."
-            logger.error(f"Task {task_id}: {error_msg}")
-            await asyncio.to_thread(
-                update_calculation_task,
-                task_id,
-                FAILED_STATUS,
-                error_message=error_msg,
-                vessel_speed_knots=vessel_speed_knots,
+            logger.info(
+                f"Task {task_id}: Движок '{search_engine_name}' поддерживает только профиль '{DISTANCE_PROFILE}', используется 'astar'."
             )
-            return
-
-        logger.info(f"Task {task_id}: Данные подготовлены, запуск алгоритма A*...")
+            search_engine_name = "astar"
+            search_engine = a_star_search_algorithm
 
-        # 3. Вызываем алгоритм A*
-        path_objects_pydantic, total_distance = await asyncio.to_thread(
-            a_star_search_algorithm,
-            start_port_pydantic,
-            end_port_pydantic,
-            all_ports_map_pydantic,
-            get_segments_for_port,
+        logger.info(
+            f"Task {task_id}: Данные подготовлены, запуск поиска ({search_engine_name}, профиль {graph.cost_profile})..."
         )
 
-        result_waypoints_data: Optional[List[Dict[str, Any]]] = None
-        if path_objects_pydantic and total_distance is not None:
-            result_path_ids = [p.id for p in path_objects_pydantic]
+        # 2. Поиск маршрута (рейса через промежуточные порты или k альтернативных маршрутов)
+        result_alternatives: Optional[List[Dict[str, Any]]] = None
+        result_legs: Optional[List[Dict[str, Any]]] = None
+        search_stats = SearchStats()
+        if via_indices:
+            voyage_plan = await run_search(
+                optimize_voyage,
+                graph,
+                start_idx,
+                via_indices,
+                end_idx,
+                stats=search_stats,
+            )
+            logger.info(
+                f"Task {task_id}: Порядок захода в {len(via_indices)} промежуточных портов подобран, "
+                f"поиск {search_stats.engine} раскрыл {search_stats.nodes_expanded} узлов."
+            )
+            if voyage_plan is not None:
+                cached_route = _cached_route_for(
+                    graph, voyage_plan.path_indices, voyage_plan.total_distance
+                )
+                result_legs = _voyage_legs_data(graph, voyage_plan, vessel_speed_knots)
+            else:
+                cached_route = CachedRoute(None, None)
+        elif isinstance(alternatives, int) and alternatives > 1:
+            ranked_routes = await run_search(
+                k_shortest_paths,
+                graph,
+                start_idx,
+                end_idx,
+                alternatives,
+                stats=search_stats,
+            )
+            logger.info(
+                f"Task {task_id}: Поиск {search_stats.engine} нашел {len(ranked_routes)} "
+                f"из {alternatives} маршрутов, раскрыв {search_stats.nodes_expanded} узлов."
+            )
+            cached_route = (
+                _cached_route_for(graph, *ranked_routes[0])
+                if ranked_routes
+                else CachedRoute(None, None)
+            )
+            if ranked_routes:
+                result_alternatives = [
+                    _alternative_route_data(graph, path, distance, vessel_speed_knots)
+                    for path, distance in ranked_routes
+                ]
+        else:
+            cached_route = await _find_route(
+                task_id,
+                graph,
+                start_port_id,
+                end_port_id,
+                start_idx,
+                end_idx,
+                search_engine,
+                search_stats,
+            )
+        path_indices = cached_route.path_indices
+        total_distance = cached_route.total_distance
 
-            # ИЗМЕНЕНИЕ ЛОГИКИ: вместо ETA/ETD, записываем сегментные дистанции и время
-            if vessel_speed_knots is not None and vessel_speed_knots > 0:
-                result_waypoints_data = []
-                for i, port_obj in enumerate(path_objects_pydantic):
-                    waypoint_segment_info = {
-                        "port_id": port_obj.id,
-                        "port_name": port_obj.name,
-                        "latitude": port_obj.latitude,
-                        "longitude": port_obj.longitude,
-                        "segment_distance_nm": 0.0,  # Дистанция до этого порта
-                        "segment_travel_hours": 0.0,  # Время в пути до этого порта
-                        "total_distance_from_start_nm": 0.0,  # Общая дистанция от начала
-                        "total_travel_hours_from_start": 0.0,  # Общее время от начала
-                    }
-
-                    if i > 0:
-                        prev_port = path_objects_pydantic[i - 1]
-                        segments_from_prev = await asyncio.to_thread(
-                            get_segments_for_port, prev_port.id
-                        )
-                        segment_to_current = next(
-                            (
-                                SegmentDataForAStar(**s)
-                                for s in segments_from_prev
-                                if s["PortOfArrival_id"] == port_obj.id
-                            ),
-                            None,
-                        )
+        if path_indices and total_distance is not None:
+            path_objects_pydantic = [graph.port_data(idx) for idx in path_indices]
+            result_path_ids = [p.id for p in path_objects_pydantic]
 
-                        if segment_to_current:
-                            segment_distance = segment_to_current.distance
-                            travel_hours = segment_distance / vessel_speed_knots
-
-                            waypoint_segment_info["segment_distance_nm"] = round(
-                                segment_distance, 2
-                            )
-                            waypoint_segment_info["segment_travel_hours"] = round(
-                                travel_hours, 2
-                            )
-
-                            # Накапливаем общие значения
-                            waypoint_segment_info["total_distance_from_start_nm"] = (
-                                round(
-                                    result_waypoints_data[i - 1][
-                                        "total_distance_from_start_nm"
-                                    ]
-                                    + segment_distance,
-                                    2,
-                                )
-                            )
-                            waypoint_segment_info["total_travel_hours_from_start"] = (
-                                round(
-                                    result_waypoints_data[i - 1][
-                                        "total_travel_hours_from_start"
-                                    ]
-                                    + travel_hours,
-                                    2,
-                                )
-                            )
-                        else:
-                            logger.warning(
-                                f"Task {task_id}: Не найден сегмент от порта {prev_port.name} (ID: {prev_port.id}) к порту {port_obj.name} (ID: {port_obj.id}) для расчета сегментных данных."
-                            )
-                            # Если сегмент не найден, сбрасываем значения, чтобы не было NaN
-                            waypoint_segment_info["segment_distance_nm"] = 0.0
-                            waypoint_segment_info["segment_travel_hours"] = 0.0
-                            waypoint_segment_info["total_distance_from_start_nm"] = (
-                                result_waypoints_data[i - 1][
-                                    "total_distance_from_start_nm"
-                                ]
-                            )
-                            waypoint_segment_info["total_travel_hours_from_start"] = (
-                                result_waypoints_data[i - 1][
-                                    "total_travel_hours_from_start"
-                                ]
-                            )
-
-                    result_waypoints_data.append(waypoint_segment_info)
+            result_waypoints_data = _build_waypoints_data(
+                graph, cached_route, vessel_speed_knots
+            )
 
             # 5. Обновляем БД
             logger.info(
@@ -226,31 +482,35 @@ async def process_message_from_kafka(payload: Dict[str, Any]):
                     f"Task {task_id}: Сегментные данные и время рассчитаны. {len(result_waypoints_data)} вейпоинтов."
                 )
 
-            await asyncio.to_thread(
-                update_calculation_task,
+            TASKS_PROCESSED.labels(COMPLETED_STATUS).inc()
+            written = await result_writer.write(
                 task_id,
                 COMPLETED_STATUS,
-                result_path_ids,
-                total_distance,
-                result_waypoints_data,  # Передаем новые данные
-                vessel_speed_knots,
+                result_path=result_path_ids,
+                result_distance=total_distance,
+                result_waypoints_data=result_waypoints_data,  # Передаем новые данные
+                vessel_speed_knots=vessel_speed_knots,
+                result_alternatives=result_alternatives,
+                result_legs=result_legs,
+                search_stats=search_stats.to_dict(),
             )
         else:
-            error_msg = f"Маршрут не найден между портами {start_port_pydantic.name} (ID: {start_port_id}) и {end_port_pydantic.name} (ID: {end_port_id})."
+            error_msg = f"Маршрут не найден между портами {graph.names[start_idx]} (ID: {start_port_id}) и {graph.names[end_idx]} (ID: {end_port_id})."
             logger.warning(f"Task {task_id}: {error_msg}")
-            await asyncio.to_thread(
-                update_calculation_task,
+            record_task_failure("route_not_found")
+            written = await result_writer.write(
                 task_id,
                 FAILED_STATUS,
                 error_message=error_msg,
                 vessel_speed_knots=vessel_speed_knots,
+                search_stats=search_stats.to_dict(),
             )
 
     except Exception as e:
         error_msg = f"Неожиданная ошибка при обработке задачи: {str(e)[:500]}"
         logger.exception(f"Task {task_id}: {error_msg}")
-        await asyncio.to_thread(
-            update_calculation_task,
+        record_task_failure("unexpected_error")
+        written = await result_writer.write(
             task_id,
             FAILED_STATUS,
             error_message=error_msg,
@@ -258,29 +518,579 @@ async def process_message_from_kafka(payload: Dict[str, Any]):
         )
 
     logger.info(f"Consumer: Завершение обработки задачи {task_id}")
+    return written
+
+
+def _failed_task_update(
+    task_id: Any,
+    error_msg: str,
+    vessel_speed_knots: Any,
+    search_stats: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    return {
+        "task_id": task_id,
+        "status": FAILED_STATUS,
+        "error_message": error_msg,
+        "vessel_speed_knots": vessel_speed_knots,
+        "search_stats": search_stats,
+    }
+
+
+async def _mark_tasks_failed(payload: Dict[str, Any]) -> bool:
+    """
+    Последняя попытка для сообщения, результат которого не удалось записать
+    (например, поле, которое отвергает БД): задачи получают только статус
+    FAILED и текст ошибки, без остальных полей. True — задачи помечены и
+    сообщение можно фиксировать; False — не прошла и эта запись (скорее
+    всего, БД недоступна), сообщение нужно прочитать заново.
+    """
+    targets = payload.get("targets")
+    task_ids = [
+        task_id
+        for task_id in (
+            [target.get("task_id") for target in targets if isinstance(target, dict)]
+            if isinstance(targets, list)
+            else [payload.get("task_id")]
+        )
+        if is_valid_task_id(task_id)
+    ]
+    written = await result_writer.write_many(
+        [
+            {
+                "task_id": task_id,
+                "status": FAILED_STATUS,
+                "error_message": "Не удалось записать результат расчета.",
+            }
+            for task_id in task_ids
+        ]
+    )
+    if written:
+        logger.error(
+            f"Tasks {task_ids}: результат не записан после повторов, задачи помечены как {FAILED_STATUS}."
+        )
+        record_task_failure("result_not_written", len(task_ids))
+    return written
+
+
+def _oracle_routes(
+    oracle: DistanceOracle,
+    graph: GraphSnapshot,
+    start_idx: int,
+    end_indices: List[int],
+) -> Optional[List[Tuple[Optional[List[int]], Optional[float]]]]:
+    """Маршруты до всех целей из оракула; None, если хотя бы один нужно искать."""
+    results = []
+    for end_idx in end_indices:
+        result = oracle.route(graph, start_idx, end_idx)
+        if result is None:
+            return None
+        results.append(result)
+    return results
+
+
+async def process_one_to_many_message(payload: Dict[str, Any]) -> bool:
+    """
+    Обрабатывает сообщение "один-ко-многим":
+    {"start_port_id": ..., "targets": [{"task_id": ..., "end_port_id": ...}, ...],
+     "vessel_speed_knots": ..., "cost_profile": ...}.
+    Маршруты до всех целей берутся из оракула всех пар, если он построен для
+    текущего графа, иначе считаются одним деревом Дейкстры от start_port_id:
+    движок поиска (SEARCH_ENGINE) здесь намеренно не используется — одно
+    дерево дешевле отдельного поиска до каждой цели. Результаты всех задач
+    ставятся в буфер записи одной пачкой. Цель может переопределить скорость
+    судна своим полем vessel_speed_knots (так консьюмер объединяет отдельные
+    задачи из одного порта); повторяющиеся порты назначения ищутся один раз. Возвращает True, только если записаны результаты всех
+    задач (см. process_message_from_kafka).
+    """
+    start_port_id = payload.get("start_port_id")
+    targets = payload.get("targets")
+    vessel_speed_knots = payload.get("vessel_speed_knots")
+    cost_profile = payload.get("cost_profile") or COST_PROFILE
+
+    valid_targets = [
+        target
+        for target in (targets if isinstance(targets, list) else [])
+        if isinstance(target, dict)
+        and is_valid_task_id(target.get("task_id"))
+        and isinstance(target.get("end_port_id"), int)
+    ]
+    logger.info(
+        f"Consumer: Начало обработки {len(valid_targets)} задач от порта {start_port_id}"
+        f" (Скорость судна: {vessel_speed_knots or 'не указана'})"
+    )
+    if not isinstance(start_port_id, int) or not valid_targets:
+        logger.error(
+            f"Consumer: Некорректные или неполные данные в сообщении один-ко-многим: {payload}"
+        )
+        record_task_failure("invalid_message")
+        return True
+    if len(valid_targets) != len(targets):
+        logger.warning(
+            f"Consumer: {len(targets) - len(valid_targets)} некорректных целей пропущено в сообщении: {payload}"
+        )
+
+    task_ids = [target["task_id"] for target in valid_targets]
+    updates: List[Dict[str, Any]] = []
+    # Причина ошибки для каждой неуспешной задачи из updates (для метрик)
+    failure_reasons: List[str] = []
+    try:
+        graph = await _get_current_graph()
+        if graph is None:
+            error_msg = "Не удалось загрузить граф портов и сегментов для алгоритма A*."
+            logger.error(f"Tasks {task_ids}: {error_msg}")
+            failure_reasons = ["graph_unavailable"] * len(valid_targets)
+            updates = [
+                _failed_task_update(
+                    target["task_id"],
+                    error_msg,
+                    target.get("vessel_speed_knots", vessel_speed_knots),
+                )
+                for target in valid_targets
+            ]
+        else:
+            if cost_profile not in COST_PROFILES:
+                logger.warning(
+                    f"Tasks {task_ids}: Неизвестный профиль стоимости '{cost_profile}', используется '{DISTANCE_PROFILE}'."
+                )
+                cost_profile = DISTANCE_PROFILE
+            graph = graph.with_cost_profile(cost_profile, vessel_speed_knots)
+            start_idx = graph.index_of(start_port_id)
+            searchable_targets = []
+            for target in valid_targets:
+                end_idx = graph.index_of(target["end_port_id"])
+                if start_idx is None or end_idx is None:
+                    error_msg = f"Стартовый ({start_port_id}) или конечный ({target['end_port_id']}) порт отсутствует в графе портов."
+                    logger.error(f"Task {target['task_id']}: {error_msg}")
+                    failure_reasons.append("unknown_port")
+                    updates.append(
+                        _failed_task_update(
+                            target["task_id"],
+                            error_msg,
+                            target.get("vessel_speed_knots", vessel_speed_knots),
+                        )
+                    )
+                else:
+                    searchable_targets.append((target, end_idx))
+
+            # Цели, маршрут до которых уже в кеше, не участвуют в поиске.
+            cached_routes = [
+                route_cache.get(
+                    start_port_id,
+                    target["end_port_id"],
+                    graph.base_fingerprint,
+                    graph.cost_profile,
+                )
+                for target, _ in searchable_targets
+            ]
+            if shared_route_cache is not None:
+                # Недостающие маршруты ищутся в общем кеше реплик одним запросом
+                missing_positions = [
+                    position
+                    for position, cached_route in enumerate(cached_routes)
+                    if cached_route is None
+                ]
+                shared_routes = await shared_route_cache.get_many(
+                    start_port_id,
+                    [
+                        searchable_targets[position][0]["end_port_id"]
+                        for position in missing_positions
+                    ],
+                    graph.fingerprint,
+                    graph.cost_profile,
+                )
+                for position, cached_route in zip(missing_positions, shared_routes):
+                    if cached_route is not None:
+                        target = searchable_targets[position][0]
+                        route_cache.put(
+                            start_port_id,
+                            target["end_port_id"],
+                            graph.base_fingerprint,
+                            cached_route,
+                            graph.cost_profile,
+                        )
+                        cached_routes[position] = cached_route
+            # Порты назначения без маршрута в кеше, каждый по одному разу
+            missing_end_indices = list(
+                dict.fromkeys(
+                    end_idx
+                    for (_, end_idx), cached_route in zip(
+                        searchable_targets, cached_routes
+                    )
+                    if cached_route is None
+                )
+            )
+            # Статистика для каждой цели: из кеша или общая для одного поиска
+            cache_stats = SearchStats("route_cache").to_dict()
+            targets_stats = [
+                cache_stats if cached_route is not None else None
+                for cached_route in cached_routes
+            ]
+            if missing_end_indices:
+                search_stats = SearchStats()
+                results = None
+                oracle = (
+                    get_distance_oracle(graph)
+                    if graph.cost_profile == DISTANCE_PROFILE
+                    else None
+                )
+                if oracle is not None:
+                    started_at = time.perf_counter()
+                    results = await asyncio.to_thread(
+                        _oracle_routes, oracle, graph, start_idx, missing_end_indices
+                    )
+                if results is not None:
+                    elapsed = time.perf_counter() - started_at
+                    search_stats.engine = "oracle"
+                    search_stats.elapsed_ms = elapsed * 1000
+                    record_search(search_stats, elapsed)
+                else:
+                    results = await run_search(
+                        one_to_many_search,
+                        graph,
+                        start_idx,
+                        missing_end_indices,
+                        stats=search_stats,
+                    )
+                logger.info(
+                    f"Tasks {task_ids}: Поиск {search_stats.engine} раскрыл "
+                    f"{search_stats.nodes_expanded} узлов для {len(missing_end_indices)} портов назначения "
+                    f"({sum(route is not None for route in cached_routes)} задач взято из кеша)."
+                )
+                found_routes: Dict[int, CachedRoute] = {}
+                for end_idx, (path_indices, total_distance) in zip(
+                    missing_end_indices, results
+                ):
+                    cached_route = _cached_route_for(
+                        graph, path_indices, total_distance
+                    )
+                    route_cache.put(
+                        start_port_id,
+                        int(graph.port_ids[end_idx]),
+                        graph.base_fingerprint,
+                        cached_route,
+                        graph.cost_profile,
+                    )
+                    found_routes[end_idx] = cached_route
+                if shared_route_cache is not None:
+                    await shared_route_cache.put_many(
+                        start_port_id,
+                        [
+                            (int(graph.port_ids[end_idx]), cached_route)
+                            for end_idx, cached_route in found_routes.items()
+                        ],
+                        graph.fingerprint,
+                        graph.cost_profile,
+                    )
+                cached_routes = [
+                    found_routes[end_idx] if cached_route is None else cached_route
+                    for (_, end_idx), cached_route in zip(
+                        searchable_targets, cached_routes
+                    )
+                ]
+                search_stats_data = search_stats.to_dict()
+                targets_stats = [
+                    target_stats or search_stats_data for target_stats in targets_stats
+                ]
+
+            for (target, end_idx), cached_route, target_stats in zip(
+                searchable_targets, cached_routes, targets_stats
+            ):
+                path_indices = cached_route.path_indices
+                total_distance = cached_route.total_distance
+                task_id = target["task_id"]
+                target_speed_knots = target.get(
+                    "vessel_speed_knots", vessel_speed_knots
+                )
+                if path_indices and total_distance is not None:
+                    path_objects_pydantic = [
+                        graph.port_data(idx) for idx in path_indices
+                    ]
+                    updates.append(
+                        {
+                            "task_id": task_id,
+                            "status": COMPLETED_STATUS,
+                            "result_path": [p.id for p in path_objects_pydantic],
+                            "result_distance": total_distance,
+                            "result_waypoints_data": _build_waypoints_data(
+                                graph, cached_route, target_speed_knots
+                            ),
+                            "vessel_speed_knots": target_speed_knots,
+                            "search_stats": target_stats,
+                        }
+                    )
+                    logger.info(
+                        f"Task {task_id}: Маршрут найден. Дистанция: {total_distance:.2f} nm."
+                    )
+                else:
+                    error_msg = f"Маршрут не найден между портами {graph.names[start_idx]} (ID: {start_port_id}) и {graph.names[end_idx]} (ID: {target['end_port_id']})."
+                    logger.warning(f"Task {task_id}: {error_msg}")
+                    failure_reasons.append("route_not_found")
+                    updates.append(
+                        _failed_task_update(
+                            task_id, error_msg, target_speed_knots, target_stats
+                        )
+                    )
+
+    except Exception as e:
+        error_msg = f"Неожиданная ошибка при обработке задачи: {str(e)[:500]}"
+        logger.exception(f"Tasks {task_ids}: {error_msg}")
+        failure_reasons = ["unexpected_error"] * len(valid_targets)
+        updates = [
+            _failed_task_update(
+                target["task_id"],
+                error_msg,
+                target.get("vessel_speed_knots", vessel_speed_knots),
+            )
+            for target in valid_targets
+        ]
+
+    for reason in failure_reasons:
+        record_task_failure(reason)
+    TASKS_PROCESSED.labels(COMPLETED_STATUS).inc(len(updates) - len(failure_reasons))
+    written = await result_writer.write_many(updates)
+    logger.info(f"Consumer: Завершение обработки задач {task_ids}")
+    return written
+
+
+def _decode_message_value(value: Optional[bytes]) -> Optional[Dict[str, Any]]:
+    """Разбирает JSON сообщения; None для некорректного сообщения (оно пропускается)."""
+    try:
+        payload = json.loads(value.decode("utf-8"))
+    except (AttributeError, UnicodeDecodeError, json.JSONDecodeError) as e:
+        logger.error(f"Ошибка декодирования JSON из Kafka: {e}. Сообщение: {value!r}")
+        return None
+    if not isinstance(payload, dict):
+        logger.error(f"Сообщение Kafka не является JSON-объектом: {payload!r}")
+        return None
+    return payload
+
+
+class _KafkaWorkWindow:
+    """
+    Окно сообщений в обработке для одного экземпляра консьюмера: не больше
+    KAFKA_MAX_IN_FLIGHT задач одновременно, офсеты фиксируются вручную и
+    только для сообщений, результат которых уже записан в БД. Сообщение,
+    результат которого записать не удалось, обрабатывается повторно
+    (KAFKA_WRITE_RETRIES раз); объединенные задачи затем обрабатываются по
+    отдельности. Задачи, результат которых так и не записан, помечаются
+    FAILED минимальной записью (_mark_tasks_failed), и сообщение фиксируется:
+    иначе оно навсегда остановило бы свой раздел. Незафиксированным
+    сообщение остается, только если не прошла и минимальная запись (БД
+    недоступна) — после перезапуска или перебалансировки оно будет прочитано
+    заново.
+    """
+
+    def __init__(self, consumer: AIOKafkaConsumer, max_in_flight: int):
+        self.consumer = consumer
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.tracker = OffsetTracker()
+        # Ссылки на задачи, чтобы сборщик мусора не удалил их до завершения
+        self.tasks: Set[asyncio.Task] = set()
+        self._commit_lock = asyncio.Lock()
+
+    def start(self, messages: List[Any], payload: Optional[Dict[str, Any]]) -> None:
+        """
+        Берет в обработку payload, собранный из messages (слоты окна под
+        каждое сообщение уже заняты). payload None — сообщение некорректно
+        и только фиксируется.
+        """
+        for msg in messages:
+            self.tracker.started(TopicPartition(msg.topic, msg.partition), msg.offset)
+        task = asyncio.create_task(self.process(messages, payload))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def commit_processed(self) -> None:
+        async with self._commit_lock:
+            offsets = self.tracker.committable()
+            if not offsets:
+                return
+            try:
+                await self.consumer.commit(offsets)
+            except KafkaError as e:
+                # Незакоммиченные сообщения будут прочитаны заново (at-least-once).
+                logger.warning(f"Не удалось закоммитить офсеты {offsets}: {e}")
+                return
+            self.tracker.mark_committed(offsets)
+
+    async def process(
+        self, messages: List[Any], payload: Optional[Dict[str, Any]]
+    ) -> None:
+        TASKS_IN_FLIGHT.inc(len(messages))
+        # Время от записи сообщения в Kafka до начала его обработки
+        started_at = time.time()
+        for msg in messages:
+            if msg.timestamp > 0:
+                QUEUE_DELAY_SECONDS.observe(max(started_at - msg.timestamp / 1000, 0.0))
+        positions = [(msg.partition, msg.offset) for msg in messages]
+        written = [False] * len(messages)
+        try:
+            if payload is None:
+                record_task_failure("invalid_message")
+                written = [True] * len(messages)
+            elif await self._process_with_retries(payload, positions):
+                written = [True] * len(messages)
+            elif len(messages) == 1:
+                written = [await _mark_tasks_failed(payload)]
+            else:
+                # Объединенные задачи по одной: результат, который нельзя
+                # записать, не должен помечать FAILED остальные задачи группы.
+                for position, msg in enumerate(messages):
+                    member = _decode_message_value(msg.value)
+                    written[position] = await process_message_from_kafka(
+                        member
+                    ) or await _mark_tasks_failed(member)
+        except Exception as e:
+            logger.exception(f"Ошибка при обработке сообщений Kafka {positions}: {e}")
+        finally:
+            TASKS_IN_FLIGHT.dec(len(messages))
+            for msg, msg_written in zip(messages, written):
+                self.slots.release()
+                if msg_written:
+                    self.tracker.done(
+                        TopicPartition(msg.topic, msg.partition), msg.offset
+                    )
+        if not all(written):
+            unwritten = [pos for pos, ok in zip(positions, written) if not ok]
+            logger.error(
+                f"Результат сообщений Kafka {unwritten} не записан в БД: офсеты "
+                f"не фиксируются, сообщения будут прочитаны заново."
+            )
+        if any(written):
+            await self.commit_processed()
+
+    @staticmethod
+    async def _process_with_retries(
+        payload: Dict[str, Any], positions: List[Tuple[int, int]]
+    ) -> bool:
+        for attempt in range(KAFKA_WRITE_RETRIES + 1):
+            if attempt:
+                delay = KAFKA_WRITE_RETRY_DELAY_MS / 1000 * 2 ** (attempt - 1)
+                logger.warning(
+                    f"Результат сообщений Kafka {positions} не записан, "
+                    f"повтор {attempt}/{KAFKA_WRITE_RETRIES} через {delay:.1f} с."
+                )
+                await asyncio.sleep(delay)
+            if await process_message_from_kafka(payload):
+                return True
+        return False
+
+
+def _group_key(payload: Dict[str, Any]) -> Optional[Tuple[Any, ...]]:
+    """
+    Ключ объединения обычной задачи "порт-порт" с другими задачами из того же
+    порта (None — задача обрабатывается отдельно: рейс с промежуточными
+    портами, альтернативные маршруты, уже один-ко-многим или неполные данные).
+    Для профиля "time" веса рёбер зависят от скорости судна, поэтому она
+    входит в ключ. Движок поиска в ключ не входит: объединенные задачи
+    считаются одним деревом Дейкстры (см. process_one_to_many_message).
+    """
+    if (
+        payload.get("targets") is not None
+        or payload.get("via_port_ids")
+        or (
+            isinstance(payload.get("alternatives"), int) and payload["alternatives"] > 1
+        )
+        or not is_valid_task_id(payload.get("task_id"))
+        or not isinstance(payload.get("start_port_id"), int)
+        or not isinstance(payload.get("end_port_id"), int)
+    ):
+        return None
+    cost_profile = payload.get("cost_profile") or COST_PROFILE
+    speed_key = (
+        payload.get("vessel_speed_knots") if cost_profile != DISTANCE_PROFILE else None
+    )
+    return payload["start_port_id"], cost_profile, speed_key
+
+
+def _group_messages(
+    messages: List[Any],
+) -> List[Tuple[List[Any], Optional[Dict[str, Any]]]]:
+    """
+    Разбирает пачку сообщений на единицы обработки. Задачи из одного порта
+    отправления объединяются в одно сообщение "один-ко-многим": маршруты до
+    всех портов назначения считаются одним деревом поиска, одинаковые пары
+    (start, end) ищутся один раз, а каждая задача получает свою строку
+    результата.
+    """
+    units: List[Tuple[List[Any], Optional[Dict[str, Any]]]] = []
+    groups: Dict[Tuple[Any, ...], List[Tuple[Any, Dict[str, Any]]]] = {}
+    for msg in messages:
+        payload = _decode_message_value(msg.value)
+        group_key = _group_key(payload) if payload is not None else None
+        if group_key is None:
+            units.append(([msg], payload))
+        else:
+            groups.setdefault(group_key, []).append((msg, payload))
+
+    for (start_port_id, cost_profile, _), members in groups.items():
+        if len(members) == 1:
+            units.append(([members[0][0]], members[0][1]))
+            continue
+        units.append(
+            (
+                [msg for msg, _ in members],
+                {
+                    "start_port_id": start_port_id,
+                    "targets": [
+                        {
+                            "task_id": payload["task_id"],
+                            "end_port_id": payload["end_port_id"],
+                            "vessel_speed_knots": payload.get("vessel_speed_knots"),
+                        }
+                        for _, payload in members
+                    ],
+                    "vessel_speed_knots": members[0][1].get("vessel_speed_knots"),
+                    "cost_profile": cost_profile,
+                },
+            )
+        )
+    return units
+
+
+class _CommitOnRevoke(ConsumerRebalanceListener):
+    """При отзыве разделов фиксирует обработанные офсеты и забывает разделы."""
+
+    def __init__(self, window: _KafkaWorkWindow):
+        self.window = window
+
+    async def on_partitions_revoked(self, revoked):
+        await self.window.commit_processed()
+        self.window.tracker.forget(set(revoked))
+
+    async def on_partitions_assigned(self, assigned):
+        pass
 
 
 async def start_kafka_consumer_loop():
     """
     Основной цикл для запуска и перезапуска Kafka consumer.
+    Сообщения читаются пачками (getmany), задачи из одного порта отправления
+    объединяются в один поиск (см. _group_messages). Одновременно
+    обрабатывается не больше KAFKA_MAX_IN_FLIGHT сообщений: когда окно
+    заполнено, чтение разделов приостанавливается до завершения одной из задач. Автокоммит выключен: офсет фиксируется после записи
+    результата задачи, поэтому при падении процесса работа не теряется.
     """
     loop = asyncio.get_event_loop()
     consumer = None
     logger.info(
-        f"Консьюмер Kafka готовится к запуску для топика '{KAFKA_REQUEST_TOPIC}'..."
+        f"Консьюмер Kafka готовится к запуску для топика '{KAFKA_REQUEST_TOPIC}' "
+        f"(не больше {KAFKA_MAX_IN_FLIGHT} сообщений в обработке)..."
     )
 
     while True:
         try:
             if consumer is None:
                 consumer = AIOKafkaConsumer(
-                    KAFKA_REQUEST_TOPIC,
                     loop=loop,
                     bootstrap_servers=KAFKA_BROKER_URL,
                     group_id=KAFKA_CONSUMER_GROUP_ID,
-                    value_deserializer=lambda v: json.loads(v.decode("utf-8")),
                     auto_offset_reset="earliest",
-                    enable_auto_commit=True,
+                    enable_auto_commit=False,
+                )
+                window = _KafkaWorkWindow(consumer, KAFKA_MAX_IN_FLIGHT)
+                consumer.subscribe(
+                    [KAFKA_REQUEST_TOPIC], listener=_CommitOnRevoke(window)
                 )
 
             logger.info(
@@ -289,21 +1099,51 @@ async def start_kafka_consumer_loop():
             await consumer.start()
             logger.info("Консьюмер Kafka успешно подключен и слушает сообщения.")
 
-            async for msg in consumer:
-                logger.debug(
-                    f"Консьюмером получено сообщение: {msg.topic} p:{msg.partition} o:{msg.offset} key:{msg.key}"
-                )
+            while True:
+                if window.slots.locked():
+                    # Окно заполнено: не читаем новые сообщения, пока задачи не освободят место
+                    paused = consumer.assignment()
+                    consumer.pause(*paused)
+                    logger.debug(
+                        f"Окно обработки заполнено ({KAFKA_MAX_IN_FLIGHT}), чтение разделов приостановлено."
+                    )
+                    await window.slots.acquire()
+                    consumer.resume(*(paused & consumer.assignment()))
+                else:
+                    await window.slots.acquire()
+                # Пачка не больше числа свободных слотов окна
+                reserved = 1
+                while reserved < KAFKA_BATCH_SIZE and not window.slots.locked():
+                    await window.slots.acquire()
+                    reserved += 1
                 try:
-                    asyncio.create_task(process_message_from_kafka(msg.value))
-                except Exception as task_creation_error:
-                    logger.exception(
-                        f"Ошибка при создании задачи для обработки сообщения Kafka: {task_creation_error}"
+                    records = await consumer.getmany(
+                        timeout_ms=KAFKA_BATCH_TIMEOUT_MS, max_records=reserved
                     )
+                except BaseException:
+                    for _ in range(reserved):
+                        window.slots.release()
+                    raise
+                messages = [msg for batch in records.values() for msg in batch]
+                for tp, batch in records.items():
+                    highwater = consumer.highwater(tp)
+                    if highwater is not None:
+                        CONSUMER_LAG.labels(tp.topic, str(tp.partition)).set(
+                            highwater - batch[-1].offset - 1
+                        )
+                for _ in range(reserved - len(messages)):
+                    window.slots.release()
+                if not messages:
+                    continue
+
+                units = _group_messages(messages)
+                logger.debug(
+                    f"Консьюмером получено {len(messages)} сообщений, "
+                    f"объединено в {len(units)} задач обработки."
+                )
+                for unit_messages, payload in units:
+                    window.start(unit_messages, payload)
 
-        except json.JSONDecodeError as e:
-            logger.error(
-                f"Ошибка декодирования JSON из Kafka: {e}. Сообщение: {getattr(msg, 'value', 'N/A')}"
-            )
         except Exception as e:
             logger.exception(
                 f"Критическая ошибка в цикле Kafka Consumer: {e}. Перезапуск через 10 секунд..."
@@ -0,0 +1,197 @@
+# RoutesCalculatorService/landmarks.py
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+from dijkstra import single_source_dijkstra
+from graph import GraphSnapshot
+
+logger = logging.getLogger("calculator_landmarks")
+
+# Файл с предрасчитанными дистанциями до/от ориентиров.
+LANDMARKS_CACHE_PATH = os.getenv(
+    "LANDMARKS_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "cache", "landmarks.npz"),
+)
+# Количество портов-ориентиров (K) для эвристики ALT.
+ALT_LANDMARK_COUNT = int(os.getenv("ALT_LANDMARK_COUNT", "8"))
+
+LANDMARKS_FORMAT_VERSION = 2
+
+
+class Landmarks:
+    """
+    Ориентиры для эвристики ALT (A*, Landmarks, Triangle inequality).
+
+    from_landmark[k, v] — кратчайшая дистанция от k-го ориентира до порта v,
+    to_landmark[k, v] — от порта v до k-го ориентира (inf, если недостижимо).
+    requested_count — сколько ориентиров запрашивалось: выбрано может быть
+    меньше (мало портов или все порты уже покрыты), поэтому файл сверяется
+    с ALT_LANDMARK_COUNT по нему, а не по числу выбранных.
+    """
+
+    __slots__ = (
+        "fingerprint",
+        "requested_count",
+        "landmark_indices",
+        "from_landmark",
+        "to_landmark",
+    )
+
+    def __init__(
+        self,
+        fingerprint: str,
+        requested_count: int,
+        landmark_indices: np.ndarray,
+        from_landmark: np.ndarray,
+        to_landmark: np.ndarray,
+    ):
+        self.fingerprint = fingerprint
+        self.requested_count = requested_count
+        self.landmark_indices = landmark_indices
+        self.from_landmark = from_landmark
+        self.to_landmark = to_landmark
+
+    def lower_bounds_to(self, target_idx: int) -> np.ndarray:
+        """
+        Нижние оценки дистанции от каждого порта до target_idx по неравенству
+        треугольника: max по ориентирам L из d(L, t) - d(L, v) и d(v, L) - d(t, L).
+        Для портов, из которых target_idx заведомо недостижим, оценка равна inf.
+        """
+        with np.errstate(invalid="ignore"):
+            forward = self.from_landmark[:, target_idx, None] - self.from_landmark
+            backward = self.to_landmark - self.to_landmark[:, target_idx, None]
+            # inf - inf дает nan: такой ориентир ничего не знает о паре, fmax его пропускает.
+            bounds = np.fmax(
+                np.fmax.reduce(forward, axis=0), np.fmax.reduce(backward, axis=0)
+            )
+        return np.nan_to_num(bounds, nan=0.0, posinf=np.inf, neginf=0.0)
+
+    def save(self, path: str) -> None:
+        """Сохраняет ориентиры в .npz (атомарно, через временный файл)."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                format_version=np.array(LANDMARKS_FORMAT_VERSION),
+                fingerprint=np.array(self.fingerprint),
+                requested_count=np.array(self.requested_count),
+                landmark_indices=self.landmark_indices,
+                from_landmark=self.from_landmark,
+                to_landmark=self.to_landmark,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["Landmarks"]:
+        """Загружает ориентиры из файла или возвращает None, если формат не подходит."""
+        with np.load(path) as data:
+            if int(data["format_version"]) != LANDMARKS_FORMAT_VERSION:
+                return None
+            return cls(
+                fingerprint=str(data["fingerprint"]),
+                requested_count=int(data["requested_count"]),
+                landmark_indices=data["landmark_indices"],
+                from_landmark=data["from_landmark"],
+                to_landmark=data["to_landmark"],
+            )
+
+
+def select_landmarks(graph: GraphSnapshot, count: int) -> Landmarks:
+    """
+    Выбирает ориентиры методом "самого дальнего": следующий ориентир —
+    порт, наиболее удаленный (по графу) от уже выбранных. Порты, недостижимые
+    ни из одного ориентира, выбираются в первую очередь, чтобы покрыть все
+    компоненты связности. Для каждого ориентира считаются прямые и обратные
+    дистанции полным Дейкстрой.
+    """
+    num_ports = graph.num_ports
+    requested_count = count
+    count = max(0, min(count, num_ports))
+    landmark_indices: List[int] = []
+    from_rows: List[List[float]] = []
+    to_rows: List[List[float]] = []
+
+    if count:
+        # Первый ориентир — самый удаленный от произвольного стартового порта.
+        seed_distances, _ = single_source_dijkstra(graph, 0)
+        closest_landmark_distance = np.array(seed_distances)
+        closest_landmark_distance[0] = 0.0
+        while len(landmark_indices) < count:
+            candidate = int(np.argmax(closest_landmark_distance))
+            if closest_landmark_distance[candidate] <= 0.0:
+                break
+            from_distances, _ = single_source_dijkstra(graph, candidate)
+            to_distances, _ = single_source_dijkstra(graph, candidate, reverse=True)
+            landmark_indices.append(candidate)
+            from_rows.append(from_distances)
+            to_rows.append(to_distances)
+            closest_landmark_distance = np.minimum(
+                closest_landmark_distance, from_distances
+            )
+            closest_landmark_distance[candidate] = 0.0
+
+    return Landmarks(
+        fingerprint=graph.fingerprint,
+        requested_count=requested_count,
+        landmark_indices=np.array(landmark_indices, dtype=np.int32),
+        from_landmark=np.array(from_rows, dtype=np.float64).reshape(-1, num_ports),
+        to_landmark=np.array(to_rows, dtype=np.float64).reshape(-1, num_ports),
+    )
+
+
+# Ориентиры строятся (или читаются с диска) один раз для каждого снимка графа;
+# хранятся для последних снимков по отпечатку (см. get_contraction_hierarchy).
+_LANDMARKS_CACHE_SIZE = 2
+_landmarks: "OrderedDict[str, Landmarks]" = OrderedDict()
+_landmarks_lock = threading.Lock()
+
+
+def get_landmarks(graph: GraphSnapshot) -> Landmarks:
+    """
+    Возвращает ориентиры для снимка графа: из файла LANDMARKS_CACHE_PATH,
+    если он построен для того же отпечатка графа, иначе предрасчитывает
+    их заново и сохраняет на диск.
+    """
+    landmarks = _landmarks.get(graph.fingerprint)
+    if landmarks is not None:
+        return landmarks
+    with _landmarks_lock:
+        landmarks = _landmarks.get(graph.fingerprint)
+        if landmarks is not None:
+            return landmarks
+
+        if os.path.exists(LANDMARKS_CACHE_PATH):
+            try:
+                landmarks = Landmarks.load(LANDMARKS_CACHE_PATH)
+            except Exception as e:
+                logger.warning(
+                    f"Не удалось прочитать ориентиры из {LANDMARKS_CACHE_PATH}: {e}"
+                )
+            if landmarks is not None and (
+                landmarks.fingerprint != graph.fingerprint
+                or landmarks.requested_count != ALT_LANDMARK_COUNT
+            ):
+                landmarks = None
+
+        if landmarks is None:
+            logger.info(
+                f"Выбор {ALT_LANDMARK_COUNT} ориентиров ALT и предрасчет дистанций..."
+            )
+            landmarks = select_landmarks(graph, ALT_LANDMARK_COUNT)
+            logger.info(f"Ориентиры выбраны: {len(landmarks.landmark_indices)} портов.")
+            try:
+                landmarks.save(LANDMARKS_CACHE_PATH)
+            except OSError as e:
+                logger.warning(
+                    f"Не удалось сохранить ориентиры в {LANDMARKS_CACHE_PATH}: {e}"
+                )
+
+        _landmarks[graph.fingerprint] = landmarks
+        while len(_landmarks) > _LANDMARKS_CACHE_SIZE:
+            _landmarks.popitem(last=False)
+        return landmarks
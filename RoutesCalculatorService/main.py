@@ -2,9 +2,20 @@ import asyncio
 import logging
 from contextlib import asynccontextmanager
 
+from async_db import close_pool
+from contraction_hierarchies import get_contraction_hierarchy
 from db_interface import check_db_connection
-from fastapi import FastAPI
-from kafka_consumer import start_kafka_consumer_loop
+from fastapi import FastAPI, Response
+from graph import GraphSnapshot, get_graph_snapshot_async, get_graph_version
+from graph_reloader import graph_reloader
+from kafka_consumer import SEARCH_ENGINE, start_kafka_consumer_loop
+from landmarks import get_landmarks
+from metrics import stats_collector
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from result_writer import result_writer
+from route_cache import route_cache
+from search_pool import search_pool
+from shared_route_cache import shared_route_cache
 
 logging.basicConfig(
     level=logging.INFO,
@@ -13,6 +24,50 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Счетчики компонентов (те же, что в /health) отдаются в /metrics.
+stats_collector.add(
+    "graph_reloader",
+    graph_reloader.stats,
+    ("notifications", "reloads", "failed_reloads"),
+)
+stats_collector.add("route_cache", route_cache.stats, ("hits", "misses", "evictions"))
+if shared_route_cache is not None:
+    stats_collector.add(
+        "shared_route_cache",
+        shared_route_cache.stats,
+        ("hits", "misses", "coalesced", "remote_waits", "lock_timeouts", "errors"),
+    )
+stats_collector.add(
+    "result_writer",
+    result_writer.stats,
+    ("batches", "rows", "failed_batches", "failed_rows"),
+)
+if search_pool is not None:
+    stats_collector.add(
+        "search_pool",
+        search_pool.stats,
+        ("restarts", "tasks_completed", "tasks_failed"),
+    )
+
+
+async def _prepare_graph(graph: GraphSnapshot) -> None:
+    """
+    Готовит производные структуры снимка до приема задач на нем: при старте
+    и перед подменой снимка при перезагрузке графа.
+    """
+    if SEARCH_ENGINE == "ch":
+        # Иерархия читается с диска или строится до приема первых задач.
+        await asyncio.to_thread(get_contraction_hierarchy, graph)
+        logger.info("Contraction Hierarchies готовы.")
+    elif SEARCH_ENGINE == "alt":
+        # Ориентиры ALT читаются с диска или предрасчитываются заранее.
+        await asyncio.to_thread(get_landmarks, graph)
+        logger.info("Ориентиры ALT готовы.")
+    if search_pool is not None:
+        # Процессы пула запускаются и подключаются к графу в общей памяти заранее.
+        worker_pids = await search_pool.warm_up(graph)
+        logger.info(f"Пул поиска готов: {len(worker_pids)} процессов {worker_pids}.")
+
 
 @asynccontextmanager
 async def lifespan(app_instance: FastAPI):
@@ -46,6 +101,21 @@ async def lifespan(app_instance: FastAPI):
         )
         raise RuntimeError("Lifespan: Database tables not ready on startup")
 
+    logger.info("Lifespan: Загрузка снимка графа портов в память...")
+    graph = await get_graph_snapshot_async()
+    if graph is None:
+        logger.warning(
+            "Lifespan: Не удалось загрузить граф портов, повторная попытка будет при обработке первой задачи."
+        )
+    else:
+        logger.info(
+            f"Lifespan: Граф загружен: {graph.num_ports} портов, {graph.num_segments} сегментов."
+        )
+        await _prepare_graph(graph)
+
+    # Изменения портов и сегментов подхватываются без перезапуска сервиса.
+    graph_reloader.start(prepare=_prepare_graph)
+
     logger.info("Lifespan: Запуск Kafka consumer в фоновой задаче...")
     kafka_consumer_task = asyncio.create_task(start_kafka_consumer_loop())
     logger.info("Lifespan: Фоновая задача Kafka consumer успешно создана.")
@@ -72,6 +142,17 @@ async def lifespan(app_instance: FastAPI):
                 )
         elif kafka_consumer_task and kafka_consumer_task.done():
             logger.info("Lifespan: Задача Kafka consumer уже была завершена.")
+        await graph_reloader.close()
+        # Результаты, еще не записанные в БД, записываются до остановки.
+        await result_writer.close()
+        logger.info(f"Lifespan: Буфер результатов записан: {result_writer.stats()}")
+        await close_pool()
+        if shared_route_cache is not None:
+            await shared_route_cache.close()
+        logger.info("Lifespan: Пул соединений asyncpg закрыт.")
+        if search_pool is not None:
+            await asyncio.to_thread(search_pool.shutdown)
+            logger.info("Lifespan: Пул поиска остановлен.")
 
 
 app = FastAPI(
@@ -93,4 +174,20 @@ async def root():
 @app.get("/health", summary="Проверка здоровья сервиса")
 async def health_check():
     logger.info("Проверка здоровья сервиса /health")
-    return {"status": "healthy", "service": "RouteCalculatorService"}
+    return {
+        "status": "healthy",
+        "service": "RouteCalculatorService",
+        "graph_version": get_graph_version(),
+        "graph_reloader": graph_reloader.stats(),
+        "route_cache": route_cache.stats(),
+        "shared_route_cache": (
+            shared_route_cache.stats() if shared_route_cache is not None else None
+        ),
+        "result_writer": result_writer.stats(),
+        "search_pool": search_pool.stats() if search_pool is not None else None,
+    }
+
+
+@app.get("/metrics", summary="Метрики Prometheus")
+async def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,123 @@
+# RoutesCalculatorService/metrics.py
+from typing import Any, Callable, Dict, Iterable, Iterator, Tuple
+
+from prometheus_client import REGISTRY, Counter, Gauge, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+
+# Границы корзин гистограмм (секунды): от долей миллисекунды (поиск по
+# кешу, вейпоинты) до минуты (ожидание сообщения в очереди Kafka).
+_STAGE_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+STAGE_SECONDS = Histogram(
+    "calculator_stage_seconds",
+    "Длительность этапов обработки задачи расчета маршрута.",
+    ["stage"],
+    buckets=_STAGE_BUCKETS,
+)
+# Этапы с заранее выбранными метками: в горячем пути нет поиска по меткам.
+QUEUE_DELAY_SECONDS = STAGE_SECONDS.labels("queue_delay")
+GRAPH_FETCH_SECONDS = STAGE_SECONDS.labels("graph_fetch")
+SEARCH_SECONDS = STAGE_SECONDS.labels("search")
+WAYPOINTS_SECONDS = STAGE_SECONDS.labels("waypoints")
+DB_WRITE_SECONDS = STAGE_SECONDS.labels("db_write")
+
+SEARCH_NODES_EXPANDED = Counter(
+    "calculator_search_nodes_expanded",
+    "Раскрыто узлов поиском.",
+    ["engine"],
+)
+SEARCH_HEAP_PUSHES = Counter(
+    "calculator_search_heap_pushes",
+    "Записей положено в кучу поиска.",
+    ["engine"],
+)
+TASKS_PROCESSED = Counter(
+    "calculator_tasks",
+    "Обработано задач расчета по итоговому статусу.",
+    ["status"],
+)
+TASK_FAILURES = Counter(
+    "calculator_task_failures",
+    "Задачи, завершившиеся ошибкой, по причине.",
+    ["reason"],
+)
+TASKS_IN_FLIGHT = Gauge(
+    "calculator_tasks_in_flight",
+    "Сообщений Kafka в обработке.",
+)
+CONSUMER_LAG = Gauge(
+    "calculator_consumer_lag",
+    "Отставание консьюмера: сообщений раздела, еще не прочитанных.",
+    ["topic", "partition"],
+)
+
+
+def record_search(stats: Any, elapsed_seconds: float) -> None:
+    """Время поиска и его счетчики (SearchStats) — одним вызовом после поиска."""
+    SEARCH_SECONDS.observe(elapsed_seconds)
+    if stats is not None:
+        engine = stats.engine or "unknown"
+        SEARCH_NODES_EXPANDED.labels(engine).inc(stats.nodes_expanded)
+        SEARCH_HEAP_PUSHES.labels(engine).inc(stats.heap_pushes)
+
+
+def record_task_failure(reason: str, count: int = 1) -> None:
+    TASK_FAILURES.labels(reason).inc(count)
+    TASKS_PROCESSED.labels("FAILED").inc(count)
+
+
+class StatsCollector(Collector):
+    """
+    Отдает счетчики компонентов (route_cache.stats() и т. п.) как метрики в
+    момент запроса /metrics: в горячем пути компоненты по-прежнему только
+    увеличивают свои поля, без обращений к клиенту Prometheus.
+    """
+
+    def __init__(self):
+        self._sources: Dict[
+            str, Tuple[Callable[[], Dict[str, Any]], Tuple[str, ...]]
+        ] = {}
+
+    def add(
+        self,
+        name: str,
+        stats: Callable[[], Dict[str, Any]],
+        counters: Iterable[str] = (),
+    ) -> None:
+        """stats() — словарь счетчиков; ключи counters монотонны, остальные — gauge."""
+        self._sources[name] = (stats, tuple(counters))
+
+    def collect(self) -> Iterator[Any]:
+        for name, (stats, counters) in self._sources.items():
+            for key, value in stats().items():
+                if not isinstance(value, (int, float)):
+                    continue
+                metric_name = f"calculator_{name}_{key}"
+                if key in counters:
+                    metric = CounterMetricFamily(metric_name, f"{name}: {key}")
+                else:
+                    metric = GaugeMetricFamily(metric_name, f"{name}: {key}")
+                metric.add_metric([], value)
+                yield metric
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
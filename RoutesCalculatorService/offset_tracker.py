@@ -0,0 +1,62 @@
+# RoutesCalculatorService/offset_tracker.py
+import heapq
+from typing import Dict, Hashable, List, Optional, Set
+
+
+class OffsetTracker:
+    """
+    Отслеживает сообщения Kafka, взятые в обработку, по разделам.
+
+    Задачи завершаются в произвольном порядке, а фиксировать в Kafka можно
+    только непрерывный префикс: офсет раздела, который безопасно
+    закоммитить, — наименьший еще не обработанный офсет (либо следующий
+    за последним обработанным, если незавершенных нет). Так после падения
+    процесса необработанные сообщения будут прочитаны заново.
+    """
+
+    def __init__(self):
+        # Незавершенные офсеты раздела (min-куча) и завершенные вне очереди.
+        self._pending: Dict[Hashable, List[int]] = {}
+        self._done_out_of_order: Dict[Hashable, Set[int]] = {}
+        # Следующий офсет после последнего взятого в обработку.
+        self._next_offset: Dict[Hashable, int] = {}
+        # Последний закоммиченный офсет раздела.
+        self._committed: Dict[Hashable, int] = {}
+
+    def started(self, partition: Hashable, offset: int) -> None:
+        heapq.heappush(self._pending.setdefault(partition, []), offset)
+        self._next_offset[partition] = max(
+            self._next_offset.get(partition, 0), offset + 1
+        )
+
+    def done(self, partition: Hashable, offset: int) -> None:
+        pending = self._pending.get(partition)
+        if pending is None:
+            return  # Раздел отозван, пока сообщение обрабатывалось
+        done = self._done_out_of_order.setdefault(partition, set())
+        done.add(offset)
+        # Снимаем с вершины кучи все завершенные офсеты
+        while pending and pending[0] in done:
+            done.discard(heapq.heappop(pending))
+
+    def committable(self) -> Dict[Hashable, int]:
+        """Офсеты разделов, продвинувшиеся с прошлого коммита."""
+        offsets: Dict[Hashable, int] = {}
+        for partition, pending in self._pending.items():
+            offset = pending[0] if pending else self._next_offset[partition]
+            if offset > self._committed.get(partition, -1):
+                offsets[partition] = offset
+        return offsets
+
+    def mark_committed(self, offsets: Dict[Hashable, int]) -> None:
+        for partition, offset in offsets.items():
+            if offset > self._committed.get(partition, -1):
+                self._committed[partition] = offset
+
+    def forget(self, partitions: Optional[Set[Hashable]] = None) -> None:
+        """Забывает отозванные разделы (все разделы, если partitions не задан)."""
+        for partition in list(self._pending if partitions is None else partitions):
+            self._pending.pop(partition, None)
+            self._done_out_of_order.pop(partition, None)
+            self._next_offset.pop(partition, None)
+            self._committed.pop(partition, None)
@@ -0,0 +1,170 @@
+# RoutesCalculatorService/result_writer.py
+import asyncio
+import logging
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from async_db import update_calculation_tasks
+from metrics import DB_WRITE_SECONDS
+
+logger = logging.getLogger("calculator_result_writer")
+
+# Сколько результатов задач записывается одним UPDATE и как долго (мс)
+# результат может ждать в буфере, прежде чем пачка будет записана.
+RESULT_BATCH_SIZE = int(os.getenv("RESULT_BATCH_SIZE", "200"))
+RESULT_FLUSH_INTERVAL_MS = int(os.getenv("RESULT_FLUSH_INTERVAL_MS", "50"))
+
+
+def is_valid_task_id(task_id: Any) -> bool:
+    """True, если task_id — UUID (tasks_calculationtask.task_id)."""
+    if isinstance(task_id, uuid.UUID):
+        return True
+    try:
+        uuid.UUID(str(task_id))
+    except ValueError:
+        return False
+    return True
+
+
+class ResultWriter:
+    """
+    Буфер отложенной записи результатов задач в tasks_calculationtask.
+    Результаты копятся до RESULT_BATCH_SIZE штук или RESULT_FLUSH_INTERVAL_MS
+    миллисекунд и записываются одним UPDATE в одной транзакции через пул
+    asyncpg (async_db.update_calculation_tasks). write() возвращается после записи пачки,
+    поэтому офсет сообщения Kafka по-прежнему фиксируется только для
+    записанных результатов. Если пачка не записалась, ее строки пишутся по
+    одной, чтобы одна плохая строка не лишала записи остальные.
+    """
+
+    def __init__(self, max_batch_size: int, flush_interval_ms: int):
+        self.max_batch_size = max(max_batch_size, 1)
+        self.flush_interval = flush_interval_ms / 1000
+        self.batches = 0
+        self.rows = 0
+        self.failed_batches = 0
+        self.failed_rows = 0
+        self.last_batch_size = 0
+        self.last_flush_seconds = 0.0
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._closing = False
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._wakeup = asyncio.Event()
+            self._flusher = asyncio.create_task(self._run())
+
+    async def write_many(self, updates: List[Dict[str, Any]]) -> bool:
+        """
+        Ставит обновления задач (именованные аргументы update_calculation_task)
+        в буфер и ждет их записи. True, если все они записаны. Обновление с
+        task_id, который не является UUID, в буфер не попадает (его не
+        примет ни одна пачка) и сразу считается незаписанным.
+        """
+        if not updates:
+            return True
+        self._ensure_flusher()
+        loop = asyncio.get_running_loop()
+        futures = []
+        for update in updates:
+            future = loop.create_future()
+            if not is_valid_task_id(update.get("task_id")):
+                logger.error(f"Результат задачи с некорректным task_id: {update}")
+                self.failed_rows += 1
+                future.set_result(False)
+                futures.append(future)
+                continue
+            self._pending.append((update, future))
+            futures.append(future)
+        if len(self._pending) >= self.max_batch_size:
+            self._wakeup.set()
+        return all(await asyncio.gather(*futures))
+
+    async def write(self, task_id: Any, status: str, **fields: Any) -> bool:
+        """Обновление одной задачи; аргументы — как у update_calculation_task."""
+        return await self.write_many([dict(task_id=task_id, status=status, **fields)])
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                await self._flush_batch()
+            if self._closing:
+                return
+
+    @staticmethod
+    async def _write(updates: List[Dict[str, Any]]) -> bool:
+        try:
+            return await update_calculation_tasks(updates)
+        except Exception as e:
+            logger.exception(f"Ошибка записи пачки из {len(updates)} результатов: {e}")
+            return False
+
+    async def _flush_batch(self) -> None:
+        batch = self._pending[: self.max_batch_size]
+        del self._pending[: self.max_batch_size]
+        started_at = time.monotonic()
+        written = await self._write([update for update, _ in batch])
+        if written or len(batch) == 1:
+            results = [written] * len(batch)
+        else:
+            # Пачка отвергнута целиком (например, из-за одной строки):
+            # строки пишутся по одной, незаписанной остается только плохая.
+            results = [await self._write([update]) for update, _ in batch]
+        self.last_flush_seconds = time.monotonic() - started_at
+        DB_WRITE_SECONDS.observe(self.last_flush_seconds)
+        self.last_batch_size = len(batch)
+        self.batches += 1
+        written_rows = sum(results)
+        self.rows += written_rows
+        self.failed_rows += len(batch) - written_rows
+        if not written:
+            self.failed_batches += 1
+        outcome = (
+            "записана"
+            if written
+            else f"НЕ записана одним UPDATE, по одной записано {written_rows}"
+        )
+        logger.info(
+            f"Пачка из {len(batch)} результатов {outcome} "
+            f"за {self.last_flush_seconds * 1000:.1f} мс (в буфере: {len(self._pending)})."
+        )
+        for (_, future), row_written in zip(batch, results):
+            if not future.done():
+                future.set_result(row_written)
+
+    async def close(self) -> None:
+        """Записывает все, что осталось в буфере, и останавливает фоновую запись."""
+        if self._flusher is not None and not self._flusher.done():
+            self._closing = True
+            self._wakeup.set()
+            try:
+                await self._flusher
+            finally:
+                self._closing = False
+        self._flusher = None
+        while self._pending:
+            await self._flush_batch()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "failed_batches": self.failed_batches,
+            "failed_rows": self.failed_rows,
+            "last_batch_size": self.last_batch_size,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 1),
+            "pending": len(self._pending),
+        }
+
+
+# Буфер записи результатов на процесс калькулятора.
+result_writer = ResultWriter(RESULT_BATCH_SIZE, RESULT_FLUSH_INTERVAL_MS)
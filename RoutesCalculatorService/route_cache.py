@@ -0,0 +1,112 @@
+# RoutesCalculatorService/route_cache.py
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Максимальное число маршрутов в кеше результатов.
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "4096"))
+
+
+class CachedRoute:
+    """
+    Закешированный результат поиска для пары портов.
+    path_indices — индексы портов в снимке графа (None, если маршрута нет),
+    edge_indices — индексы пройденных рёбер в прямых массивах снимка графа
+    (по ним вейпоинты считаются без запросов к БД).
+    """
+
+    __slots__ = ("path_indices", "total_distance", "edge_indices")
+
+    def __init__(
+        self,
+        path_indices: Optional[List[int]],
+        total_distance: Optional[float],
+        edge_indices: Optional[np.ndarray] = None,
+    ):
+        self.path_indices = path_indices
+        self.total_distance = total_distance
+        self.edge_indices = edge_indices
+
+
+class RouteCache:
+    """
+    LRU-кеш результатов поиска с ключом (start_port_id, end_port_id,
+    профиль стоимости, отпечаток базового графа). Записи для другого отпечатка графа удаляются целиком
+    при первой записи для нового снимка, поэтому после перезагрузки графа
+    устаревшие маршруты не отдаются и не занимают память.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._graph_fingerprint: Optional[str] = None
+        self._entries: "OrderedDict[Tuple[int, int, str], CachedRoute]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        start_port_id: int,
+        end_port_id: int,
+        graph_fingerprint: str,
+        cost_profile: str = "distance",
+    ) -> Optional[CachedRoute]:
+        key = (start_port_id, end_port_id, cost_profile)
+        with self._lock:
+            route = (
+                self._entries.get(key)
+                if graph_fingerprint == self._graph_fingerprint
+                else None
+            )
+            if route is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return route
+
+    def put(
+        self,
+        start_port_id: int,
+        end_port_id: int,
+        graph_fingerprint: str,
+        route: CachedRoute,
+        cost_profile: str = "distance",
+    ) -> None:
+        if self.max_size <= 0:
+            return
+        key = (start_port_id, end_port_id, cost_profile)
+        with self._lock:
+            if graph_fingerprint != self._graph_fingerprint:
+                # Граф изменился: все прежние маршруты устарели.
+                self._entries.clear()
+                self._graph_fingerprint = graph_fingerprint
+            self._entries[key] = route
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._graph_fingerprint = None
+
+    def stats(self) -> Dict[str, int]:
+        """Счетчики кеша (для логов и /health)."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Общий кеш маршрутов процесса калькулятора.
+route_cache = RouteCache(ROUTE_CACHE_SIZE)
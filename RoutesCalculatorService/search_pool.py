@@ -0,0 +1,290 @@
+# RoutesCalculatorService/search_pool.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from graph import GraphSnapshot
+from graph_snapshot_file import ArrayLayout, array_layout
+from metrics import record_search
+from search_stats import SearchStats
+
+logger = logging.getLogger("calculator_search_pool")
+
+# Число процессов пула поиска; 0 — поиск в потоках (asyncio.to_thread),
+# как раньше. Каждый процесс занимает отдельное ядро и не делит GIL.
+SEARCH_WORKERS = int(os.getenv("SEARCH_WORKERS", "0"))
+# Сколько задач выполняет процесс до плановой замены новым (0 — без ограничения).
+SEARCH_WORKER_MAX_TASKS = int(os.getenv("SEARCH_WORKER_MAX_TASKS", "0"))
+# Сколько опубликованных снимков держать: задачи, уже отправленные в пул
+# для предыдущего снимка, должны успеть к нему подключиться.
+_PUBLISHED_GRAPHS_LIMIT = 2
+
+
+class SharedGraphHandle:
+    """
+    Легкое описание опубликованного снимка: по нему процесс пула подключается
+    к блоку общей памяти. Передается с каждой задачей, поэтому не содержит
+    самих массивов.
+    """
+
+    __slots__ = ("shm_name", "fingerprint", "layout")
+
+    def __init__(self, shm_name: str, fingerprint: str, layout: ArrayLayout):
+        self.shm_name = shm_name
+        self.fingerprint = fingerprint
+        self.layout = layout
+
+
+def _publish_graph(
+    graph: GraphSnapshot,
+) -> Tuple[shared_memory.SharedMemory, SharedGraphHandle]:
+    """
+    Копирует массивы базового снимка (GraphSnapshot.to_arrays) в один блок
+    общей памяти. Для снимка профиля публикуются исходные дистанции:
+    процессы пула сами применяют профиль к базовому снимку.
+    """
+    arrays = graph.to_arrays()
+    layout, size = array_layout(arrays)
+    shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for (name, dtype, shape, array_offset), array in zip(layout, arrays.values()):
+        np.ndarray(shape, dtype, shm.buf, array_offset)[...] = array
+    return shm, SharedGraphHandle(shm.name, graph.base_fingerprint, layout)
+
+
+# --- Сторона процесса пула ---------------------------------------------------
+
+# Подключенный блок общей памяти и собранный поверх него снимок графа.
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+_worker_graph: Optional[GraphSnapshot] = None
+
+
+def _init_search_worker() -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+
+
+def _attach_graph(handle: SharedGraphHandle) -> GraphSnapshot:
+    """
+    Снимок графа поверх опубликованного блока общей памяти (без копирования
+    массивов). Подключение выполняется один раз на снимок; предыдущий блок
+    отключается, когда приходит задача для нового.
+    """
+    global _worker_shm, _worker_graph
+    if (
+        _worker_graph is not None
+        and _worker_graph.base_fingerprint == handle.fingerprint
+    ):
+        return _worker_graph
+
+    # Блоком владеет основной процесс (он же его удаляет); процессы spawn
+    # разделяют его трекер ресурсов, поэтому повторная регистрация безвредна.
+    shm = shared_memory.SharedMemory(name=handle.shm_name)
+    arrays = {
+        name: np.ndarray(shape, dtype, shm.buf, offset)
+        for name, dtype, shape, offset in handle.layout
+    }
+    for array in arrays.values():
+        array.setflags(write=False)
+
+    previous_shm = _worker_shm
+    _worker_graph = GraphSnapshot.from_arrays(arrays, handle.fingerprint)
+    _worker_shm = shm
+    if previous_shm is not None:
+        try:
+            previous_shm.close()
+        except BufferError:
+            # На старые массивы еще ссылаются кеши; блок закроется вместе с ними.
+            pass
+    return _worker_graph
+
+
+def _run_in_worker(
+    handle: SharedGraphHandle,
+    cost_profile: str,
+    func: Callable[..., Any],
+    args: Tuple[Any, ...],
+) -> Tuple[Any, SearchStats]:
+    """Выполняет func(graph, *args, stats) в процессе пула."""
+    graph = _attach_graph(handle)
+    # Снимок профиля ("time@12") собирается локально из базового снимка
+    profile, _, speed = cost_profile.partition("@")
+    graph = graph.with_cost_profile(profile, float(speed) if speed else None)
+    stats = SearchStats()
+    return func(graph, *args, stats), stats
+
+
+def _ping_worker(handle: SharedGraphHandle) -> int:
+    """Подключает процесс пула к снимку заранее и сообщает его pid."""
+    _attach_graph(handle)
+    return os.getpid()
+
+
+# --- Сторона основного процесса ----------------------------------------------
+
+
+class SearchPool:
+    """
+    Пул процессов для CPU-емкого поиска. Массивы графа публикуются в общую
+    память один раз на снимок, процессы подключаются к ним без копирования.
+    Если процесс пула аварийно завершился, пул пересоздается, а задача
+    повторяется один раз.
+    """
+
+    def __init__(self, workers: int, max_tasks_per_worker: int = 0):
+        self.workers = workers
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.restarts = 0
+        self.tasks_completed = 0
+        self.tasks_failed = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Опубликованные снимки: base_fingerprint -> (блок, описание)
+        self._published: Dict[
+            str, Tuple[shared_memory.SharedMemory, SharedGraphHandle]
+        ] = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: процессы не наследуют потоки и состояние event loop
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_search_worker,
+                    max_tasks_per_child=self.max_tasks_per_worker or None,
+                )
+            return self._executor
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is not broken:
+                return  # Пул уже пересоздан другой задачей
+            self._executor = None
+            self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        logger.warning(
+            f"Процесс пула поиска аварийно завершился, пул пересоздается (перезапусков: {self.restarts})."
+        )
+
+    def handle_for(self, graph: GraphSnapshot) -> SharedGraphHandle:
+        """Описание снимка в общей памяти; снимок публикуется при первом обращении."""
+        with self._lock:
+            published = self._published.get(graph.base_fingerprint)
+            if published is not None:
+                return published[1]
+            shm, handle = _publish_graph(graph)
+            self._published[graph.base_fingerprint] = (shm, handle)
+            while len(self._published) > _PUBLISHED_GRAPHS_LIMIT:
+                oldest = next(iter(self._published))
+                old_shm, _ = self._published.pop(oldest)
+                old_shm.close()
+                old_shm.unlink()
+        logger.info(
+            f"Снимок графа опубликован в общей памяти ({shm.size} байт): {shm.name}"
+        )
+        return handle
+
+    async def run(
+        self,
+        func: Callable[..., Any],
+        graph: GraphSnapshot,
+        args: Tuple[Any, ...],
+        stats: Optional[SearchStats],
+    ) -> Any:
+        handle = await asyncio.to_thread(self.handle_for, graph)
+        loop = asyncio.get_running_loop()
+        for attempt in (1, 2):
+            executor = self._get_executor()
+            try:
+                result, worker_stats = await loop.run_in_executor(
+                    executor, _run_in_worker, handle, graph.cost_profile, func, args
+                )
+            except BrokenProcessPool:
+                self._restart(executor)
+                if attempt == 2:
+                    self.tasks_failed += 1
+                    raise
+                continue
+            except Exception:
+                self.tasks_failed += 1
+                raise
+            self.tasks_completed += 1
+            if stats is not None:
+                for name in SearchStats.__slots__:
+                    setattr(stats, name, getattr(worker_stats, name))
+            return result
+
+    async def warm_up(self, graph: GraphSnapshot) -> List[int]:
+        """Запускает процессы пула и подключает их к снимку до приема задач."""
+        handle = await asyncio.to_thread(self.handle_for, graph)
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        pids = await asyncio.gather(
+            *(
+                loop.run_in_executor(executor, _ping_worker, handle)
+                for _ in range(self.workers)
+            )
+        )
+        return sorted(set(pids))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "running": self._executor is not None,
+            "restarts": self.restarts,
+            "tasks_completed": self.tasks_completed,
+            "tasks_failed": self.tasks_failed,
+            "published_graphs": len(self._published),
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+            published = list(self._published.values())
+            self._published.clear()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        for shm, _ in published:
+            shm.close()
+            shm.unlink()
+
+
+# Пул на процесс калькулятора (None — поиск выполняется в потоках).
+search_pool: Optional[SearchPool] = (
+    SearchPool(SEARCH_WORKERS, SEARCH_WORKER_MAX_TASKS) if SEARCH_WORKERS > 0 else None
+)
+
+
+async def run_search(
+    func: Callable[..., Any],
+    graph: GraphSnapshot,
+    *args: Any,
+    stats: Optional[SearchStats] = None,
+) -> Any:
+    """
+    Выполняет func(graph, *args, stats) — движок поиска или другой расчет с
+    контрактом (граф, ..., статистика) — в пуле процессов, если он включен
+    (SEARCH_WORKERS > 0), иначе в потоке. func должна быть функцией уровня
+    модуля, чтобы ее можно было передать в процесс пула.
+    """
+    started_at = time.perf_counter()
+    if search_pool is None:
+        result = await asyncio.to_thread(func, graph, *args, stats)
+    else:
+        result = await search_pool.run(func, graph, args, stats)
+    elapsed = time.perf_counter() - started_at
+    if stats is not None:
+        stats.elapsed_ms = elapsed * 1000
+    record_search(stats, elapsed)
+    return result
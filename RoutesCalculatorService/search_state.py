@@ -0,0 +1,54 @@
+# RoutesCalculatorService/search_state.py
+import math
+import threading
+from typing import List
+
+from graph import GraphSnapshot
+
+
+class SearchState:
+    """
+    Переиспользуемые массивы состояния поиска размером с граф.
+
+    Вместо заполнения g_score значениями inf на каждый запрос используется
+    счетчик поколений: значение g_score[v] / came_from[v] действительно,
+    только если stamps[v] равен текущему поколению, а порт в открытом
+    множестве, только если open_stamps[v] равен ему же. Новый запрос лишь
+    увеличивает поколение, поэтому платит только за реально затронутые порты.
+    """
+
+    __slots__ = ("size", "generation", "stamps", "open_stamps", "g_score", "came_from")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.generation = 0
+        self.stamps: List[int] = [0] * size
+        self.open_stamps: List[int] = [0] * size
+        self.g_score: List[float] = [math.inf] * size
+        self.came_from: List[int] = [-1] * size
+
+    def next_generation(self) -> int:
+        """Начинает новый запрос: все ранее затронутые порты становятся "чистыми"."""
+        self.generation += 1
+        return self.generation
+
+
+# Состояния поиска отдельные для каждого потока (asyncio.to_thread выполняет
+# задачи в пуле потоков): по одному на каждое "направление" поиска.
+_thread_states = threading.local()
+
+
+def get_search_state(graph: GraphSnapshot, slot: int = 0) -> SearchState:
+    """
+    Возвращает состояние поиска текущего потока для снимка графа.
+    slot разделяет независимые состояния одного запроса (например, прямой
+    и обратный поиск двунаправленного A*). При смене размера графа
+    массивы выделяются заново.
+    """
+    states = getattr(_thread_states, "states", None)
+    if states is None:
+        states = _thread_states.states = {}
+    state = states.get(slot)
+    if state is None or state.size != graph.num_ports:
+        state = states[slot] = SearchState(graph.num_ports)
+    return state
@@ -0,0 +1,67 @@
+# RoutesCalculatorService/search_stats.py
+from typing import Any, Dict, Optional
+
+
+class SearchStats:
+    """
+    Статистика одного поиска: какой движок/эвристика, сколько узлов раскрыто,
+    сколько рёбер просмотрено, сколько записей положено в кучу (приоритетную
+    очередь) и сколько из нее снято устаревшими, наибольший размер кучи и
+    время поиска. Сохраняется вместе с результатом задачи (search_stats).
+    """
+
+    __slots__ = (
+        "engine",
+        "heuristic",
+        "nodes_expanded",
+        "edges_relaxed",
+        "heap_pushes",
+        "stale_pops",
+        "max_open_set",
+        "elapsed_ms",
+    )
+
+    def __init__(self, engine: Optional[str] = None):
+        self.engine: Optional[str] = engine
+        self.heuristic: Optional[str] = None
+        self.nodes_expanded = 0
+        self.edges_relaxed = 0
+        self.heap_pushes = 0
+        self.stale_pops = 0
+        self.max_open_set = 0
+        self.elapsed_ms = 0.0
+
+    def set_counters(
+        self,
+        nodes_expanded: int,
+        edges_relaxed: int,
+        heap_pushes: int,
+        stale_pops: int,
+        max_open_set: int,
+    ) -> None:
+        """Записывает счетчики, которые движок вел в локальных переменных."""
+        self.nodes_expanded = nodes_expanded
+        self.edges_relaxed = edges_relaxed
+        self.heap_pushes = heap_pushes
+        self.stale_pops = stale_pops
+        self.max_open_set = max_open_set
+
+    def add(self, other: "SearchStats") -> None:
+        """Добавляет счетчики вложенного поиска (Йен, матрица плеч рейса)."""
+        self.nodes_expanded += other.nodes_expanded
+        self.edges_relaxed += other.edges_relaxed
+        self.heap_pushes += other.heap_pushes
+        self.stale_pops += other.stale_pops
+        self.max_open_set = max(self.max_open_set, other.max_open_set)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "engine": self.engine,
+            "heuristic": self.heuristic,
+            "nodes_expanded": int(self.nodes_expanded),
+            "edges_relaxed": int(self.edges_relaxed),
+            "heap_pushes": int(self.heap_pushes),
+            "stale_pops": int(self.stale_pops),
+            "max_open_set": int(self.max_open_set),
+            "elapsed_ms": round(self.elapsed_ms, 3),
+        }
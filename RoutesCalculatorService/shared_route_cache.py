@@ -0,0 +1,372 @@
+# RoutesCalculatorService/shared_route_cache.py
+import asyncio
+import logging
+import math
+import os
+import struct
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from route_cache import CachedRoute
+
+logger = logging.getLogger("calculator_shared_route_cache")
+
+# Общий для всех реплик калькулятора кеш маршрутов (второй уровень после
+# route_cache). "redis://..." — Redis, "local" — словарь в памяти процесса
+# (для тестов и запуска без Redis), пустая строка (по умолчанию) — кеш выключен.
+ROUTE_SHARED_CACHE_URL = os.getenv("ROUTE_SHARED_CACHE_URL", "")
+# Время жизни найденного маршрута и ответа "маршрута нет" (секунды).
+ROUTE_SHARED_CACHE_TTL_SECONDS = int(
+    os.getenv("ROUTE_SHARED_CACHE_TTL_SECONDS", "86400")
+)
+ROUTE_SHARED_CACHE_MISS_TTL_SECONDS = int(
+    os.getenv("ROUTE_SHARED_CACHE_MISS_TTL_SECONDS", "300")
+)
+# Блокировка расчета ключа: пока одна реплика считает маршрут, остальные
+# ждут его появления в кеше не дольше ROUTE_SHARED_CACHE_LOCK_WAIT_MS,
+# затем считают сами.
+ROUTE_SHARED_CACHE_LOCK_TTL_MS = int(
+    os.getenv("ROUTE_SHARED_CACHE_LOCK_TTL_MS", "30000")
+)
+ROUTE_SHARED_CACHE_LOCK_WAIT_MS = int(
+    os.getenv("ROUTE_SHARED_CACHE_LOCK_WAIT_MS", "5000")
+)
+_LOCK_POLL_SECONDS = 0.05
+
+# Формат значения: версия формата, дистанция в милях (NaN — маршрута нет),
+# число портов N; затем N индексов портов и N - 1 индексов рёбер (int32).
+_ROUTE_FORMAT_VERSION = 1
+_ROUTE_HEADER = struct.Struct("<BdI")
+_INDEX_DTYPE = np.dtype("<i4")
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def encode_route(route: CachedRoute) -> bytes:
+    """Компактное двоичное представление маршрута (индексы снимка графа)."""
+    if route.path_indices is None:
+        return _ROUTE_HEADER.pack(_ROUTE_FORMAT_VERSION, math.nan, 0)
+    path = np.asarray(route.path_indices, dtype=_INDEX_DTYPE)
+    edges = np.asarray(route.edge_indices, dtype=_INDEX_DTYPE)
+    return (
+        _ROUTE_HEADER.pack(_ROUTE_FORMAT_VERSION, route.total_distance, len(path))
+        + path.tobytes()
+        + edges.tobytes()
+    )
+
+
+def decode_route(data: bytes) -> Optional[CachedRoute]:
+    """Маршрут из encode_route; None для значения другого формата."""
+    if len(data) < _ROUTE_HEADER.size:
+        return None
+    version, total_distance, num_ports = _ROUTE_HEADER.unpack_from(data)
+    if version != _ROUTE_FORMAT_VERSION:
+        return None
+    if num_ports == 0:
+        return CachedRoute(None, None)
+    path_offset = _ROUTE_HEADER.size
+    edges_offset = path_offset + num_ports * _INDEX_DTYPE.itemsize
+    path = np.frombuffer(data, _INDEX_DTYPE, num_ports, path_offset)
+    edges = np.frombuffer(data, _INDEX_DTYPE, num_ports - 1, edges_offset)
+    return CachedRoute(path.tolist(), total_distance, edges.astype(np.int64))
+
+
+class LocalRouteCacheBackend:
+    """
+    Хранилище в памяти процесса с тем же интерфейсом, что у Redis-хранилища:
+    для тестов и запуска без Redis.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[float, bytes]] = {}
+        self._locks: Dict[str, Tuple[float, str]] = {}
+
+    def _alive(self, entries: Dict[str, Tuple[float, Any]], key: str) -> Any:
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del entries[key]
+            return None
+        return value
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return [self._alive(self._values, key) for key in keys]
+
+    async def set_many(self, items: List[Tuple[str, bytes, int]]) -> None:
+        now = time.monotonic()
+        for key, value, ttl_seconds in items:
+            self._values[key] = (now + ttl_seconds, value)
+
+    async def acquire_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        if self._alive(self._locks, key) is not None:
+            return False
+        self._locks[key] = (time.monotonic() + ttl_ms / 1000, token)
+        return True
+
+    async def release_lock(self, key: str, token: str) -> None:
+        if self._alive(self._locks, key) == token:
+            del self._locks[key]
+
+    async def close(self) -> None:
+        self._values.clear()
+        self._locks.clear()
+
+
+class RedisRouteCacheBackend:
+    """Хранилище в Redis, общее для всех реплик калькулятора."""
+
+    def __init__(self, url: str):
+        self._redis = aioredis.Redis.from_url(url)
+        self._release_lock = self._redis.register_script(_RELEASE_LOCK_SCRIPT)
+
+    async def get_many(self, keys: List[str]) -> List[Optional[bytes]]:
+        return await self._redis.mget(keys)
+
+    async def set_many(self, items: List[Tuple[str, bytes, int]]) -> None:
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key, value, ttl_seconds in items:
+                pipe.set(key, value, ex=ttl_seconds)
+            await pipe.execute()
+
+    async def acquire_lock(self, key: str, token: str, ttl_ms: int) -> bool:
+        return bool(await self._redis.set(key, token, nx=True, px=ttl_ms))
+
+    async def release_lock(self, key: str, token: str) -> None:
+        await self._release_lock(keys=[key], args=[token])
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+
+class SharedRouteCache:
+    """
+    Кеш маршрутов, общий для реплик калькулятора. Ключ — пара портов,
+    профиль стоимости и отпечаток снимка, на котором считался маршрут
+    (представления профиля): реплики, загрузившие один и тот же граф,
+    получают одинаковые индексы портов и рёбер, а после изменения графа
+    (в том числе ограничений скорости) старые ключи просто перестают
+    запрашиваться и истекают по TTL.
+
+    Одновременные запросы одного ключа объединяются: внутри процесса —
+    общим future, между репликами — блокировкой в хранилище (SET NX PX).
+    Ошибки хранилища не прерывают задачу: маршрут считается как без кеша.
+    """
+
+    def __init__(
+        self,
+        backend: Any,
+        ttl_seconds: int,
+        miss_ttl_seconds: int,
+        lock_ttl_ms: int,
+        lock_wait_ms: int,
+    ):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.miss_ttl_seconds = miss_ttl_seconds
+        self.lock_ttl_ms = lock_ttl_ms
+        self.lock_wait = lock_wait_ms / 1000
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.remote_waits = 0
+        self.lock_timeouts = 0
+        self.errors = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _key(
+        start_port_id: int, end_port_id: int, graph_fingerprint: str, cost_profile: str
+    ) -> str:
+        # graph_fingerprint — отпечаток представления графа, на котором считался
+        # маршрут (с учетом профиля стоимости и ограничений скорости), поэтому
+        # после правки графа старые маршруты по ключу больше не находятся.
+        return f"route:{graph_fingerprint[:32]}:{cost_profile}:{start_port_id}:{end_port_id}"
+
+    def _ttl_for(self, route: CachedRoute) -> int:
+        return (
+            self.ttl_seconds
+            if route.path_indices is not None
+            else self.miss_ttl_seconds
+        )
+
+    async def _get_many(self, keys: List[str]) -> List[Optional[CachedRoute]]:
+        try:
+            values = await self.backend.get_many(keys)
+        except (RedisError, OSError) as e:
+            self.errors += 1
+            logger.warning(f"Общий кеш маршрутов недоступен (чтение): {e}")
+            return [None] * len(keys)
+        return [decode_route(value) if value is not None else None for value in values]
+
+    async def _set_many(self, items: List[Tuple[str, CachedRoute]]) -> None:
+        try:
+            await self.backend.set_many(
+                [
+                    (key, encode_route(route), self._ttl_for(route))
+                    for key, route in items
+                ]
+            )
+        except (RedisError, OSError) as e:
+            self.errors += 1
+            logger.warning(f"Общий кеш маршрутов недоступен (запись): {e}")
+
+    async def get_many(
+        self,
+        start_port_id: int,
+        end_port_ids: List[int],
+        graph_fingerprint: str,
+        cost_profile: str,
+    ) -> List[Optional[CachedRoute]]:
+        """Маршруты от одного порта до нескольких (None — нет в кеше)."""
+        if not end_port_ids:
+            return []
+        routes = await self._get_many(
+            [
+                self._key(start_port_id, end_port_id, graph_fingerprint, cost_profile)
+                for end_port_id in end_port_ids
+            ]
+        )
+        found = sum(route is not None for route in routes)
+        self.hits += found
+        self.misses += len(routes) - found
+        return routes
+
+    async def put_many(
+        self,
+        start_port_id: int,
+        routes: List[Tuple[int, CachedRoute]],
+        graph_fingerprint: str,
+        cost_profile: str,
+    ) -> None:
+        """Сохраняет маршруты (end_port_id, маршрут) от одного порта."""
+        if routes:
+            await self._set_many(
+                [
+                    (
+                        self._key(
+                            start_port_id, end_port_id, graph_fingerprint, cost_profile
+                        ),
+                        route,
+                    )
+                    for end_port_id, route in routes
+                ]
+            )
+
+    async def get_or_compute(
+        self,
+        start_port_id: int,
+        end_port_id: int,
+        graph_fingerprint: str,
+        cost_profile: str,
+        compute: Callable[[], Awaitable[CachedRoute]],
+    ) -> CachedRoute:
+        """
+        Маршрут из общего кеша; если его нет, compute() выполняется один раз
+        для ключа на все задачи процесса и, по возможности, на все реплики.
+        """
+        key = self._key(start_port_id, end_port_id, graph_fingerprint, cost_profile)
+        (route,) = await self._get_many([key])
+        if route is not None:
+            self.hits += 1
+            return route
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            route = await self._compute_once(key, compute)
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Ошибка уже передана вызывающему; ожидающих может не быть
+                future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(route)
+        return route
+
+    async def _compute_once(
+        self, key: str, compute: Callable[[], Awaitable[CachedRoute]]
+    ) -> CachedRoute:
+        lock_key = f"lock:{key}"
+        token = uuid.uuid4().hex
+        try:
+            locked = await self.backend.acquire_lock(lock_key, token, self.lock_ttl_ms)
+        except (RedisError, OSError) as e:
+            self.errors += 1
+            logger.warning(f"Общий кеш маршрутов недоступен (блокировка): {e}")
+            return await compute()
+        if not locked:
+            # Ключ считает другая реплика: ждем ее результат
+            deadline = time.monotonic() + self.lock_wait
+            while time.monotonic() < deadline:
+                await asyncio.sleep(_LOCK_POLL_SECONDS)
+                (route,) = await self._get_many([key])
+                if route is not None:
+                    self.remote_waits += 1
+                    return route
+            self.lock_timeouts += 1
+            route = await compute()
+            await self._set_many([(key, route)])
+            return route
+        try:
+            route = await compute()
+            await self._set_many([(key, route)])
+            return route
+        finally:
+            try:
+                await self.backend.release_lock(lock_key, token)
+            except (RedisError, OSError) as e:
+                self.errors += 1
+                logger.warning(f"Не удалось снять блокировку {lock_key}: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "remote_waits": self.remote_waits,
+            "lock_timeouts": self.lock_timeouts,
+            "errors": self.errors,
+        }
+
+    async def close(self) -> None:
+        await self.backend.close()
+
+
+def create_shared_route_cache(url: str) -> Optional[SharedRouteCache]:
+    """Общий кеш с хранилищем по url (см. ROUTE_SHARED_CACHE_URL)."""
+    if not url:
+        return None
+    backend = (
+        LocalRouteCacheBackend() if url == "local" else RedisRouteCacheBackend(url)
+    )
+    return SharedRouteCache(
+        backend,
+        ROUTE_SHARED_CACHE_TTL_SECONDS,
+        ROUTE_SHARED_CACHE_MISS_TTL_SECONDS,
+        ROUTE_SHARED_CACHE_LOCK_TTL_MS,
+        ROUTE_SHARED_CACHE_LOCK_WAIT_MS,
+    )
+
+
+# Общий кеш маршрутов процесса (None — выключен).
+shared_route_cache = create_shared_route_cache(ROUTE_SHARED_CACHE_URL)
@@ -0,0 +1,21 @@
+# RoutesCalculatorService/tests/conftest.py
+import os
+import sys
+import tempfile
+
+# Файлы предрасчета (иерархия, ориентиры, оракул, снимок графа) тесты пишут
+# во временный каталог, а не в cache/ рядом с кодом. Переменные окружения
+# читаются модулями при импорте, поэтому задаются до импорта калькулятора.
+_CACHE_DIR = tempfile.mkdtemp(prefix="routes_calculator_tests_")
+for _name, _file_name in (
+    ("CH_CACHE_PATH", "contraction_hierarchy.npz"),
+    ("LANDMARKS_CACHE_PATH", "landmarks.npz"),
+    ("DISTANCE_ORACLE_PATH", "distance_oracle.bin"),
+    ("GRAPH_SNAPSHOT_PATH", "graph_snapshot.bin"),
+):
+    os.environ[_name] = os.path.join(_CACHE_DIR, _file_name)
+os.environ["ROUTE_SHARED_CACHE_URL"] = ""
+os.environ["SEARCH_WORKERS"] = "0"
+
+# Модули калькулятора импортируются плоско, как в main.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,71 @@
+# RoutesCalculatorService/tests/graph_factory.py
+"""Небольшие графы для тестов движков поиска."""
+
+import random
+from typing import List, Optional, Tuple
+
+import numpy as np
+from graph import GraphSnapshot
+from heuristics import great_circle_distances
+
+# Ребро: (порт отправления, порт назначения, дистанция, ограничение скорости).
+Edge = Tuple[int, int, float, float]
+
+
+def build_graph(
+    latitudes: List[float], longitudes: List[float], edges: List[Edge]
+) -> GraphSnapshot:
+    """Снимок графа из списка рёбер (индексы портов 0..N-1, id = индекс + 1)."""
+    num_ports = len(latitudes)
+    sources = np.array([edge[0] for edge in edges], dtype=np.int32)
+    order = np.argsort(sources, kind="stable")
+    offsets = np.zeros(num_ports + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=num_ports), out=offsets[1:])
+    return GraphSnapshot(
+        port_ids=np.arange(1, num_ports + 1, dtype=np.int64),
+        names=[f"Port {idx}" for idx in range(num_ports)],
+        latitudes=np.array(latitudes, dtype=np.float64),
+        longitudes=np.array(longitudes, dtype=np.float64),
+        offsets=offsets,
+        targets=np.array([edge[1] for edge in edges], dtype=np.int32)[order],
+        distances=np.array([edge[2] for edge in edges], dtype=np.float64)[order],
+        segment_ids=np.arange(1, len(edges) + 1, dtype=np.int64)[order],
+        speed_caps=np.array([edge[3] for edge in edges], dtype=np.float64)[order],
+    )
+
+
+def random_graph(
+    seed: int,
+    num_ports: int = 30,
+    num_edges: int = 90,
+    detour: Tuple[float, float] = (1.0, 1.5),
+    parallel_edges: bool = True,
+    speed_caps: Optional[Tuple[float, float]] = None,
+) -> GraphSnapshot:
+    """
+    Случайный направленный граф: дистанция сегмента — расстояние по прямой,
+    умноженное на коэффициент из detour (коэффициент меньше 1 дает сегменты
+    короче дуги большого круга). Часть портов может оказаться недостижимой.
+    """
+    rng = random.Random(seed)
+    latitudes = [rng.uniform(30.0, 45.0) for _ in range(num_ports)]
+    longitudes = [rng.uniform(-10.0, 10.0) for _ in range(num_ports)]
+    coordinates = build_graph(latitudes, longitudes, [])
+    edges: List[Edge] = []
+    seen = set()
+    while len(edges) < num_edges:
+        source, target = rng.randrange(num_ports), rng.randrange(num_ports)
+        if source == target or (not parallel_edges and (source, target) in seen):
+            continue
+        seen.add((source, target))
+        straight = float(
+            great_circle_distances(coordinates, target, np.array([source]))[0]
+        )
+        speed_cap = rng.uniform(*speed_caps) if speed_caps else float("inf")
+        edges.append((source, target, straight * rng.uniform(*detour), speed_cap))
+    return build_graph(latitudes, longitudes, edges)
+
+
+def path_cost(graph: GraphSnapshot, path: List[int]) -> float:
+    """Стоимость пути по весам снимка (каждое плечо должно быть сегментом)."""
+    return float(graph.distances[graph.path_edge_indices(path)].sum())
@@ -0,0 +1,86 @@
+# RoutesCalculatorService/tests/test_distance_oracle.py
+import functools
+import math
+import multiprocessing
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import distance_oracle
+import pytest
+from dijkstra import single_source_dijkstra
+from distance_oracle import DistanceOracle, build_distance_oracle
+from graph import GraphSnapshot
+from graph_factory import build_graph, path_cost, random_graph
+
+
+def test_oracle_routes_match_dijkstra(tmp_path):
+    graph = random_graph(21, num_ports=25, num_edges=70)
+    path = str(tmp_path / "oracle.bin")
+    build_distance_oracle(graph, path, workers=2, chunk_size=4)
+    oracle = DistanceOracle.open(path)
+    assert oracle is not None and oracle.fingerprint == graph.fingerprint
+
+    for start_idx in range(graph.num_ports):
+        expected, _ = single_source_dijkstra(graph, start_idx)
+        for end_idx in range(graph.num_ports):
+            route_path, distance = oracle.route(graph, start_idx, end_idx)
+            if math.isinf(expected[end_idx]):
+                assert route_path is None
+                continue
+            assert distance == pytest.approx(expected[end_idx])
+            assert path_cost(graph, route_path) == pytest.approx(distance)
+
+
+def test_oracle_follows_zero_length_segments(tmp_path):
+    # Порт 1 достигается через 2 сегментом нулевой длины: дистанции равны,
+    # и порядок по дистанции может поставить потомка раньше предка.
+    graph = build_graph(
+        [0.0, 1.0, 1.0],
+        [0.0, 0.0, 0.0],
+        [(0, 2, 10.0, math.inf), (2, 1, 0.0, math.inf)],
+    )
+    path = str(tmp_path / "oracle.bin")
+    build_distance_oracle(graph, path, workers=1)
+    oracle = DistanceOracle.open(path)
+    assert oracle.route(graph, 0, 1) == ([0, 2, 1], 10.0)
+    assert oracle.route(graph, 1, 0) == (None, None)
+
+
+def test_oracle_builds_with_spawn_workers(tmp_path, monkeypatch):
+    # Процессам-построителям передаются массивы снимка, а не сам снимок
+    # (в нем блокировки), поэтому построение работает и без fork.
+    monkeypatch.setattr(
+        distance_oracle,
+        "ProcessPoolExecutor",
+        functools.partial(
+            ProcessPoolExecutor, mp_context=multiprocessing.get_context("spawn")
+        ),
+    )
+    graph = random_graph(22, num_ports=12, num_edges=30)
+    with pytest.raises(TypeError):
+        pickle.dumps(graph)
+    arrays = pickle.loads(pickle.dumps(graph.to_arrays()))
+    rebuilt = GraphSnapshot.from_arrays(arrays, graph.base_fingerprint)
+    assert rebuilt.fingerprint == graph.fingerprint
+    assert rebuilt.names == graph.names
+
+    path = str(tmp_path / "oracle.bin")
+    build_distance_oracle(graph, path, workers=1)
+    assert DistanceOracle.open(path).fingerprint == graph.fingerprint
+
+
+def test_loaded_oracle_survives_lookup_for_other_graph(tmp_path, monkeypatch):
+    graph = random_graph(23, num_ports=10, num_edges=25)
+    other = random_graph(24, num_ports=10, num_edges=25)
+    path = str(tmp_path / "oracle.bin")
+    build_distance_oracle(graph, path, workers=1)
+    monkeypatch.setattr(distance_oracle, "DISTANCE_ORACLE_PATH", path)
+    monkeypatch.setattr(distance_oracle, "_oracle", None)
+    monkeypatch.setattr(distance_oracle, "_oracle_checked_at", 0.0)
+    monkeypatch.setattr(distance_oracle, "DISTANCE_ORACLE_RECHECK_SECONDS", 0)
+
+    oracle = distance_oracle.get_distance_oracle(graph)
+    assert oracle is not None
+    assert distance_oracle.get_distance_oracle(other) is None
+    # Запрос для другого снимка не выбрасывает подходящий оракул.
+    assert distance_oracle.get_distance_oracle(graph) is oracle
@@ -0,0 +1,57 @@
+# RoutesCalculatorService/tests/test_k_shortest_paths.py
+from typing import List
+
+import pytest
+from graph import GraphSnapshot
+from graph_factory import path_cost, random_graph
+from k_shortest_paths import k_shortest_paths
+from search_stats import SearchStats
+
+
+def _all_simple_path_costs(
+    graph: GraphSnapshot, start_idx: int, end_idx: int
+) -> List[float]:
+    """Стоимости всех простых путей перебором (для графов без кратных рёбер)."""
+    costs: List[float] = []
+    on_path = {start_idx}
+
+    def visit(current_idx: int, cost: float) -> None:
+        if current_idx == end_idx:
+            costs.append(cost)
+            return
+        for edge in range(graph.offsets[current_idx], graph.offsets[current_idx + 1]):
+            neighbor_idx = int(graph.targets[edge])
+            if neighbor_idx in on_path:
+                continue
+            on_path.add(neighbor_idx)
+            visit(neighbor_idx, cost + float(graph.distances[edge]))
+            on_path.discard(neighbor_idx)
+
+    visit(start_idx, 0.0)
+    return sorted(costs)
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_yen_matches_brute_force(seed):
+    graph = random_graph(seed, num_ports=9, num_edges=24, parallel_edges=False)
+    for start_idx, end_idx in ((0, 8), (1, 7), (4, 2)):
+        expected = _all_simple_path_costs(graph, start_idx, end_idx)
+        stats = SearchStats()
+        routes = k_shortest_paths(graph, start_idx, end_idx, 6, stats)
+
+        assert [distance for _, distance in routes] == pytest.approx(expected[:6])
+        assert stats.engine == "yen"
+        seen = set()
+        for path, distance in routes:
+            assert path[0] == start_idx and path[-1] == end_idx
+            assert len(set(path)) == len(path)  # без циклов
+            assert path_cost(graph, path) == pytest.approx(distance)
+            seen.add(tuple(path))
+        assert len(seen) == len(routes)
+
+
+def test_yen_single_route_when_k_is_one():
+    graph = random_graph(2, num_ports=9, num_edges=24, parallel_edges=False)
+    expected = _all_simple_path_costs(graph, 0, 8)
+    routes = k_shortest_paths(graph, 0, 8, 1)
+    assert [distance for _, distance in routes] == pytest.approx(expected[:1])
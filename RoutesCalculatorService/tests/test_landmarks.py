@@ -0,0 +1,57 @@
+# RoutesCalculatorService/tests/test_landmarks.py
+import math
+
+import landmarks
+import numpy as np
+import pytest
+from dijkstra import single_source_dijkstra
+from graph_factory import build_graph, random_graph
+
+
+def _reload_from_file(graph, monkeypatch):
+    """Ориентиры для graph заново, но только из файла (без предрасчета)."""
+    monkeypatch.setattr(landmarks, "_landmarks", landmarks.OrderedDict())
+
+    def fail(*args):
+        raise AssertionError("ориентиры должны быть прочитаны из файла")
+
+    monkeypatch.setattr(landmarks, "select_landmarks", fail)
+    return landmarks.get_landmarks(graph)
+
+
+def test_lower_bounds_are_admissible():
+    graph = random_graph(41, num_ports=30, num_edges=120)
+    selected = landmarks.select_landmarks(graph, 4)
+    for target_idx in range(0, graph.num_ports, 3):
+        to_target, _ = single_source_dijkstra(graph, target_idx, reverse=True)
+        bounds = selected.lower_bounds_to(target_idx)
+        for port_idx in range(graph.num_ports):
+            if math.isinf(to_target[port_idx]):
+                continue
+            assert bounds[port_idx] <= to_target[port_idx] + 1e-9
+
+
+def test_cached_file_with_fewer_landmarks_is_reused(monkeypatch):
+    # Цепочка 0 -> 1 -> 2: после двух ориентиров все порты покрыты, и выбор
+    # останавливается раньше min(K, N) = 3.
+    graph = build_graph(
+        [0.0, 0.0, 0.0],
+        [0.0, 1.0, 2.0],
+        [(0, 1, 60.0, math.inf), (1, 2, 60.0, math.inf)],
+    )
+    built = landmarks.get_landmarks(graph)
+    assert len(built.landmark_indices) < min(landmarks.ALT_LANDMARK_COUNT, 3)
+    assert built.requested_count == landmarks.ALT_LANDMARK_COUNT
+
+    loaded = _reload_from_file(graph, monkeypatch)
+    assert np.array_equal(loaded.landmark_indices, built.landmark_indices)
+
+
+def test_cached_file_for_other_landmark_count_is_rebuilt(monkeypatch):
+    graph = random_graph(42, num_ports=20, num_edges=60)
+    landmarks.get_landmarks(graph)
+    monkeypatch.setattr(
+        landmarks, "ALT_LANDMARK_COUNT", landmarks.ALT_LANDMARK_COUNT + 1
+    )
+    with pytest.raises(AssertionError):
+        _reload_from_file(graph, monkeypatch)
@@ -0,0 +1,47 @@
+# RoutesCalculatorService/tests/test_message_grouping.py
+import json
+import uuid
+from types import SimpleNamespace
+
+import kafka_consumer
+
+
+def _message(payload):
+    return SimpleNamespace(value=json.dumps(payload).encode("utf-8"))
+
+
+def test_group_messages_merges_tasks_from_one_port():
+    task_ids = [str(uuid.uuid4()) for _ in range(6)]
+    units = kafka_consumer._group_messages(
+        [
+            _message({"task_id": task_ids[0], "start_port_id": 1, "end_port_id": 2}),
+            _message({"task_id": task_ids[1], "start_port_id": 1, "end_port_id": 3}),
+            # Движок поиска не мешает объединению: группа считается деревом
+            # Дейкстры. Другой профиль и другой порт отправления — отдельно.
+            _message(
+                {
+                    "task_id": task_ids[2],
+                    "start_port_id": 1,
+                    "end_port_id": 4,
+                    "search_engine": "ch",
+                }
+            ),
+            _message(
+                {
+                    "task_id": task_ids[3],
+                    "start_port_id": 1,
+                    "end_port_id": 5,
+                    "cost_profile": "time",
+                }
+            ),
+            _message({"task_id": task_ids[4], "start_port_id": 2, "end_port_id": 1}),
+            # task_id не UUID: сообщение не объединяется и будет отклонено.
+            _message({"task_id": "not-a-uuid", "start_port_id": 1, "end_port_id": 6}),
+        ]
+    )
+
+    merged = [payload for messages, payload in units if len(messages) > 1]
+    assert len(merged) == 1
+    assert [target["task_id"] for target in merged[0]["targets"]] == task_ids[:3]
+    assert "search_engine" not in merged[0]
+    assert len(units) == 4
@@ -0,0 +1,146 @@
+# RoutesCalculatorService/tests/test_offset_tracker.py
+import asyncio
+import json
+import uuid
+from types import SimpleNamespace
+
+import kafka_consumer
+from aiokafka import TopicPartition
+from offset_tracker import OffsetTracker
+
+
+def test_commits_only_contiguous_prefix():
+    tracker = OffsetTracker()
+    for offset in (10, 11, 12):
+        tracker.started("p0", offset)
+
+    tracker.done("p0", 11)
+    assert tracker.committable() == {"p0": 10}
+    tracker.done("p0", 10)
+    assert tracker.committable() == {"p0": 12}
+    tracker.done("p0", 12)
+    assert tracker.committable() == {"p0": 13}
+
+    tracker.mark_committed({"p0": 13})
+    assert tracker.committable() == {}
+
+
+def test_partitions_are_independent_and_forgettable():
+    tracker = OffsetTracker()
+    tracker.started("p0", 0)
+    tracker.started("p1", 5)
+    tracker.done("p1", 5)
+    assert tracker.committable() == {"p0": 0, "p1": 6}
+
+    tracker.forget({"p0"})
+    # Сообщение отозванного раздела завершилось позже: оно игнорируется.
+    tracker.done("p0", 0)
+    assert tracker.committable() == {"p1": 6}
+
+
+class _FakeConsumer:
+    def __init__(self):
+        self.commits = []
+
+    async def commit(self, offsets):
+        self.commits.append(dict(offsets))
+
+
+class _FakeResultWriter:
+    """Минимальная запись FAILED: запоминает задачи и возвращает written."""
+
+    def __init__(self, written):
+        self.written = written
+        self.failed_task_ids = []
+
+    async def write_many(self, updates):
+        assert all(
+            set(update) == {"task_id", "status", "error_message"} for update in updates
+        )
+        self.failed_task_ids.extend(update["task_id"] for update in updates)
+        return self.written
+
+
+def _run_window(results, monkeypatch, payloads=None, failed_write=True):
+    """
+    Обрабатывает сообщения payloads (по умолчанию одно) одной единицей окна;
+    results — что возвращают попытки записи, failed_write — результат
+    минимальной записи FAILED.
+    """
+    payloads = payloads or [{"task_id": str(uuid.uuid4())}]
+    attempts = []
+    writer = _FakeResultWriter(failed_write)
+
+    async def process(payload):
+        attempts.append(payload)
+        return results.pop(0)
+
+    monkeypatch.setattr(kafka_consumer, "process_message_from_kafka", process)
+    monkeypatch.setattr(kafka_consumer, "result_writer", writer)
+    monkeypatch.setattr(kafka_consumer, "KAFKA_WRITE_RETRY_DELAY_MS", 0)
+
+    async def run():
+        window = kafka_consumer._KafkaWorkWindow(_FakeConsumer(), 4)
+        messages = []
+        for offset, payload in enumerate(payloads, start=7):
+            await window.slots.acquire()
+            messages.append(
+                SimpleNamespace(
+                    topic="t",
+                    partition=0,
+                    offset=offset,
+                    timestamp=0,
+                    value=json.dumps(payload).encode(),
+                )
+            )
+        merged = payloads[0] if len(payloads) == 1 else {"targets": payloads}
+        window.start(messages, merged)
+        await asyncio.gather(*window.tasks)
+        return window
+
+    return asyncio.run(run()), attempts, writer
+
+
+def test_window_commits_after_successful_retry(monkeypatch):
+    window, attempts, writer = _run_window([False, True], monkeypatch)
+    assert len(attempts) == 2
+    assert writer.failed_task_ids == []
+    assert window.consumer.commits == [{TopicPartition("t", 0): 8}]
+    assert window.slots._value == 4
+
+
+def test_window_marks_unwritable_task_failed_and_commits(monkeypatch):
+    window, attempts, writer = _run_window(
+        [False] * (kafka_consumer.KAFKA_WRITE_RETRIES + 1), monkeypatch
+    )
+    assert len(attempts) == kafka_consumer.KAFKA_WRITE_RETRIES + 1
+    assert writer.failed_task_ids == [attempts[0]["task_id"]]
+    # Сообщение не блокирует раздел: офсет фиксируется.
+    assert window.consumer.commits == [{TopicPartition("t", 0): 8}]
+    assert window.slots._value == 4
+
+
+def test_window_keeps_offset_when_database_is_unavailable(monkeypatch):
+    window, attempts, _ = _run_window(
+        [False] * (kafka_consumer.KAFKA_WRITE_RETRIES + 1),
+        monkeypatch,
+        failed_write=False,
+    )
+    assert len(attempts) == kafka_consumer.KAFKA_WRITE_RETRIES + 1
+    assert window.consumer.commits == []
+    # Офсет 7 остается первым незафиксированным: сообщение прочитают заново.
+    assert window.tracker.committable() == {TopicPartition("t", 0): 7}
+    assert window.slots._value == 4
+
+
+def test_window_retries_grouped_tasks_one_by_one(monkeypatch):
+    payloads = [{"task_id": str(uuid.uuid4())} for _ in range(2)]
+    retries = kafka_consumer.KAFKA_WRITE_RETRIES + 1
+    window, attempts, writer = _run_window(
+        [False] * retries + [True, False], monkeypatch, payloads
+    )
+    assert attempts[retries:] == payloads
+    # FAILED получает только задача, результат которой не записывается.
+    assert writer.failed_task_ids == [payloads[1]["task_id"]]
+    assert window.consumer.commits == [{TopicPartition("t", 0): 9}]
+    assert window.slots._value == 4
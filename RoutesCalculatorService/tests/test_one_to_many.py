@@ -0,0 +1,48 @@
+# RoutesCalculatorService/tests/test_one_to_many.py
+import math
+
+import kafka_consumer
+import pytest
+from dijkstra import one_to_many_search, single_source_dijkstra
+from distance_oracle import DistanceOracle, build_distance_oracle
+from graph_factory import path_cost, random_graph
+from search_stats import SearchStats
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_one_to_many_matches_dijkstra(seed):
+    graph = random_graph(seed, detour=(0.3, 1.5))
+    start_idx = 0
+    expected, _ = single_source_dijkstra(graph, start_idx)
+    # Повторяющиеся цели и сам порт отправления тоже допустимы.
+    targets = list(range(graph.num_ports)) + [3, 3, start_idx]
+    stats = SearchStats()
+    results = one_to_many_search(graph, start_idx, targets, stats)
+
+    assert len(results) == len(targets)
+    assert stats.engine is not None and stats.nodes_expanded > 0
+    for end_idx, (path, distance) in zip(targets, results):
+        if math.isinf(expected[end_idx]):
+            assert path is None and distance is None
+            continue
+        assert distance == pytest.approx(expected[end_idx])
+        assert path[0] == start_idx and path[-1] == end_idx
+        if len(path) > 1:
+            assert path_cost(graph, path) == pytest.approx(distance)
+
+
+def test_grouped_targets_are_answered_by_oracle(tmp_path):
+    graph = random_graph(4, detour=(0.3, 1.5))
+    path = str(tmp_path / "oracle.bin")
+    build_distance_oracle(graph, path, workers=1)
+    oracle = DistanceOracle.open(path)
+    targets = list(range(graph.num_ports))
+
+    expected = one_to_many_search(graph, 0, targets, SearchStats())
+    results = kafka_consumer._oracle_routes(oracle, graph, 0, targets)
+    assert [distance for _, distance in results] == pytest.approx(
+        [distance for _, distance in expected], nan_ok=True
+    )
+    # Оракул другого графа не отвечает: цели ищутся деревом Дейкстры.
+    other = random_graph(5, detour=(0.3, 1.5))
+    assert kafka_consumer._oracle_routes(oracle, other, 0, targets) is None
@@ -0,0 +1,97 @@
+# RoutesCalculatorService/tests/test_result_writer.py
+import asyncio
+import uuid
+
+import pytest
+import result_writer
+from result_writer import ResultWriter, is_valid_task_id
+
+
+class _FakeDatabase:
+    """update_calculation_tasks, отвергающий пачку со строкой status="BAD"."""
+
+    def __init__(self, fail_with=None):
+        self.calls = []
+        self.fail_with = fail_with
+
+    async def update_calculation_tasks(self, updates):
+        self.calls.append([update["task_id"] for update in updates])
+        if self.fail_with is not None:
+            raise self.fail_with
+        return not any(update["status"] == "BAD" for update in updates)
+
+
+def _write_all(writer, updates):
+    async def run():
+        results = await asyncio.gather(
+            *(writer.write(task_id, status) for task_id, status in updates)
+        )
+        await writer.close()
+        return results
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def database(monkeypatch):
+    database = _FakeDatabase()
+    monkeypatch.setattr(
+        result_writer, "update_calculation_tasks", database.update_calculation_tasks
+    )
+    return database
+
+
+def test_batch_is_written_with_one_update(database):
+    task_ids = [str(uuid.uuid4()) for _ in range(3)]
+    writer = ResultWriter(10, 5)
+    assert (
+        _write_all(writer, [(task_id, "COMPLETED") for task_id in task_ids])
+        == [True] * 3
+    )
+    assert database.calls == [task_ids]
+    assert writer.stats()["rows"] == 3
+
+
+def test_bad_row_does_not_fail_the_batch(database):
+    task_ids = [str(uuid.uuid4()) for _ in range(3)]
+    writer = ResultWriter(10, 5)
+    results = _write_all(
+        writer,
+        [(task_ids[0], "COMPLETED"), (task_ids[1], "BAD"), (task_ids[2], "FAILED")],
+    )
+    assert results == [True, False, True]
+    # Пачка целиком, затем по одной строке.
+    assert database.calls == [task_ids, [task_ids[0]], [task_ids[1]], [task_ids[2]]]
+    stats = writer.stats()
+    assert (stats["rows"], stats["failed_rows"], stats["failed_batches"]) == (2, 1, 1)
+
+
+def test_invalid_task_id_is_rejected_before_the_batch(database):
+    task_id = str(uuid.uuid4())
+    writer = ResultWriter(10, 5)
+    results = _write_all(writer, [(task_id, "COMPLETED"), ("42", "COMPLETED")])
+    assert results == [True, False]
+    assert database.calls == [[task_id]]
+
+
+def test_database_exception_resolves_to_false(monkeypatch):
+    database = _FakeDatabase(fail_with=OSError("connection refused"))
+    monkeypatch.setattr(
+        result_writer, "update_calculation_tasks", database.update_calculation_tasks
+    )
+    writer = ResultWriter(10, 5)
+    task_ids = [str(uuid.uuid4()) for _ in range(2)]
+    assert _write_all(writer, [(task_id, "COMPLETED") for task_id in task_ids]) == [
+        False,
+        False,
+    ]
+    assert writer.stats()["failed_rows"] == 2
+
+
+def test_is_valid_task_id():
+    task_id = uuid.uuid4()
+    assert is_valid_task_id(task_id)
+    assert is_valid_task_id(str(task_id))
+    assert not is_valid_task_id(None)
+    assert not is_valid_task_id("task-1")
+    assert not is_valid_task_id(12)
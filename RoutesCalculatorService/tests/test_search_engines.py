@@ -0,0 +1,80 @@
+# RoutesCalculatorService/tests/test_search_engines.py
+import json
+import math
+
+import pytest
+from a_star import SEARCH_ENGINES
+from dijkstra import single_source_dijkstra
+from graph_factory import path_cost, random_graph
+from search_stats import SearchStats
+
+# (движок, эвристика) в статистике поиска: ALT — это A* с эвристикой по ориентирам.
+EXPECTED_STATS = {
+    "astar": ("astar", "haversine"),
+    "alt": ("astar", "alt"),
+    "bidirectional": ("bidirectional", "haversine"),
+    "ch": ("ch", None),
+}
+
+# Коэффициенты извилистости: обычные сегменты и сегменты короче дуги
+# большого круга (эвристика по прямой для них без поправки недопустима).
+DETOURS = [(1.0, 1.5), (0.3, 1.5)]
+
+
+def _assert_matches_dijkstra(graph, engine_name, engine, sources):
+    for start_idx in sources:
+        expected, _ = single_source_dijkstra(graph, start_idx)
+        for end_idx in range(graph.num_ports):
+            path, distance = engine(graph, start_idx, end_idx, None)
+            if math.isinf(expected[end_idx]):
+                assert path is None and distance is None, (engine_name, end_idx)
+                continue
+            assert distance == pytest.approx(expected[end_idx]), (
+                engine_name,
+                start_idx,
+                end_idx,
+            )
+            assert path[0] == start_idx and path[-1] == end_idx
+            assert path_cost(graph, path) == pytest.approx(distance)
+
+
+@pytest.mark.parametrize("detour", DETOURS)
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("engine_name", sorted(SEARCH_ENGINES))
+def test_engine_matches_dijkstra(engine_name, seed, detour):
+    graph = random_graph(seed, detour=detour)
+    _assert_matches_dijkstra(
+        graph, engine_name, SEARCH_ENGINES[engine_name], range(0, graph.num_ports, 4)
+    )
+
+
+@pytest.mark.parametrize("detour", DETOURS)
+@pytest.mark.parametrize("engine_name", ["astar", "bidirectional"])
+def test_engine_matches_dijkstra_for_time_profile(engine_name, detour):
+    base = random_graph(11, detour=detour, speed_caps=(6.0, 20.0))
+    graph = base.with_cost_profile("time", 14.0)
+    _assert_matches_dijkstra(
+        graph, engine_name, SEARCH_ENGINES[engine_name], range(0, graph.num_ports, 5)
+    )
+
+
+@pytest.mark.parametrize("engine_name", sorted(SEARCH_ENGINES))
+def test_engine_fills_search_stats(engine_name):
+    graph = random_graph(3, num_ports=40, num_edges=160)
+    stats = SearchStats()
+    path, _ = SEARCH_ENGINES[engine_name](graph, 0, graph.num_ports - 1, stats)
+    assert (stats.engine, stats.heuristic) == EXPECTED_STATS[engine_name]
+    if path is not None:
+        assert stats.nodes_expanded > 0
+    # Статистика сохраняется в JSON-поле задачи.
+    assert json.loads(json.dumps(stats.to_dict()))["engine"] == stats.engine
+
+
+def test_speed_change_changes_fingerprint():
+    graph = random_graph(5, speed_caps=(6.0, 20.0))
+    slower = random_graph(5, speed_caps=(5.0, 19.0))
+    assert graph.fingerprint != slower.fingerprint
+    assert (
+        graph.with_cost_profile("time", 14.0).fingerprint
+        != slower.with_cost_profile("time", 14.0).fingerprint
+    )
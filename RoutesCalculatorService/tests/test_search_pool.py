@@ -0,0 +1,39 @@
+# RoutesCalculatorService/tests/test_search_pool.py
+import asyncio
+
+import pytest
+from a_star import a_star_search_algorithm
+from graph_factory import random_graph
+from search_pool import SearchPool
+from search_stats import SearchStats
+
+
+def test_pool_results_match_inline_search():
+    base = random_graph(31, num_ports=40, num_edges=160, speed_caps=(6.0, 20.0))
+    pool = SearchPool(1)
+
+    async def run_all():
+        results = []
+        for graph in (base, base.with_cost_profile("time", 12.0)):
+            stats = SearchStats()
+            result = await pool.run(a_star_search_algorithm, graph, (0, 39), stats)
+            results.append((graph, result, stats))
+        return results, pool.stats()
+
+    try:
+        results, pool_stats = asyncio.run(run_all())
+    finally:
+        pool.shutdown()
+
+    for graph, (path, distance), stats in results:
+        expected_path, expected_distance = a_star_search_algorithm(graph, 0, 39)
+        assert path == expected_path
+        if expected_distance is None:
+            assert distance is None
+        else:
+            assert distance == pytest.approx(expected_distance)
+        # Статистика процесса пула возвращается вызывающему.
+        assert stats.engine == "astar"
+    # Профиль применяется в процессе пула к одному опубликованному снимку.
+    assert pool_stats["published_graphs"] == 1
+    assert pool_stats["tasks_completed"] == 2
@@ -0,0 +1,49 @@
+# RoutesCalculatorService/tests/test_search_stats.py
+import json
+
+import numpy as np
+from graph_factory import random_graph
+from k_shortest_paths import k_shortest_paths
+from search_stats import SearchStats
+
+
+def test_add_accumulates_nested_searches():
+    total = SearchStats("yen")
+    for nodes, max_open_set in ((5, 7), (3, 11)):
+        nested = SearchStats()
+        nested.set_counters(nodes, nodes * 2, nodes + 1, 1, max_open_set)
+        total.add(nested)
+    assert total.nodes_expanded == 8
+    assert total.edges_relaxed == 16
+    assert total.heap_pushes == 10
+    assert total.stale_pops == 2
+    assert total.max_open_set == 11
+    assert total.engine == "yen"
+
+
+def test_to_dict_is_json_serializable():
+    stats = SearchStats("astar")
+    # Счетчики, накопленные из numpy-срезов, приводятся к int.
+    stats.set_counters(np.int64(4), np.int64(9), 5, 0, np.int32(3))
+    stats.elapsed_ms = 1.23456
+    data = json.loads(json.dumps(stats.to_dict()))
+    assert data == {
+        "engine": "astar",
+        "heuristic": None,
+        "nodes_expanded": 4,
+        "edges_relaxed": 9,
+        "heap_pushes": 5,
+        "stale_pops": 0,
+        "max_open_set": 3,
+        "elapsed_ms": 1.235,
+    }
+
+
+def test_yen_reports_spur_search_work():
+    graph = random_graph(53, num_ports=20, num_edges=80)
+    stats = SearchStats()
+    assert len(k_shortest_paths(graph, 0, 19, 4, stats)) == 4
+    # Поиски ответвлений складываются в общую статистику задачи.
+    single = SearchStats()
+    k_shortest_paths(graph, 0, 19, 1, single)
+    assert stats.nodes_expanded > single.nodes_expanded > 0
@@ -0,0 +1,100 @@
+# RoutesCalculatorService/tests/test_shared_route_cache.py
+import asyncio
+
+import numpy as np
+import shared_route_cache
+from route_cache import CachedRoute
+from shared_route_cache import (
+    LocalRouteCacheBackend,
+    SharedRouteCache,
+    create_shared_route_cache,
+    decode_route,
+    encode_route,
+)
+
+
+def _cache(lock_wait_ms=200):
+    return SharedRouteCache(LocalRouteCacheBackend(), 60, 5, 1000, lock_wait_ms)
+
+
+def _route():
+    return CachedRoute([0, 4, 2], 17.5, np.array([3, 9], dtype=np.int64))
+
+
+def test_route_encoding_round_trip():
+    decoded = decode_route(encode_route(_route()))
+    assert decoded.path_indices == [0, 4, 2]
+    assert decoded.total_distance == 17.5
+    assert decoded.edge_indices.tolist() == [3, 9]
+
+    missing = decode_route(encode_route(CachedRoute(None, None)))
+    assert missing.path_indices is None and missing.total_distance is None
+
+
+def test_concurrent_requests_compute_once():
+    cache = _cache()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return _route()
+
+    async def run():
+        return await asyncio.gather(
+            *(cache.get_or_compute(1, 2, "fp", "distance", compute) for _ in range(5))
+        )
+
+    routes = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(route.total_distance == 17.5 for route in routes)
+    assert cache.stats()["coalesced"] == 4
+
+
+def test_key_includes_graph_fingerprint():
+    cache = _cache()
+
+    async def run():
+        await cache.put_many(1, [(2, _route())], "fingerprint-a", "time@12")
+        return (
+            await cache.get_many(1, [2], "fingerprint-a", "time@12"),
+            await cache.get_many(1, [2], "fingerprint-b", "time@12"),
+        )
+
+    same_graph, other_graph = asyncio.run(run())
+    assert same_graph[0].total_distance == 17.5
+    assert other_graph == [None]
+
+
+def test_waits_for_route_computed_by_another_replica():
+    backend = LocalRouteCacheBackend()
+    replica_a = SharedRouteCache(backend, 60, 5, 1000, 1000)
+    replica_b = SharedRouteCache(backend, 60, 5, 1000, 1000)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return _route()
+
+    async def run():
+        first = asyncio.create_task(
+            replica_a.get_or_compute(1, 2, "fp", "distance", compute)
+        )
+        await asyncio.sleep(0.01)
+        second = await replica_b.get_or_compute(1, 2, "fp", "distance", compute)
+        return await first, second
+
+    first, second = asyncio.run(run())
+    assert len(calls) == 1
+    assert second.total_distance == first.total_distance
+    assert replica_b.stats()["remote_waits"] == 1
+
+
+def test_empty_url_disables_shared_cache():
+    # conftest задает пустой ROUTE_SHARED_CACHE_URL, как и значение по умолчанию.
+    assert shared_route_cache.shared_route_cache is None
+    assert create_shared_route_cache("") is None
+    assert isinstance(
+        create_shared_route_cache("local").backend, LocalRouteCacheBackend
+    )
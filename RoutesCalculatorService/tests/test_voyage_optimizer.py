@@ -0,0 +1,47 @@
+# RoutesCalculatorService/tests/test_voyage_optimizer.py
+import itertools
+import math
+
+import pytest
+import voyage_optimizer
+from dijkstra import single_source_dijkstra
+from graph_factory import path_cost, random_graph
+from search_stats import SearchStats
+from voyage_optimizer import optimize_voyage
+
+
+def _brute_force_distance(graph, start_idx, via_indices, end_idx):
+    """Лучший порядок захода полным перебором перестановок."""
+    stops = [start_idx] + via_indices + [end_idx]
+    rows = {stop: single_source_dijkstra(graph, stop)[0] for stop in stops}
+    best = math.inf
+    for order in itertools.permutations(via_indices):
+        route = [start_idx, *order, end_idx]
+        best = min(best, sum(rows[a][b] for a, b in zip(route, route[1:])))
+    return best
+
+
+@pytest.mark.parametrize("exact_max_stops", [10, 0])
+@pytest.mark.parametrize("seed", range(4))
+def test_voyage_matches_brute_force(seed, exact_max_stops, monkeypatch):
+    # exact_max_stops = 0 проверяет эвристику (2-opt / or-opt) на малом рейсе.
+    monkeypatch.setattr(voyage_optimizer, "VOYAGE_EXACT_MAX_STOPS", exact_max_stops)
+    graph = random_graph(seed, num_ports=30, num_edges=150)
+    start_idx, end_idx = 0, 1
+    via_indices = [5, 9, 14, 22, 27]
+    expected = _brute_force_distance(graph, start_idx, via_indices, end_idx)
+    stats = SearchStats()
+    plan = optimize_voyage(graph, start_idx, via_indices, end_idx, stats)
+
+    if math.isinf(expected):
+        assert plan is None
+        return
+    assert plan is not None
+    assert stats.engine == "voyage"
+    assert plan.stop_indices[0] == start_idx and plan.stop_indices[-1] == end_idx
+    assert sorted(plan.stop_indices[1:-1]) == sorted(via_indices)
+    if exact_max_stops:
+        assert plan.total_distance == pytest.approx(expected)
+    else:
+        assert plan.total_distance >= expected - 1e-6
+    assert path_cost(graph, plan.path_indices) == pytest.approx(plan.total_distance)
@@ -0,0 +1,236 @@
+# RoutesCalculatorService/voyage_optimizer.py
+import math
+import os
+from typing import List, Optional, Tuple
+
+from dijkstra import one_to_many_search
+from graph import GraphSnapshot
+from search_stats import SearchStats
+
+# До скольких промежуточных портов порядок ищется точно (Held-Karp, O(2^m * m^2)).
+VOYAGE_EXACT_MAX_STOPS = int(os.getenv("VOYAGE_EXACT_MAX_STOPS", "10"))
+
+# Конечная замена inf для эвристик: недостижимое плечо — очень дорогое, но
+# арифметика приращений в 2-opt / Or-opt не превращается в nan.
+_UNREACHABLE_LEG_COST = 1e12
+
+
+class VoyagePlan:
+    """
+    Результат оптимизации рейса.
+    stop_indices — порядок захода (индексы портов графа, от старта до финиша),
+    legs — для каждого плеча (путь в индексах портов, дистанция).
+    """
+
+    __slots__ = ("stop_indices", "legs", "total_distance")
+
+    def __init__(
+        self,
+        stop_indices: List[int],
+        legs: List[Tuple[List[int], float]],
+        total_distance: float,
+    ):
+        self.stop_indices = stop_indices
+        self.legs = legs
+        self.total_distance = total_distance
+
+    @property
+    def path_indices(self) -> List[int]:
+        """Полный путь рейса: плечи склеиваются без повтора портов захода."""
+        path = [self.stop_indices[0]]
+        for leg_path, _ in self.legs:
+            path.extend(leg_path[1:])
+        return path
+
+
+def leg_distance_matrix(
+    graph: GraphSnapshot,
+    stop_indices: List[int],
+    stats: Optional[SearchStats] = None,
+) -> Tuple[List[List[float]], List[List[Optional[List[int]]]]]:
+    """
+    Матрица дистанций (и путей) между всеми портами захода: по одному
+    поиску "один-ко-многим" от каждого порта до всех остальных сразу.
+    """
+    size = len(stop_indices)
+    matrix = [[math.inf] * size for _ in range(size)]
+    paths: List[List[Optional[List[int]]]] = [[None] * size for _ in range(size)]
+    for row, source_idx in enumerate(stop_indices):
+        row_stats = SearchStats()
+        results = one_to_many_search(graph, source_idx, stop_indices, row_stats)
+        if stats is not None:
+            stats.add(row_stats)
+        for column, (path, distance) in enumerate(results):
+            if path is not None and row != column:
+                matrix[row][column] = distance
+                paths[row][column] = path
+    return matrix, paths
+
+
+def _route_cost(matrix: List[List[float]], order: List[int]) -> float:
+    return sum(matrix[a][b] for a, b in zip(order, order[1:]))
+
+
+def held_karp_order(matrix: List[List[float]]) -> List[int]:
+    """
+    Точный порядок захода для открытого маршрута с фиксированными началом (0)
+    и концом (последний индекс) динамикой Хелда-Карпа по подмножествам.
+    """
+    size = len(matrix)
+    via_count = size - 2
+    if via_count <= 0:
+        return list(range(size))
+
+    full_mask = (1 << via_count) - 1
+    # cost[mask][j] — лучший путь от старта через порты mask с окончанием в j.
+    cost = [[math.inf] * via_count for _ in range(full_mask + 1)]
+    parent = [[-1] * via_count for _ in range(full_mask + 1)]
+    for j in range(via_count):
+        cost[1 << j][j] = matrix[0][j + 1]
+
+    for mask in range(1, full_mask + 1):
+        mask_cost = cost[mask]
+        for j in range(via_count):
+            current = mask_cost[j]
+            if current == math.inf or not (mask >> j) & 1:
+                continue
+            row = matrix[j + 1]
+            for k in range(via_count):
+                if (mask >> k) & 1:
+                    continue
+                next_mask = mask | (1 << k)
+                candidate = current + row[k + 1]
+                if candidate < cost[next_mask][k]:
+                    cost[next_mask][k] = candidate
+                    parent[next_mask][k] = j
+
+    last = min(
+        range(via_count), key=lambda j: cost[full_mask][j] + matrix[j + 1][size - 1]
+    )
+    if cost[full_mask][last] + matrix[last + 1][size - 1] == math.inf:
+        # Допустимого порядка нет: возвращаем любой, его стоимость — inf.
+        return list(range(size))
+    order = []
+    mask = full_mask
+    while last != -1:
+        order.append(last + 1)
+        previous = parent[mask][last]
+        mask &= ~(1 << last)
+        last = previous
+    order.reverse()
+    return [0] + order + [size - 1]
+
+
+def _nearest_neighbor_order(matrix: List[List[float]]) -> List[int]:
+    size = len(matrix)
+    remaining = set(range(1, size - 1))
+    order = [0]
+    while remaining:
+        current = order[-1]
+        next_stop = min(remaining, key=lambda stop: matrix[current][stop])
+        order.append(next_stop)
+        remaining.remove(next_stop)
+    order.append(size - 1)
+    return order
+
+
+def _two_opt(matrix: List[List[float]], order: List[int]) -> Tuple[List[int], bool]:
+    """
+    Одно улучшение 2-opt (разворот участка order[i..j]). Матрица несимметрична,
+    поэтому стоимость развернутого участка считается по префиксным суммам
+    прямого и обратного направлений.
+    """
+    size = len(order)
+    forward = [0.0] * size
+    backward = [0.0] * size
+    for position in range(1, size):
+        a, b = order[position - 1], order[position]
+        forward[position] = forward[position - 1] + matrix[a][b]
+        backward[position] = backward[position - 1] + matrix[b][a]
+
+    for i in range(1, size - 2):
+        for j in range(i + 1, size - 1):
+            before, first, last, after = order[i - 1], order[i], order[j], order[j + 1]
+            delta = (
+                matrix[before][last]
+                + matrix[first][after]
+                + (backward[j] - backward[i])
+                - matrix[before][first]
+                - matrix[last][after]
+                - (forward[j] - forward[i])
+            )
+            if delta < -1e-9:
+                return order[:i] + order[i : j + 1][::-1] + order[j + 1 :], True
+    return order, False
+
+
+def _or_opt(matrix: List[List[float]], order: List[int]) -> Tuple[List[int], bool]:
+    """Одно улучшение Or-opt: перенос цепочки из 1-3 портов на другое место."""
+    size = len(order)
+    for segment_length in (1, 2, 3):
+        for i in range(1, size - segment_length):
+            j = i + segment_length - 1
+            before, first, last, after = order[i - 1], order[i], order[j], order[j + 1]
+            removal_gain = (
+                matrix[before][first] + matrix[last][after] - matrix[before][after]
+            )
+            rest = order[:i] + order[j + 1 :]
+            for position in range(1, len(rest)):
+                if position == i:
+                    continue
+                a, b = rest[position - 1], rest[position]
+                insertion_cost = matrix[a][first] + matrix[last][b] - matrix[a][b]
+                if insertion_cost - removal_gain < -1e-9:
+                    return rest[:position] + order[i : j + 1] + rest[position:], True
+    return order, False
+
+
+def heuristic_order(matrix: List[List[float]]) -> List[int]:
+    """
+    Порядок захода для большого числа портов: ближайший сосед, затем
+    локальные улучшения 2-opt и Or-opt до тех пор, пока они находятся.
+    """
+    finite_matrix = [
+        [value if value != math.inf else _UNREACHABLE_LEG_COST for value in row]
+        for row in matrix
+    ]
+    order = _nearest_neighbor_order(finite_matrix)
+    improved = True
+    while improved:
+        order, improved = _two_opt(finite_matrix, order)
+        if not improved:
+            order, improved = _or_opt(finite_matrix, order)
+    return order
+
+
+def optimize_voyage(
+    graph: GraphSnapshot,
+    start_idx: int,
+    via_indices: List[int],
+    end_idx: int,
+    stats: Optional[SearchStats] = None,
+) -> Optional[VoyagePlan]:
+    """
+    Рейс из start_idx в end_idx с заходом во все порты via_indices в
+    выгодном порядке. Возвращает None, если какое-то плечо выбранного
+    порядка невозможно (порты не связаны маршрутами).
+    """
+    stop_indices = [start_idx] + via_indices + [end_idx]
+    matrix, paths = leg_distance_matrix(graph, stop_indices, stats)
+    # Старт и финиш — один порт (кольцевой рейс): плечо "в себя" нулевое.
+    if start_idx == end_idx:
+        matrix[0][-1] = 0.0
+        paths[0][-1] = [start_idx]
+
+    if len(via_indices) <= VOYAGE_EXACT_MAX_STOPS:
+        order = held_karp_order(matrix)
+    else:
+        order = heuristic_order(matrix)
+    if stats is not None:
+        stats.engine = "voyage"
+
+    total_distance = _route_cost(matrix, order)
+    if total_distance == math.inf:
+        return None
+    legs = [(paths[a][b], matrix[a][b]) for a, b in zip(order, order[1:])]
+    return VoyagePlan([stop_indices[stop] for stop in order], legs, total_distance)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:00
+
+from django.db import migrations
+
+# Любое изменение портов или сегментов (в том числе из админки) отправляет
+# уведомление в канал graph_changed: калькулятор маршрутов слушает его
+# (LISTEN) и перестраивает снимок графа без перезапуска. Полезная нагрузка —
+# имя измененной таблицы. Имя канала должно совпадать с
+# GRAPH_CHANGES_CHANNEL в RoutesCalculatorService/graph_reloader.py.
+CREATE_NOTIFY_TRIGGERS = """
+CREATE OR REPLACE FUNCTION ports_notify_graph_changed() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('graph_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER ports_port_graph_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ports_port
+    FOR EACH STATEMENT EXECUTE FUNCTION ports_notify_graph_changed();
+
+CREATE TRIGGER ports_segment_graph_changed
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ports_segment
+    FOR EACH STATEMENT EXECUTE FUNCTION ports_notify_graph_changed();
+"""
+
+DROP_NOTIFY_TRIGGERS = """
+DROP TRIGGER IF EXISTS ports_segment_graph_changed ON ports_segment;
+DROP TRIGGER IF EXISTS ports_port_graph_changed ON ports_port;
+DROP FUNCTION IF EXISTS ports_notify_graph_changed();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ports', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_NOTIFY_TRIGGERS, reverse_sql=DROP_NOTIFY_TRIGGERS),
+    ]
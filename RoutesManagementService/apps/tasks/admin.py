@@ -3,6 +3,27 @@ from django.contrib import admin
 from .models import CalculationTask
 
 
+class SearchEngineListFilter(admin.SimpleListFilter):
+    """Фильтр задач по движку поиска (или кешу), которым найден маршрут."""
+
+    title = "Движок поиска"
+    parameter_name = "search_engine"
+
+    def lookups(self, request, model_admin):
+        engines = (
+            CalculationTask.objects.filter(search_stats__has_key="engine")
+            .values_list("search_stats__engine", flat=True)
+            .distinct()
+        )
+        # JSON null в ключе engine тоже попадает в выборку — отбрасываем.
+        return [(engine, engine) for engine in sorted(filter(None, engines))]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(search_stats__engine=self.value())
+        return queryset
+
+
 @admin.register(CalculationTask)
 class CalculationTaskAdmin(admin.ModelAdmin):
     list_display = (
@@ -10,10 +31,13 @@ class CalculationTaskAdmin(admin.ModelAdmin):
         "start_port",
         "end_port",
         "status",
+        "search_engine",
+        "search_nodes_expanded",
+        "search_elapsed_ms",
         "created_at",
         "updated_at",
     )
-    list_filter = ("status", "created_at")
+    list_filter = ("status", SearchEngineListFilter, "created_at")
     search_fields = ("task_id", "start_port__name", "end_port__name")
     readonly_fields = (
         "task_id",
@@ -21,5 +45,24 @@ class CalculationTaskAdmin(admin.ModelAdmin):
         "updated_at",
         "result_path",
         "result_distance",
+        "result_alternatives",
+        "result_legs",
+        "search_stats",
         "error_message",
     )
+
+    # Колонки из search_stats сортируются по значению ключа JSON: медленные
+    # поиски находятся сортировкой по времени или числу раскрытых узлов.
+    @admin.display(description="Движок", ordering="search_stats__engine")
+    def search_engine(self, obj):
+        return (obj.search_stats or {}).get("engine")
+
+    @admin.display(
+        description="Раскрыто узлов", ordering="search_stats__nodes_expanded"
+    )
+    def search_nodes_expanded(self, obj):
+        return (obj.search_stats or {}).get("nodes_expanded")
+
+    @admin.display(description="Время поиска, мс", ordering="search_stats__elapsed_ms")
+    def search_elapsed_ms(self, obj):
+        return (obj.search_stats or {}).get("elapsed_ms")
@@ -14,6 +14,12 @@ class RouteCalculationForm(forms.Form):
         label="Порт назначения",
         empty_label="Выберите порт",
     )
+    via_ports = forms.ModelMultipleChoiceField(
+        queryset=Port.objects.order_by("name"),
+        label="Промежуточные порты",
+        required=False,
+        help_text="Порты, в которые нужно зайти по пути. Порядок захода будет подобран так, чтобы рейс был кратчайшим.",
+    )
     vessel_speed_knots = forms.FloatField(
         label="Скорость судна (узлы)",
         required=False,
@@ -21,17 +27,38 @@ class RouteCalculationForm(forms.Form):
         help_text="Оставьте пустым для расчета только расстояния. Для расчета времени введите скорость (только для Капитанов).",
     )
 
+    alternative_routes = forms.IntegerField(
+        label="Количество вариантов маршрута",
+        required=False,
+        min_value=1,
+        max_value=5,
+        help_text="Сколько маршрутов рассчитать (по возрастанию дистанции). По умолчанию — один.",
+    )
+
+    optimize_for = forms.ChoiceField(
+        label="Критерий оптимизации",
+        choices=[("distance", "Кратчайший маршрут"), ("time", "Быстрейший маршрут")],
+        initial="distance",
+        required=False,
+        help_text="Быстрейший маршрут учитывает ограничения скорости на сегментах и скорость судна.",
+    )
+
     # !!! ЭТОТ МЕТОД КРИТИЧЕСКИ ВАЖЕН ДЛЯ ДОБАВЛЕНИЯ КЛАССОВ !!!
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["start_port"].widget.attrs.update({"class": "form-select"})
         self.fields["end_port"].widget.attrs.update({"class": "form-select"})
+        self.fields["via_ports"].widget.attrs.update({"class": "form-select"})
         self.fields["vessel_speed_knots"].widget.attrs.update({"class": "form-control"})
+        self.fields["alternative_routes"].widget.attrs.update({"class": "form-control"})
+        self.fields["optimize_for"].widget.attrs.update({"class": "form-select"})
 
     def clean(self):
         cleaned_data = super().clean()
         start_port = cleaned_data.get("start_port")
         end_port = cleaned_data.get("end_port")
+        via_ports = cleaned_data.get("via_ports")
+        alternative_routes = cleaned_data.get("alternative_routes")
         vessel_speed_knots = cleaned_data.get("vessel_speed_knots")
 
         if start_port and end_port:
@@ -40,6 +67,18 @@ class RouteCalculationForm(forms.Form):
                     "end_port", "Порт отправления и порт назначения не могут совпадать."
                 )
 
+        if via_ports:
+            if start_port in via_ports or end_port in via_ports:
+                self.add_error(
+                    "via_ports",
+                    "Порты отправления и назначения не нужно указывать среди промежуточных.",
+                )
+            if alternative_routes is not None and alternative_routes > 1:
+                self.add_error(
+                    "alternative_routes",
+                    "Варианты маршрута не рассчитываются для рейса с промежуточными портами.",
+                )
+
         if vessel_speed_knots is not None and vessel_speed_knots <= 0:
             self.add_error(
                 "vessel_speed_knots", "Скорость должна быть положительным числом."
@@ -3,7 +3,7 @@ import json
 import logging
 import os
 import socket
-from typing import Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from confluent_kafka import KafkaError, Message, Producer
 
@@ -56,6 +56,10 @@ def send_calculation_request(
     start_port_id: int,
     end_port_id: int,
     vessel_speed_knots: Optional[float] = None,  # Новый параметр
+    search_engine: Optional[str] = None,  # Движок поиска калькулятора
+    alternatives: Optional[int] = None,  # Сколько вариантов маршрута рассчитать
+    via_port_ids: Optional[List[int]] = None,  # Промежуточные порты рейса
+    cost_profile: Optional[str] = None,  # "distance" или "time"
 ) -> bool:
     message_payload = {
         "task_id": task_id,
@@ -64,7 +68,47 @@ def send_calculation_request(
     }
     if vessel_speed_knots is not None:  # Добавляем скорость, если она задана
         message_payload["vessel_speed_knots"] = vessel_speed_knots
+    if search_engine is not None:
+        message_payload["search_engine"] = search_engine
+    if alternatives is not None and alternatives > 1:
+        message_payload["alternatives"] = alternatives
+    if via_port_ids:
+        message_payload["via_port_ids"] = via_port_ids
+    if cost_profile:
+        message_payload["cost_profile"] = cost_profile
 
+    return _produce_message(message_payload, str(task_id), f"task_id {task_id}")
+
+
+def send_one_to_many_calculation_request(
+    start_port_id: int,
+    targets: List[Tuple[str, int]],  # Пары (task_id, end_port_id)
+    vessel_speed_knots: Optional[float] = None,
+) -> bool:
+    """
+    Отправляет одно сообщение на расчет маршрутов от start_port_id до
+    нескольких портов: калькулятор посчитает все маршруты одним поиском
+    и запишет результаты всех задач одной транзакцией.
+    """
+    message_payload: Dict[str, Any] = {
+        "start_port_id": start_port_id,
+        "targets": [
+            {"task_id": task_id, "end_port_id": end_port_id}
+            for task_id, end_port_id in targets
+        ],
+    }
+    if vessel_speed_knots is not None:
+        message_payload["vessel_speed_knots"] = vessel_speed_knots
+
+    task_ids = [task_id for task_id, _ in targets]
+    return _produce_message(
+        message_payload, f"start_port:{start_port_id}", f"task_ids {task_ids}"
+    )
+
+
+def _produce_message(
+    message_payload: Dict[str, Any], message_key: str, description: str
+) -> bool:
     try:
         message_value_bytes = json.dumps(message_payload).encode("utf-8")
     except TypeError as e:
@@ -79,7 +123,7 @@ def send_calculation_request(
         producer.produce(
             topic=REQUEST_TOPIC,
             value=message_value_bytes,
-            key=str(task_id).encode("utf-8"),
+            key=message_key.encode("utf-8"),
             callback=_delivery_report,
         )
 
@@ -89,12 +133,12 @@ def send_calculation_request(
 
         if remaining_messages == 0:
             logger.info(
-                f"Сообщение для task_id {task_id} успешно поставлено в очередь и отправлено (после flush)."
+                f"Сообщение для {description} успешно поставлено в очередь и отправлено (после flush)."
             )
             return True
         else:
             logger.error(
-                f"Не удалось отправить сообщение для task_id {task_id} в течение {10} секунд. "
+                f"Не удалось отправить сообщение для {description} в течение {10} секунд. "
                 f"Осталось сообщений в очереди: {remaining_messages}"
             )
             return False
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0002_calculationtask_result_waypoints_data_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculationtask',
+            name='result_alternatives',
+            field=models.JSONField(blank=True, help_text='Альтернативные маршруты по возрастанию дистанции (первый — основной)', null=True, verbose_name='Альтернативные маршруты'),
+        ),
+    ]
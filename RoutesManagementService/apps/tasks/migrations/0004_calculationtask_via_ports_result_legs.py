@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ports', '0001_initial'),
+        ('tasks', '0003_calculationtask_result_alternatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculationtask',
+            name='result_legs',
+            field=models.JSONField(blank=True, help_text='Плечи рейса через промежуточные порты в порядке захода', null=True, verbose_name='Плечи рейса'),
+        ),
+        migrations.AddField(
+            model_name='calculationtask',
+            name='via_ports',
+            field=models.ManyToManyField(blank=True, help_text='Порты захода между отправлением и назначением; порядок захода подбирает калькулятор', related_name='calculation_tasks_as_via', to='ports.port', verbose_name='Промежуточные порты'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0004_calculationtask_via_ports_result_legs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calculationtask',
+            name='search_stats',
+            field=models.JSONField(blank=True, help_text='Статистика поиска маршрута: движок, раскрыто узлов, размер кучи, время', null=True, verbose_name='Статистика поиска'),
+        ),
+    ]
@@ -29,6 +29,13 @@ class CalculationTask(models.Model):
         related_name="calculation_tasks_as_end",
         verbose_name="Порт назначения",  # Добавил verbose_name
     )
+    via_ports = models.ManyToManyField(
+        Port,
+        blank=True,
+        related_name="calculation_tasks_as_via",
+        help_text="Порты захода между отправлением и назначением; порядок захода подбирает калькулятор",
+        verbose_name="Промежуточные порты",
+    )
     status = models.CharField(
         max_length=20, choices=StatusChoices.choices, default=StatusChoices.PENDING
     )
@@ -59,6 +66,24 @@ class CalculationTask(models.Model):
         help_text="Детальные данные по портам маршрута с ETA/ETD",
         verbose_name="Детали маршрута (ETA/ETD)",
     )
+    result_alternatives = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Альтернативные маршруты по возрастанию дистанции (первый — основной)",
+        verbose_name="Альтернативные маршруты",
+    )
+    result_legs = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Плечи рейса через промежуточные порты в порядке захода",
+        verbose_name="Плечи рейса",
+    )
+    search_stats = models.JSONField(
+        null=True,
+        blank=True,
+        help_text="Статистика поиска маршрута: движок, раскрыто узлов, размер кучи, время",
+        verbose_name="Статистика поиска",
+    )
     error_message = models.TextField(
         blank=True, null=True, verbose_name="Сообщение об ошибке"
     )  # Добавил verbose_name
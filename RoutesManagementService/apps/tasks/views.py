@@ -38,7 +38,10 @@ class CreateCalculationTaskView(View):
         if form.is_valid():
             start_port = form.cleaned_data["start_port"]
             end_port = form.cleaned_data["end_port"]
+            via_ports = form.cleaned_data.get("via_ports")
             vessel_speed_knots = form.cleaned_data.get("vessel_speed_knots")
+            alternative_routes = form.cleaned_data.get("alternative_routes")
+            optimize_for = form.cleaned_data.get("optimize_for") or None
 
             if vessel_speed_knots is not None:
                 if not (
@@ -62,12 +65,17 @@ class CreateCalculationTaskView(View):
                 vessel_speed_knots=vessel_speed_knots,
                 status=CalculationTask.StatusChoices.PENDING,
             )
+            if via_ports:
+                task.via_ports.set(via_ports)
 
             kafka_send_successful = send_calculation_request(
                 task_id=str(task.task_id),
                 start_port_id=start_port.id,
                 end_port_id=end_port.id,
                 vessel_speed_knots=vessel_speed_knots,
+                alternatives=alternative_routes,
+                via_port_ids=[port.id for port in via_ports] if via_ports else None,
+                cost_profile=optimize_for,
             )
 
             if kafka_send_successful:
@@ -161,6 +169,9 @@ class CalculationTaskStatusView(View):
             "result_path_details": path_ports_details,
             "result_distance": task_db_obj.result_distance,
             "result_waypoints_data": task_db_obj.result_waypoints_data,  # Данные уже здесь
+            "result_alternatives": task_db_obj.result_alternatives,
+            "via_port_names": [port.name for port in task_db_obj.via_ports.all()],
+            "result_legs": task_db_obj.result_legs,
             "error_message": task_db_obj.error_message,
             "created_at": task_db_obj.created_at.isoformat()
             if task_db_obj.created_at